@@ -3,6 +3,8 @@ import json
 import os
 from dotenv import load_dotenv
 
+from score_prompt import LEGEND, encode_score
+
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
@@ -10,7 +12,7 @@ with open("output.json", "r", encoding="utf-8") as f:
     music_data = json.load(f)
 
 prompt = f"""
-Ich habe ein Musikstück in JSON-Form. Beschreibe mir bitte:
+Ich habe ein Musikstück in kompakter Textnotation. Beschreibe mir bitte:
 - um welche Art Stück es sich handelt (z.B. Etüde, Lied, etc.)
 - welche Tonart,
 - welches rhythmische Muster,
@@ -18,8 +20,10 @@ Ich habe ein Musikstück in JSON-Form. Beschreibe mir bitte:
 - und für welche Art von Spieler es sich eignet (z.B. Anfänger, Fortgeschrittener, etc.)
 
 
+{LEGEND}
+
 Hier ist das Musikstück:
-{json.dumps(music_data, indent=2)}
+{encode_score(music_data)}
 """
 
 response = client.chat.completions.create(
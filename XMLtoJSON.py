@@ -1,8 +1,10 @@
-from music21 import converter, note, chord, stream
+from music21 import note, chord, stream
 import json
 
-def mxl_to_json(path):
-    score = converter.parse(path)
+from score_cache import parse_score
+
+def score_to_data(score):
+    """Nested part -> measure -> note dicts of a parsed music21 score, as written by mxl_to_json"""
     result = []
 
     for part in score.parts:
@@ -10,31 +12,37 @@ def mxl_to_json(path):
         for m in part.getElementsByClass(stream.Measure):
             measure_data = {"number": m.number, "notes": []}
             for element in m.notesAndRests:
+                # Tuplet durations are Fractions, which json cannot encode
                 if isinstance(element, note.Note):
                     measure_data["notes"].append({
                         "type": "note",
                         "pitch": element.nameWithOctave,
-                        "duration": element.quarterLength
+                        "duration": float(element.quarterLength)
                     })
                 elif isinstance(element, chord.Chord):
                     measure_data["notes"].append({
                         "type": "chord",
                         "pitches": [n.nameWithOctave for n in element.notes],
-                        "duration": element.quarterLength
+                        "duration": float(element.quarterLength)
                     })
                 elif element.isRest:
                     measure_data["notes"].append({
                         "type": "rest",
-                        "duration": element.quarterLength
+                        "duration": float(element.quarterLength)
                     })
             part_data["measures"].append(measure_data)
         result.append(part_data)
-    
-    return json.dumps(result, indent=2)
+
+    return result
+
+
+def mxl_to_json(path):
+    return json.dumps(score_to_data(parse_score(path)), indent=2)
 
 
-json_data = mxl_to_json("test1.mxl")
+if __name__ == "__main__":
+    json_data = mxl_to_json("test1.mxl")
 
-# in Datei schreiben (optional)
-with open("output.json", "w") as f:
-    f.write(json_data)
\ No newline at end of file
+    # in Datei schreiben (optional)
+    with open("output.json", "w") as f:
+        f.write(json_data)
@@ -0,0 +1,142 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger("music_chatbot")
+
+# Cosine similarity above which a stored question counts as the same question
+SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+
+# Seconds an answer is served from the cache
+TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+
+# Answers kept before the least recently used are dropped
+MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_ENTRIES", "1000"))
+
+# question key -> (unit-length embedding, answer, time stored), least recently used first
+_entries = OrderedDict()
+# Stacked embeddings and their keys, rebuilt after entries are added or removed
+_matrix = None
+_matrix_keys = []
+# Signature of the knowledge index the cached answers were retrieved from
+_index_signature = None
+_lock = threading.Lock()
+
+
+def _normalize(question):
+    return " ".join(question.lower().split())
+
+
+def _check_index(index_signature):
+    # Caller holds _lock
+    global _index_signature, _matrix
+    if index_signature != _index_signature:
+        if _entries:
+            logger.info(f"Knowledge index changed, dropping {len(_entries)} cached answers")
+            metrics.increment("semantic_cache_invalidations")
+        _entries.clear()
+        _matrix = None
+        _index_signature = index_signature
+
+
+def _expire(now):
+    # Caller holds _lock; entries are in access order, so expired ones can be anywhere
+    global _matrix
+    expired = [key for key, (_, _, stored_at) in _entries.items() if now - stored_at > TTL_SECONDS]
+    for key in expired:
+        del _entries[key]
+    if expired:
+        _matrix = None
+
+
+def lookup(question, embed_query, index_signature):
+    """
+    Find a cached answer to the same or a similar question
+
+    Questions that are identical after lowercasing and whitespace
+    normalization are answered without embedding them. Otherwise the
+    question is embedded and compared with every cached question.
+
+    Parameters:
+    question (str): The incoming question
+    embed_query (callable): Returns the embedding of a text
+    index_signature (str): Identifies the current knowledge index; a new one empties the cache
+
+    Returns:
+    tuple: (answer or None, embedding of the question or None); pass the
+    embedding to store() after answering a miss
+    """
+    global _matrix
+    key = _normalize(question)
+    now = time.time()
+    with _lock:
+        _check_index(index_signature)
+        _expire(now)
+        if key in _entries:
+            _entries.move_to_end(key)
+            metrics.increment("semantic_cache_hits")
+            return _entries[key][1], None
+
+    embedding = np.asarray(embed_query(question), dtype=np.float32)
+    embedding /= np.linalg.norm(embedding) or 1.0
+
+    with _lock:
+        if _entries:
+            if _matrix is None:
+                _matrix_keys[:] = list(_entries)
+                _matrix = np.stack([_entries[k][0] for k in _matrix_keys])
+            similarities = _matrix @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] >= SIMILARITY_THRESHOLD:
+                match = _matrix_keys[best]
+                _entries.move_to_end(match)
+                metrics.increment("semantic_cache_hits")
+                logger.info(f"Semantic cache hit ({similarities[best]:.3f}): '{question}' ~ '{match}'")
+                return _entries[match][1], embedding
+    metrics.increment("semantic_cache_misses")
+    return None, embedding
+
+
+def store(question, embedding, answer, index_signature):
+    """
+    Cache the answer to a question that missed the cache
+
+    Nothing is stored if the knowledge index changed while the question was answered.
+    """
+    global _matrix
+    with _lock:
+        if index_signature != _index_signature or embedding is None:
+            return
+        key = _normalize(question)
+        _entries[key] = (embedding, answer, time.time())
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+            metrics.increment("semantic_cache_evictions")
+        _matrix = None
+
+
+def stats():
+    """
+    Size and hit rate of the cache
+
+    Returns:
+    dict: entries, hits, misses and hit_rate (None before the first lookup)
+    """
+    counters = metrics.snapshot()["counters"]
+    hits = counters.get("semantic_cache_hits", 0)
+    misses = counters.get("semantic_cache_misses", 0)
+    with _lock:
+        entries = len(_entries)
+    return {
+        "entries": entries,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else None,
+    }
@@ -1,21 +1,12 @@
 import os
 import tempfile
-import librosa
-import numpy as np
-from midi2audio import FluidSynth
-import pretty_midi
-import openai
 from dotenv import load_dotenv
-import uuid
 import logging
-import json
-from datetime import datetime
+import threading
 import time
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-from langchain.chains import RetrievalQA
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
+
+# openai, langchain, numpy and the audio pipeline are imported inside the
+# routes that use them, so that a worker process boots without loading them all up front
 
 # Load environment variables (for OpenAI API key)
 os.environ["KMP_DUPLICATE_LIB_OK"] = "True"
@@ -32,67 +23,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger("music_chatbot")
 
-# RAG Chatbot Functions
-def initialize_rag_chatbot():
-    """Initialize the RAG chatbot by loading the FAISS index and setting up the RAG chain."""
-    logger.info("Initializing music education RAG chatbot")
-    
-    try:
-        # Load the saved FAISS index
-        logger.info("Loading FAISS index from disk")
-        embeddings = OpenAIEmbeddings()
-        db = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
-        logger.info("FAISS index loaded successfully")
-        
-        # Set up retriever
-        retriever = db.as_retriever(
-            search_kwargs={"k": 3}  # Retrieve top 3 most relevant chunks
-        )
-        
-        # Initialize LLM
-        logger.info("Initializing ChatOpenAI model")
-        llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0)
-        logger.info("ChatOpenAI model initialized successfully")
-        
-        # Create custom prompt template
-        template = """
-        You are an AI assistant helping with music education questions.
-        
-        Use the following pieces of context to answer the question at the end.
-        Include the page numbers from the source material in your response.
-        
-        {context}
-        
-        Question: {question}
-        
-        Answer (include page references in parentheses):
-        """
-        
-        PROMPT = PromptTemplate(
-            template=template,
-            input_variables=["context", "question"]
-        )
-        
-        # Create RAG chain
-        logger.info("Creating RetrievalQA chain")
-        rag_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=retriever,
-            chain_type_kwargs={"prompt": PROMPT}
-        )
-        logger.info("RetrievalQA chain created successfully")
-        return rag_chain
-    
-    except Exception as e:
-        logger.error(f"Error initializing RAG chatbot: {e}")
-        return None
+import metrics
+from rag import embed_query, get_rag_chain, index_signature, preload_rag_chain
 
+# RAG Chatbot Functions
 def get_rag_chatbot_response(prompt):
     """Get a response from the RAG chatbot using LangChain"""
     try:
-        # Initialize RAG chain
-        rag_chain = initialize_rag_chatbot()
+        import answer_cache
+        
+        # The chain is loaded once per process and shared by all requests
+        rag_chain = get_rag_chain()
         if rag_chain is None:
             return "Sorry, I couldn't initialize the advanced music knowledge system. Falling back to basic mode."
         
@@ -100,6 +41,13 @@ def get_rag_chatbot_response(prompt):
         start_time = time.time()
         logger.info(f"Processing query: '{prompt}'")
         
+        # Near-duplicate questions are answered from the semantic cache
+        signature = index_signature()
+        cached_answer, embedding = answer_cache.lookup(prompt, embed_query, signature)
+        if cached_answer is not None:
+            logger.info(f"Query answered from cache in {time.time() - start_time:.2f} seconds")
+            return cached_answer
+        
         response = rag_chain.invoke(prompt)
         
         # Extract the answer
@@ -108,6 +56,8 @@ def get_rag_chatbot_response(prompt):
         else:
             answer = str(response)
         
+        answer_cache.store(prompt, embedding, answer, signature)
+        
         # Log completion
         end_time = time.time()
         logger.info(f"Query processed in {end_time - start_time:.2f} seconds")
@@ -121,6 +71,7 @@ def get_rag_chatbot_response(prompt):
 def get_chatbot_response(prompt):
     """Get a response from the chatbot using OpenAI API"""
     try:
+        import openai
         client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         
         response = client.chat.completions.create(
@@ -135,22 +86,70 @@ def get_chatbot_response(prompt):
     except Exception as e:
         return f"Error getting response: {str(e)}"
 
-# Import your existing conversion functions
-from audio_to_midi import convert_audio_to_midi
-from sheet_music import generate_sheet_music
+# Transcription runs in background job workers, see jobs.py
+from jobs import create_job, get_job, start_workers
+from transcription_engines import ENGINES, STREAMING_ENGINE
+import transcription_cache
+import artifact_store
+from score_index import MEASURES_PER_PAGE, load_measure_index, measure_count, read_measures
 
 # Flask implementation
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, send_file
+from flask_sock import Sock
+import json
 import os
 import tempfile
+import uuid
 from werkzeug.utils import secure_filename
 
 # Make sure this is after the Flask app is created
 app = Flask(__name__, static_folder='static', static_url_path='/static')
+sock = Sock(app)
+
+# Number of upload job workers in this process (0 when jobs run in separate `python jobs.py` processes)
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+
+# Set to stop this process's job workers, once start_services has run
+job_workers = None
+_services_lock = threading.Lock()
+
+def start_services():
+    """
+    Start the job workers, the RAG preload and the artifact scan of this process
+
+    Runs with the first request (or before app.run), not on import, so that
+    importing the app for tests, tools or a WSGI server's master process
+    has no side effects. Safe to call more than once.
+    """
+    global job_workers
+    with _services_lock:
+        if job_workers is not None:
+            return
+        job_workers = start_workers(UPLOAD_WORKERS)
+        # Load the FAISS index and RAG chain now rather than in the first /chat request
+        preload_rag_chain()
+        # Files generated before the artifact store existed count towards its quotas too;
+        # scanning the output directories must not hold up the first request
+        threading.Thread(target=artifact_store.adopt_existing, name="artifact-adopt", daemon=True).start()
+
+@app.before_request
+def _start_services_on_first_request():
+    if job_workers is None:
+        start_services()
+
+# Cookie identifying a browser, used for the per-user artifact quota
+CLIENT_COOKIE = 'client_id'
+
+def _client_id():
+    """Id of the requesting browser; falls back to its address before the cookie is set"""
+    return request.cookies.get(CLIENT_COOKIE) or request.remote_addr
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    response = app.make_response(render_template('index.html'))
+    if CLIENT_COOKIE not in request.cookies:
+        response.set_cookie(CLIENT_COOKIE, uuid.uuid4().hex, max_age=365 * 24 * 3600, httponly=True, samesite='Lax')
+    return response
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -162,35 +161,205 @@ def upload_file():
         return jsonify({'error': 'No selected file'})
     
     if file and file.filename.endswith('.mp3'):
-        # Save the uploaded file temporarily
+        params = {
+            'streaming': request.form.get('streaming') == 'true',
+            'engine': request.form.get('engine', 'monophonic')
+        }
+        # Reject settings the pipeline would fail on before a job is queued for them
+        if params['engine'] not in ENGINES:
+            return jsonify({'error': f"Unknown transcription engine: {params['engine']}"}), 400
+        if params['streaming'] and params['engine'] != STREAMING_ENGINE:
+            return jsonify({'error': f"Streaming is only available for the {STREAMING_ENGINE} engine"}), 400
+        
+        # Save the uploaded file; the job worker deletes it when the job has run
         with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
             file.save(tmp_file.name)
             audio_path = tmp_file.name
         
-        try:
-            # Convert audio to MIDI using your existing function
-            midi_path = convert_audio_to_midi(audio_path)
-            
-            # Generate sheet music
-            xml_path, _ = generate_sheet_music(midi_path)
-            
-            # Get relative paths for the frontend
-            midi_filename = os.path.basename(midi_path)
-            xml_filename = os.path.basename(xml_path)
-            
-            return jsonify({
-                'success': True,
-                'midi_path': f'/static/midi/{midi_filename}',
-                'xml_path': f'/static/xml/{xml_filename}'
-            })
-        except Exception as e:
-            return jsonify({'error': str(e)})
-        finally:
-            # Clean up the temporary file
+        # Identical audio with identical settings was transcribed before
+        cached = transcription_cache.lookup(transcription_cache.cache_key(audio_path, params))
+        if cached is not None:
             os.unlink(audio_path)
+            return jsonify(dict(_result_urls(cached), success=True, cached=True))
+        
+        job_id = create_job(audio_path, params, owner=_client_id())
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status_url': f'/jobs/{job_id}',
+            'result_url': f'/jobs/{job_id}/result'
+        }), 202
     
     return jsonify({'error': 'Invalid file format'})
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'stage': job['stage'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at']
+    })
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job['status'] == 'failed':
+        return jsonify({'error': job['error']})
+    if job['status'] != 'done':
+        return jsonify({'status': job['status'], 'stage': job['stage']}), 202
+    
+    return jsonify(dict(_result_urls(job['result']), success=True))
+
+def _result_urls(result):
+    """Get relative paths for the frontend"""
+    midi_filename = os.path.basename(result['midi_path'])
+    xml_filename = os.path.basename(result['xml_path'])
+    return {
+        'midi_path': f'/artifacts/midi/{midi_filename}',
+        'xml_path': f'/artifacts/xml/{xml_filename}',
+        'measures_url': f'/scores/{xml_filename}/measures'
+    }
+
+@app.route('/artifacts/<kind>/<filename>', methods=['GET'])
+def artifact(kind, filename):
+    """
+    Serve a generated MIDI, MusicXML or PNG file from the artifact store
+
+    A precompressed copy is sent when the client accepts its encoding. Names
+    never change content, so responses are cacheable for long, and the
+    ETag lets clients revalidate with If-None-Match (answered with 304).
+    """
+    if kind not in artifact_store.KINDS:
+        return jsonify({'error': 'Unknown artifact kind'}), 404
+    stored = artifact_store.lookup(kind, filename)
+    if stored is None:
+        return jsonify({'error': 'Unknown artifact'}), 404
+    
+    path, encoding = artifact_store.select_encoding(stored, request.headers.get('Accept-Encoding'))
+    # Every encoding is a different representation and needs its own validator
+    etag = f"{stored['etag']}-{encoding}" if encoding else stored['etag']
+    response = send_file(path, mimetype=artifact_store.KINDS[kind][1], etag=etag,
+                         max_age=artifact_store.CACHE_MAX_AGE, conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/scores/<filename>/measures', methods=['GET'])
+def score_measures(filename):
+    """
+    Serve part of a generated MusicXML score as a standalone document
+
+    Query parameters select either a page (page, counted from 1, and
+    per_page) or a range (start, the first measure counted from 1, and
+    count). The total is returned in the X-Total-Measures and
+    X-Total-Pages headers, so a client can render the first page right away
+    and fetch the others as needed.
+    """
+    # Looking the score up also marks it as recently used for the artifact store
+    stored = artifact_store.lookup('xml', filename)
+    if stored is None:
+        return jsonify({'error': 'Unknown score'}), 404
+    xml_path = stored['path']
+    
+    try:
+        per_page = int(request.args.get('per_page', MEASURES_PER_PAGE))
+        if 'start' in request.args:
+            start = int(request.args['start']) - 1
+            count = int(request.args.get('count', per_page))
+        else:
+            start = (int(request.args.get('page', 1)) - 1) * per_page
+            count = per_page
+    except ValueError:
+        return jsonify({'error': 'Measure range must be given as integers'}), 400
+    if start < 0 or count < 1 or per_page < 1:
+        return jsonify({'error': 'Invalid measure range'}), 400
+    
+    try:
+        index = load_measure_index(xml_path)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 415
+    total = measure_count(index)
+    if start >= total and total > 0:
+        return jsonify({'error': 'Measure range is past the end of the score'}), 416
+    
+    response = Response(read_measures(xml_path, start, count, index), mimetype='application/vnd.recordare.musicxml+xml')
+    response.headers['X-Total-Measures'] = str(total)
+    response.headers['X-Total-Pages'] = str(-(-total // per_page))
+    return response
+
+@sock.route('/ws/transcribe')
+def live_transcribe(ws):
+    """
+    Live transcription over a WebSocket
+
+    The client sends {"type": "start", "sample_rate": <Hz>}, then binary
+    float32 PCM chunks, then {"type": "stop"}. Every chunk is answered with
+    the note events it produced; closing the session writes the MIDI file.
+    """
+    from audio_to_midi import wait_for_warmup
+    from live_transcription import LiveTranscriptionSession
+    
+    try:
+        start = json.loads(ws.receive())
+        session = LiveTranscriptionSession(int(start['sample_rate']))
+    except (TypeError, KeyError, ValueError) as e:
+        ws.send(json.dumps({'type': 'error', 'error': f'Invalid start message: {e}'}))
+        return
+    # The first chunks would otherwise pay for compiling librosa's kernels
+    wait_for_warmup()
+    ws.send(json.dumps({'type': 'ready'}))
+    
+    try:
+        while True:
+            message = ws.receive()
+            if isinstance(message, str):
+                if json.loads(message).get('type') == 'stop':
+                    break
+                continue
+            try:
+                events, processing_ms = session.feed(message)
+            except ValueError as e:
+                ws.send(json.dumps({'type': 'error', 'error': str(e)}))
+                continue
+            ws.send(json.dumps({
+                'type': 'update',
+                'events': events,
+                'audio_seconds': session.audio_seconds,
+                'processing_ms': round(processing_ms, 1)
+            }))
+    finally:
+        # Keep what was played even if the browser disconnected without "stop"
+        events, midi_path = session.close()
+        if midi_path:
+            artifact_store.register(midi_path, 'midi', owner=_client_id())
+    
+    ws.send(json.dumps({
+        'type': 'done',
+        'events': events,
+        'midi_path': f'/artifacts/midi/{os.path.basename(midi_path)}' if midi_path else None,
+        'note_count': len(session.notes)
+    }))
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Counters and timings of this process (see metrics.py) and the semantic answer cache"""
+    import answer_cache
+    return jsonify(dict(metrics.snapshot(), semantic_cache=answer_cache.stats()))
+
 @app.route('/chat', methods=['POST'])
 def chat():
     data = request.json
@@ -223,6 +392,7 @@ def generate_plan():
     
     try:
         # Generate learning plan using OpenAI
+        import openai
         client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         
         # Create prompt for learning plan
@@ -258,4 +428,5 @@ def generate_plan():
         return jsonify({'error': str(e)})
 
 if __name__ == '__main__':
+    start_services()
     app.run(debug=False)
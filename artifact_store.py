@@ -0,0 +1,324 @@
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from score_index import index_path
+
+logger = logging.getLogger("artifact_store")
+
+DATABASE_NAME = 'artifacts.db'
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+# Generated files managed by the store: kind -> (directory, mimetype)
+KINDS = {
+    "midi": (os.path.join(STATIC_DIR, "midi"), "audio/midi"),
+    "xml": (os.path.join(STATIC_DIR, "xml"), "application/vnd.recordare.musicxml+xml"),
+    "png": (os.path.join(STATIC_DIR, "png"), "image/png"),
+}
+
+# Disk usage of all artifacts (including compressed copies) before the least recently used are deleted
+MAX_TOTAL_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Disk usage allowed per user; a user over quota loses their own least recently used artifacts first
+MAX_USER_BYTES = int(os.getenv("ARTIFACT_USER_MAX_BYTES", str(100 * 1024 * 1024)))
+
+# Artifact names contain a timestamp and never change, so clients may cache them for long
+CACHE_MAX_AGE = int(os.getenv("ARTIFACT_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+
+# Kinds worth compressing; PNG is compressed already
+COMPRESSIBLE_KINDS = ("midi", "xml")
+
+# Precompressed copies stored next to an artifact, in order of preference: encoding -> suffix
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+_initialized = threading.Event()
+
+
+def get_db_connection():
+    """
+    Establishes and returns a connection to the artifact database.
+    """
+    db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), DATABASE_NAME)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def initialize_store():
+    """
+    Creates the artifacts table if it doesn't already exist.
+    """
+    conn = get_db_connection()
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS artifacts (
+            path TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            owner TEXT,
+            etag TEXT NOT NULL,
+            encodings TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_artifacts_access ON artifacts (last_access)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_artifacts_owner ON artifacts (owner, last_access)')
+    conn.close()
+    _initialized.set()
+
+
+def _connect():
+    if not _initialized.is_set():
+        initialize_store()
+    return get_db_connection()
+
+
+def _compress(path, encoding, data):
+    if encoding == "gzip":
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    else:
+        try:
+            import brotli
+        except ImportError:
+            return None
+        compressed = brotli.compress(data)
+    if len(compressed) >= len(data):
+        return None
+    variant_path = path + ENCODINGS[encoding]
+    tmp_path = f"{variant_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(compressed)
+    os.replace(tmp_path, variant_path)
+    return len(compressed)
+
+
+def is_artifact_name(name):
+    """False for compressed copies, temporary files and measure indexes, which belong to another artifact"""
+    return not name.endswith(tuple(ENCODINGS.values()) + (".tmp", ".measures.json"))
+
+
+def _related_paths(row):
+    """The artifact file, its compressed copies and, for MusicXML, its measure index"""
+    paths = [row['path']] + [row['path'] + ENCODINGS[e] for e in row['encodings'].split(",") if e]
+    if row['kind'] == "xml":
+        paths.append(index_path(row['path']))
+    return paths
+
+
+def register(path, kind, owner=None, keep=()):
+    """
+    Put a generated file under the store's management
+
+    The file gets an ETag from its content and, for MIDI and MusicXML,
+    precompressed gzip (and brotli, if installed) copies. Afterwards the
+    owner's and the global quota are enforced.
+
+    Parameters:
+    path (str): Path of the file inside the directory of its kind
+    kind (str): One of KINDS
+    owner (str, optional): Id of the user the file was generated for
+    keep (iterable): Other paths the quota check must not evict, e.g. the files of the same job
+
+    Returns:
+    dict: path, kind, owner, etag, encodings and size_bytes of the artifact
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    size = len(data)
+    encodings = []
+    if kind in COMPRESSIBLE_KINDS:
+        for encoding in ENCODINGS:
+            compressed_size = _compress(path, encoding, data)
+            if compressed_size is not None:
+                encodings.append(encoding)
+                size += compressed_size
+    if kind == "xml" and os.path.exists(index_path(path)):
+        size += os.path.getsize(index_path(path))
+
+    path = os.path.abspath(path)
+    artifact = {
+        'path': path,
+        'kind': kind,
+        'owner': owner,
+        'etag': hashlib.sha256(data).hexdigest()[:32],
+        'encodings': ",".join(encodings),
+        'size_bytes': size,
+    }
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute(
+            'INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (path, kind, owner, artifact['etag'], artifact['encodings'], size, now, now)
+        )
+    finally:
+        conn.close()
+    enforce_quotas(owner, keep=[path, *keep])
+    return artifact
+
+
+def lookup(kind, filename):
+    """
+    Return the artifact of a kind with the given file name and mark it as recently used
+
+    Files that exist on disk but were never registered (e.g. from before the
+    store or from batch_transcribe.py) are registered without an owner.
+    Entries whose file has disappeared are dropped.
+
+    Returns:
+    dict: The artifact (see register), or None if there is no such file or the name is
+    a compressed copy, temporary file or measure index of another artifact
+    """
+    directory = KINDS[kind][0]
+    path = os.path.abspath(os.path.join(directory, filename))
+    if os.path.dirname(path) != os.path.abspath(directory) or not is_artifact_name(path):
+        return None
+
+    conn = _connect()
+    try:
+        row = conn.execute('SELECT * FROM artifacts WHERE path = ?', (path,)).fetchone()
+        if row is not None and not os.path.exists(path):
+            conn.execute('DELETE FROM artifacts WHERE path = ?', (path,))
+            return None
+        if row is not None:
+            conn.execute('UPDATE artifacts SET last_access = ? WHERE path = ?', (time.time(), path))
+            return dict(row)
+    finally:
+        conn.close()
+    if not os.path.isfile(path):
+        return None
+    return register(path, kind)
+
+
+def delete(path):
+    """
+    Delete an artifact, its compressed copies and its database entry
+
+    Returns:
+    bool: True if the path was a registered artifact
+    """
+    path = os.path.abspath(path)
+    conn = _connect()
+    try:
+        row = conn.execute('SELECT * FROM artifacts WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return False
+        _remove_files(row)
+        conn.execute('DELETE FROM artifacts WHERE path = ?', (path,))
+        return True
+    finally:
+        conn.close()
+
+
+def _remove_files(row):
+    for related in _related_paths(row):
+        if os.path.exists(related):
+            os.remove(related)
+
+
+def _evict(conn, max_bytes, owner_clause, owner_args, keep):
+    total = conn.execute(
+        f'SELECT COALESCE(SUM(size_bytes), 0) FROM artifacts WHERE {owner_clause}', owner_args
+    ).fetchone()[0]
+    evicted = 0
+    if total <= max_bytes:
+        return evicted
+    placeholders = ", ".join("?" * len(keep))
+    rows = conn.execute(
+        f'SELECT * FROM artifacts WHERE {owner_clause} AND path NOT IN ({placeholders}) ORDER BY last_access',
+        owner_args + keep
+    ).fetchall()
+    for row in rows:
+        if total <= max_bytes:
+            break
+        _remove_files(row)
+        conn.execute('DELETE FROM artifacts WHERE path = ?', (row['path'],))
+        total -= row['size_bytes']
+        evicted += 1
+    return evicted
+
+
+def enforce_quotas(owner=None, keep=(), max_user_bytes=MAX_USER_BYTES, max_total_bytes=MAX_TOTAL_BYTES):
+    """
+    Delete least recently used artifacts until the owner and the store fit their quotas
+
+    Parameters:
+    owner (str, optional): User whose quota is checked; None checks only the global quota
+    keep (iterable): Paths that are never evicted, e.g. the artifact just registered
+
+    Returns:
+    int: Number of evicted artifacts
+    """
+    keep = tuple(os.path.abspath(path) for path in keep)
+    conn = _connect()
+    evicted = 0
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        if owner is not None:
+            evicted += _evict(conn, max_user_bytes, 'owner = ?', (owner,), keep)
+        evicted += _evict(conn, max_total_bytes, '1 = 1', (), keep)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    if evicted:
+        logger.info(f"Evicted {evicted} artifacts")
+    return evicted
+
+
+def adopt_existing():
+    """
+    Register artifacts found on disk that the store does not know yet, without an owner
+
+    Run at startup so files written before the store existed, or by
+    batch_transcribe.py, count towards the global quota.
+
+    Returns:
+    int: Number of registered files
+    """
+    conn = _connect()
+    try:
+        known = {row['path'] for row in conn.execute('SELECT path FROM artifacts')}
+    finally:
+        conn.close()
+    adopted = 0
+    for kind, (directory, _) in KINDS.items():
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            path = os.path.abspath(os.path.join(directory, name))
+            if path in known or not is_artifact_name(name) or not os.path.isfile(path):
+                continue
+            register(path, kind)
+            adopted += 1
+    if adopted:
+        logger.info(f"Registered {adopted} existing artifacts")
+    return adopted
+
+
+def select_encoding(artifact, accept_encoding):
+    """
+    Pick the precompressed copy to send for an Accept-Encoding header
+
+    Returns:
+    tuple: (path to send, content encoding or None for the uncompressed file)
+    """
+    accepted = {
+        part.split(";")[0].strip().lower()
+        for part in (accept_encoding or "").split(",")
+        if not part.strip().endswith(";q=0")
+    }
+    available = artifact['encodings'].split(",")
+    for encoding, suffix in ENCODINGS.items():
+        if encoding in accepted and encoding in available and os.path.exists(artifact['path'] + suffix):
+            return artifact['path'] + suffix, encoding
+    return artifact['path'], None
@@ -0,0 +1,118 @@
+import glob
+import logging
+import os
+import threading
+import uuid
+
+import librosa
+import numpy as np
+
+from hashing import file_sha256
+
+logger = logging.getLogger("audio_cache")
+
+# Decoded audio is stored here as one .npy file per source file and sample rate
+AUDIO_CACHE_DIR = os.getenv(
+    "AUDIO_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".audio_cache")
+)
+
+# Disk usage of the cache before the least recently used files are deleted
+MAX_CACHE_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+_evict_lock = threading.Lock()
+
+
+def _cache_pattern(source_hash, sr):
+    label = "native" if sr is None else str(int(sr))
+    return os.path.join(AUDIO_CACHE_DIR, f"{source_hash}-{label}-*.npy")
+
+
+def load_audio(path, sr=None):
+    """
+    Load an audio file as mono float32 PCM, decoding it only once per sample rate
+
+    The decoded signal is stored as a .npy file keyed by the hash of the source
+    file and the requested sample rate. Later calls memory-map that file, so
+    re-runs and other pipeline stages get the samples without decoding or
+    copying them.
+
+    Parameters:
+    path (str): Path to the audio file
+    sr (int, optional): Target sample rate; None keeps the file's native rate
+
+    Returns:
+    tuple: (y, sr) - read-only memory-mapped samples and their sample rate, or
+    the samples in memory if they alone are larger than MAX_CACHE_BYTES
+    """
+    source_hash = file_sha256(path)
+    matches = glob.glob(_cache_pattern(source_hash, sr))
+    if matches:
+        cached_path = matches[0]
+        try:
+            y = np.load(cached_path, mmap_mode="r")
+            # Touch the file so eviction treats it as recently used
+            os.utime(cached_path)
+            actual_sr = int(os.path.splitext(cached_path)[0].rsplit("-", 1)[1])
+            logger.info(f"Loaded decoded audio from cache: {cached_path}")
+            return y, actual_sr
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache file {cached_path}: {e}")
+
+    y, actual_sr = librosa.load(path, sr=sr, mono=True)
+    y = y.astype(np.float32, copy=False)
+    if y.nbytes > MAX_CACHE_BYTES:
+        logger.info(f"Not caching decoded audio ({y.nbytes / 1e6:.1f} MB), it exceeds the cache size")
+        return y, int(actual_sr)
+
+    os.makedirs(AUDIO_CACHE_DIR, exist_ok=True)
+    label = "native" if sr is None else str(int(sr))
+    cached_path = os.path.join(AUDIO_CACHE_DIR, f"{source_hash}-{label}-{int(actual_sr)}.npy")
+    # Write under a temporary name first so readers never see a partial file
+    tmp_path = f"{cached_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, y)
+    os.replace(tmp_path, cached_path)
+    logger.info(f"Cached decoded audio ({y.nbytes / 1e6:.1f} MB) at {cached_path}")
+
+    evict(MAX_CACHE_BYTES, keep=cached_path)
+    return np.load(cached_path, mmap_mode="r"), int(actual_sr)
+
+
+def evict(max_bytes, keep=None):
+    """
+    Delete the least recently used cache files until the cache fits into max_bytes
+
+    Parameters:
+    max_bytes (int): Size the cache is trimmed to
+    keep (str, optional): Path that is never evicted, e.g. the file just written
+
+    Returns:
+    int: Number of deleted files
+    """
+    with _evict_lock:
+        files = []
+        for cached_path in glob.glob(os.path.join(AUDIO_CACHE_DIR, "*.npy")):
+            try:
+                stat = os.stat(cached_path)
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, cached_path))
+
+        total = sum(size for _, size, _ in files)
+        deleted = 0
+        for _, size, cached_path in sorted(files):
+            if total <= max_bytes:
+                break
+            if cached_path == keep:
+                continue
+            try:
+                # Open memory maps keep working on POSIX; on Windows the file stays until released
+                os.remove(cached_path)
+            except OSError:
+                continue
+            total -= size
+            deleted += 1
+    if deleted:
+        logger.info(f"Evicted {deleted} decoded audio files from the cache")
+    return deleted
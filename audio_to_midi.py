@@ -1,5 +1,14 @@
 import os
-import tempfile
+import threading
+
+# Persist Numba's compiled librosa kernels in a project-local directory so the
+# JIT cost is paid once per machine instead of once per process. This has to be
+# set before librosa (and with it numba) is imported.
+os.environ.setdefault(
+    "NUMBA_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".numba_cache")
+)
+
 import librosa
 import numpy as np
 import pretty_midi
@@ -7,6 +16,10 @@ import traceback
 import logging
 from datetime import datetime
 
+from audio_cache import load_audio
+from quantization import GRID_SUBDIVISION, estimate_beat_grid, mark_beat_grid, quantize_notes
+from transcription_engines import ENGINES, STREAMING_ENGINE
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -18,43 +31,105 @@ logging.basicConfig(
 )
 logger = logging.getLogger("audio_converter")
 
+# Analysis frame and hop size shared by onset detection and pitch tracking,
+# so that onset frames index directly into the piptrack matrices
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Onset detection parameters used for every transcription
+ONSET_PARAMS = dict(
+    wait=0.05,          # Increased from 0.03 but still less than original 0.1
+    pre_avg=0.4,        # Increased from 0.3 but still less than original 0.5
+    post_avg=0.4,       # Increased from 0.3 but still less than original 0.5
+    pre_max=0.4,        # Increased from 0.3 but still less than original 0.5
+    post_max=0.4,       # Increased from 0.3 but still less than original 0.5
+    delta=0.03,         # Decreased from 0.04 to be more sensitive
+    backtrack=True      # Keep backtracking
+)
+
+# Number of strongest piptrack bins per frame used as pitch candidates
+PITCH_CANDIDATES = 3
+
+# How the librosa warm-up runs when this module is imported: "sync" blocks
+# until everything is compiled, "background" compiles in a daemon thread and
+# "off" leaves compilation to the first conversion
+WARMUP_MODE = os.getenv("LIBROSA_WARMUP", "background")
+
 # Force Numba to compile the onset detection function at startup
 def _precompile_librosa_functions():
-    dummy_audio = np.zeros(1000)
+    # Quiet noise rather than silence, so that peak picking and beat tracking
+    # are reached (and compiled) as well
+    dummy_audio = 0.01 * np.random.default_rng(0).standard_normal(8 * N_FFT)
     # Use the exact same parameters as in your convert_audio_to_midi function
+    onset_envelope = librosa.onset.onset_strength(y=dummy_audio, sr=22050, hop_length=HOP_LENGTH)
     librosa.onset.onset_detect(
         y=dummy_audio, 
         sr=22050,
-        wait=0.1,
-        pre_avg=0.5,
-        post_avg=0.5,
-        pre_max=0.5,
-        post_max=0.5,
-        delta=0.07,
-        backtrack=True
+        onset_envelope=onset_envelope,
+        hop_length=HOP_LENGTH,
+        **ONSET_PARAMS
     )
+    estimate_beat_grid(onset_envelope, 22050, HOP_LENGTH)
     
     # Also pre-compile other librosa functions you're using
     librosa.piptrack(y=dummy_audio, sr=22050)
 
+def warm_up_librosa(mode=WARMUP_MODE):
+    """
+    Compile the librosa functions used by convert_audio_to_midi
+    
+    Parameters:
+    mode (str): "sync", "background" or "off"
+    
+    Returns:
+    threading.Thread: The warm-up thread in background mode, otherwise None
+    """
+    if mode == "off":
+        return None
+    if mode == "background":
+        thread = threading.Thread(target=_precompile_librosa_functions, name="librosa-warmup", daemon=True)
+        thread.start()
+        return thread
+    if mode != "sync":
+        raise ValueError(f"Unknown librosa warm-up mode: {mode}")
+    _precompile_librosa_functions()
+    return None
+
 # Run the precompilation
-_precompile_librosa_functions()
+_warmup_thread = warm_up_librosa()
+
+def wait_for_warmup(timeout=None):
+    """Block until the warm-up started at import has finished (no-op unless it runs in the background)"""
+    if _warmup_thread is not None:
+        _warmup_thread.join(timeout)
 
-def convert_audio_to_midi(audio_file):
+def convert_audio_to_midi(audio_file, streaming=False, output_dir=None, progress_callback=None, engine="monophonic",
+                          quantize=GRID_SUBDIVISION):
     """
     Convert an audio file to MIDI using librosa for note detection
     
     Parameters:
     audio_file (str): Path to the audio file to convert
+    streaming (bool): Process the file in blocks with constant memory instead
+        of loading the whole signal (recommended for long recordings, monophonic engine only)
+    output_dir (str, optional): Directory to save the MIDI file. Defaults to static/midi.
+    progress_callback (callable, optional): Called with the name of each pipeline stage as it starts
+    engine (str): "monophonic" (one pitch per onset), "polyphonic" (chords, see polyphonic_transcription.py)
+        or "basic_pitch" (neural network model, see basic_pitch_transcription.py)
+    quantize (int): Grid positions per beat that notes are snapped to (see quantization.py); 0 keeps the raw timing
     
     Returns:
     str: Path to the generated MIDI file
     """
     try:
         logger.info(f"Starting conversion of audio file: {audio_file}")
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown transcription engine: {engine}. Choose one of {', '.join(ENGINES)}.")
+        if streaming and engine != STREAMING_ENGINE:
+            raise ValueError("Streaming transcription is only available for the monophonic engine.")
         
         # Use static/midi directory instead of a temporary directory
-        static_midi_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "midi")
+        static_midi_dir = output_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "midi")
         os.makedirs(static_midi_dir, exist_ok=True)
         logger.info(f"Using MIDI directory: {static_midi_dir}")
         
@@ -67,69 +142,38 @@ def convert_audio_to_midi(audio_file):
         
         logger.info(f"Will save MIDI file to: {midi_path}")
         
-        # Load the audio file
-        logger.info("Loading audio file with librosa")
-        y, sr = librosa.load(audio_file, sr=None)
-        logger.info(f"Audio loaded successfully. Sample rate: {sr}, Length: {len(y)}")
-        
-        # Extract pitch and onset information
-        logger.info("Detecting onsets")
-        # Improved onset detection with custom parameters
-        onset_frames = librosa.onset.onset_detect(
-            y=y, 
-            sr=sr,
-            wait=0.05,          # Increased from 0.03 but still less than original 0.1
-            pre_avg=0.4,        # Increased from 0.3 but still less than original 0.5
-            post_avg=0.4,       # Increased from 0.3 but still less than original 0.5
-            pre_max=0.4,        # Increased from 0.3 but still less than original 0.5
-            post_max=0.4,       # Increased from 0.3 but still less than original 0.5
-            delta=0.03,         # Decreased from 0.04 to be more sensitive
-            backtrack=True      # Keep backtracking
-        )
-        
-        onset_times = librosa.frames_to_time(onset_frames, sr=sr)
-        logger.info(f"Detected {len(onset_times)} onsets")
-        
-        if len(onset_times) == 0:
-            logger.warning("No onsets detected in the audio. The file might be silent or not contain clear note onsets.")
-            raise ValueError("No musical notes detected in the audio file. Please try a different recording.")
-        
-        # Use librosa to estimate pitches
-        logger.info("Estimating pitches")
-        pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
-        logger.info("Pitch estimation complete")
-        
         # Create a MIDI file
         logger.info("Creating MIDI file")
-        pm = pretty_midi.PrettyMIDI()
         piano_program = pretty_midi.instrument_name_to_program('Acoustic Grand Piano')
         piano = pretty_midi.Instrument(program=piano_program)
         
-        # Add notes to the MIDI file
-        notes_added = 0
-        logger.info("Adding notes to MIDI file")
-        for i, onset in enumerate(onset_times):
-            if i < len(onset_times) - 1:
-                duration = min(onset_times[i + 1] - onset, 1.0)  # Cap duration at 1 second
-                analysis_duration = min(duration, 0.2)  # Analyze up to 200ms for pitch
-            else:
-                duration = 0.5  # Default duration for the last note
-                analysis_duration = 0.2
+        if streaming:
+            from streaming_transcription import transcribe_stream
+            _report_progress(progress_callback, "transcribing")
+            transcriber = transcribe_stream(audio_file, piano)
+            onset_envelope, sr = transcriber.onset_envelope, transcriber.sr
+        else:
+            # Load the audio file; decoded PCM is cached so re-runs skip the decoder
+            _report_progress(progress_callback, "loading_audio")
+            logger.info("Loading audio file with librosa")
+            y, sr = load_audio(audio_file, sr=None)
+            logger.info(f"Audio loaded successfully. Sample rate: {sr}, Length: {len(y)}")
             
-            # Use the new function
-            pitch = estimate_pitch_for_segment(y, sr, onset, analysis_duration)
+            # The onset envelope drives both onset detection and beat tracking
+            onset_envelope = None
+            if engine == "monophonic" or quantize:
+                onset_envelope = librosa.onset.onset_strength(y=y, sr=sr, hop_length=HOP_LENGTH)
             
-            # Convert frequency to MIDI note number
-            if pitch > 0:
-                midi_note = int(round(librosa.hz_to_midi(pitch)))
-                note = pretty_midi.Note(
-                    velocity=100,
-                    pitch=midi_note,
-                    start=onset,
-                    end=onset + duration
-                )
-                piano.notes.append(note)
-                notes_added += 1
+            if engine == "polyphonic":
+                from polyphonic_transcription import transcribe_polyphonic
+                notes = transcribe_polyphonic(y, sr, progress_callback=progress_callback)
+            elif engine == "basic_pitch":
+                from basic_pitch_transcription import transcribe_basic_pitch
+                notes = transcribe_basic_pitch(y, sr, progress_callback=progress_callback)
+            else:
+                notes = transcribe_monophonic(y, sr, progress_callback=progress_callback, onset_envelope=onset_envelope)
+            piano.notes.extend(notes)
+        notes_added = len(piano.notes)
         
         logger.info(f"Added {notes_added} notes to the MIDI file")
         
@@ -137,6 +181,17 @@ def convert_audio_to_midi(audio_file):
             logger.warning("No notes were added to the MIDI file. Check if pitch detection is working correctly.")
             raise ValueError("Failed to detect any musical notes in the audio. Please try a different recording.")
         
+        if quantize:
+            # Snap notes to the beat grid so music21 does not need tuplets and ties for them
+            _report_progress(progress_callback, "quantizing")
+            tempo, first_beat = estimate_beat_grid(onset_envelope, sr, HOP_LENGTH)
+            piano.notes = quantize_notes(piano.notes, tempo, first_beat, subdivision=quantize)
+            pm = pretty_midi.PrettyMIDI(initial_tempo=tempo)
+            mark_beat_grid(pm, first_beat)
+        else:
+            pm = pretty_midi.PrettyMIDI()
+        
+        _report_progress(progress_callback, "writing_midi")
         pm.instruments.append(piano)
         pm.write(midi_path)
         logger.info(f"MIDI file written successfully to {midi_path}")
@@ -149,36 +204,137 @@ def convert_audio_to_midi(audio_file):
         raise
 
 
-# For each onset, analyze a small segment after the onset
-def estimate_pitch_for_segment(y, sr, start_time, duration):
-    # Convert time to samples
-    start_sample = int(start_time * sr)
-    duration_samples = int(duration * sr)
-    end_sample = min(start_sample + duration_samples, len(y))
+def _report_progress(progress_callback, stage):
+    if progress_callback is not None:
+        progress_callback(stage)
+
+
+def transcribe_monophonic(y, sr, progress_callback=None, onset_envelope=None):
+    """
+    Detect one note per onset in a loaded signal
     
-    # Extract the segment
-    segment = y[start_sample:end_sample]
+    Parameters:
+    y (np.ndarray): Mono audio signal
+    sr (int): Sample rate of the signal
+    progress_callback (callable, optional): Called with the name of each stage as it starts
+    onset_envelope (np.ndarray, optional): Precomputed librosa.onset.onset_strength of y with HOP_LENGTH
     
-    if len(segment) < 512:  # Need minimum length for FFT
-        segment = np.pad(segment, (0, 512 - len(segment)))
+    Returns:
+    list: pretty_midi.Note objects in onset order
+    """
+    # Extract pitch and onset information
+    _report_progress(progress_callback, "detecting_onsets")
+    logger.info("Detecting onsets")
+    # Improved onset detection with custom parameters
+    onset_frames = librosa.onset.onset_detect(
+        y=y, 
+        sr=sr,
+        onset_envelope=onset_envelope,
+        hop_length=HOP_LENGTH,
+        **ONSET_PARAMS
+    )
     
-    # Use more robust pitch estimation
-    pitches, magnitudes = librosa.piptrack(y=segment, sr=sr)
+    onset_times = librosa.frames_to_time(onset_frames, sr=sr, hop_length=HOP_LENGTH)
+    logger.info(f"Detected {len(onset_times)} onsets")
     
-    # Take the average of the top 3 pitch candidates
-    pitch_candidates = []
-    for frame in range(pitches.shape[1]):
-        frame_pitches = pitches[:, frame]
-        frame_magnitudes = magnitudes[:, frame]
-        
-        # Get indices of top 3 magnitudes
-        top_indices = np.argsort(frame_magnitudes)[-3:]
-        
-        # Get corresponding pitches
-        for idx in top_indices:
-            if frame_magnitudes[idx] > 0 and frame_pitches[idx] > 0:
-                pitch_candidates.append(frame_pitches[idx])
-    
-    if pitch_candidates:
-        return np.median(pitch_candidates)  # Use median to avoid outliers
-    return 0
\ No newline at end of file
+    if len(onset_times) == 0:
+        logger.warning("No onsets detected in the audio. The file might be silent or not contain clear note onsets.")
+        raise ValueError("No musical notes detected in the audio file. Please try a different recording.")
+    
+    # Use librosa to estimate pitches once for the whole file; every note
+    # below is read from these matrices instead of running its own STFT
+    _report_progress(progress_callback, "estimating_pitches")
+    logger.info("Estimating pitches")
+    pitches, magnitudes = librosa.piptrack(y=y, sr=sr, hop_length=HOP_LENGTH)
+    logger.info("Pitch estimation complete")
+    
+    # Note durations: up to the next onset (capped at 1 second), 0.5s for the last note
+    durations = np.append(np.minimum(np.diff(onset_times), 1.0), 0.5)
+    analysis_durations = np.minimum(durations, 0.2)  # Analyze up to 200ms for pitch
+    note_pitches = estimate_pitches_for_onsets(
+        pitches, magnitudes, sr, onset_times, analysis_durations, hop_length=HOP_LENGTH
+    )
+    
+    # Convert frequencies to MIDI notes
+    notes = []
+    logger.info("Adding notes to MIDI file")
+    for onset, duration, pitch in zip(onset_times, durations, note_pitches):
+        if pitch > 0:
+            midi_note = int(round(librosa.hz_to_midi(pitch)))
+            notes.append(pretty_midi.Note(
+                velocity=100,
+                pitch=midi_note,
+                start=float(onset),
+                end=float(onset + duration)
+            ))
+    return notes
+
+
+def top_pitch_candidates(pitches, magnitudes):
+    """
+    Pick the strongest pitch candidates of every piptrack frame
+    
+    Parameters:
+    pitches (np.ndarray): Pitch matrix from librosa.piptrack (bins x frames)
+    magnitudes (np.ndarray): Magnitude matrix from librosa.piptrack (bins x frames)
+    
+    Returns:
+    np.ndarray: Candidate frequencies (frames x PITCH_CANDIDATES), NaN where a
+    candidate has no energy or no pitch
+    """
+    k = min(PITCH_CANDIDATES, magnitudes.shape[0])
+    top_bins = np.argpartition(magnitudes, -k, axis=0)[-k:]
+    frame_idx = np.arange(magnitudes.shape[1])
+    cand_mags = magnitudes[top_bins, frame_idx]
+    cand_pitches = pitches[top_bins, frame_idx]
+    return np.where((cand_mags > 0) & (cand_pitches > 0), cand_pitches, np.nan).T
+
+
+def estimate_pitches_for_onsets(pitches, magnitudes, sr, onset_times, durations, hop_length=HOP_LENGTH):
+    """
+    Estimate one pitch per note from precomputed piptrack matrices
+    
+    Every onset window is mapped to a range of frames, the strongest
+    candidates of each frame are gathered and the median is taken for all
+    notes in a single vectorized pass.
+    
+    Parameters:
+    pitches (np.ndarray): Pitch matrix from librosa.piptrack (bins x frames)
+    magnitudes (np.ndarray): Magnitude matrix from librosa.piptrack (bins x frames)
+    sr (int): Sample rate of the analysed audio
+    onset_times (np.ndarray): Note start times in seconds
+    durations (np.ndarray): Length of the analysis window of each note in seconds
+    hop_length (int): Hop length used for piptrack
+    
+    Returns:
+    np.ndarray: Estimated frequency in Hz per note, 0 where no pitch was found
+    """
+    onset_times = np.asarray(onset_times, dtype=float)
+    n_frames = pitches.shape[1]
+    if len(onset_times) == 0 or n_frames == 0:
+        return np.zeros(len(onset_times))
+    
+    cand_pitches = top_pitch_candidates(pitches, magnitudes)
+    
+    # Frame range [start, end) of each note's analysis window; at least one frame
+    start_frames = librosa.time_to_frames(onset_times, sr=sr, hop_length=hop_length)
+    start_frames = np.clip(start_frames, 0, n_frames - 1)
+    window_frames = np.maximum(np.ceil(np.asarray(durations) * sr / hop_length).astype(int), 1)
+    end_frames = np.minimum(start_frames + window_frames, n_frames)
+    
+    # Gather all windows into a (notes x window x k) block, masking frames past each window
+    max_window = int((end_frames - start_frames).max())
+    offsets = np.arange(max_window)
+    idx = start_frames[:, None] + offsets[None, :]
+    valid = idx < end_frames[:, None]
+    idx = np.minimum(idx, n_frames - 1)
+    windows = cand_pitches[idx]
+    windows[~valid] = np.nan
+    windows = windows.reshape(len(onset_times), -1)
+    
+    # Median over the candidates of each note (use median to avoid outliers)
+    has_candidates = ~np.all(np.isnan(windows), axis=1)
+    result = np.zeros(len(onset_times))
+    if has_candidates.any():
+        result[has_candidates] = np.nanmedian(windows[has_candidates], axis=1)
+    return result
@@ -0,0 +1,169 @@
+import logging
+import queue
+import threading
+import time
+
+import librosa
+import numpy as np
+from basic_pitch import ICASSP_2022_MODEL_PATH, note_creation
+from basic_pitch.constants import AUDIO_N_SAMPLES, AUDIO_SAMPLE_RATE, FFT_HOP
+from basic_pitch.inference import Model, unwrap_output, window_audio_file
+
+logger = logging.getLogger("audio_converter")
+
+# Windowing used by basic_pitch.inference.run_inference: 30 output frames of
+# overlap between neighbouring windows, half of which is dropped on each side
+N_OVERLAPPING_FRAMES = 30
+OVERLAP_LEN = N_OVERLAPPING_FRAMES * FFT_HOP
+HOP_SIZE = AUDIO_N_SAMPLES - OVERLAP_LEN
+
+# Note extraction thresholds (Basic Pitch's defaults, as used by predict_and_save)
+ONSET_THRESHOLD = 0.5
+FRAME_THRESHOLD = 0.3
+MIN_NOTE_LENGTH = 0.1277  # seconds
+
+# Upper bound on the windows (~2s of audio each) run through the model in one call
+MAX_BATCH_WINDOWS = 32
+
+# How long the inference thread waits for windows of other requests before running a batch
+BATCH_WAIT = 0.01
+
+
+class _InferenceRequest:
+    def __init__(self, windows):
+        self.windows = windows
+        self.output = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class BatchedBasicPitch:
+    """
+    A Basic Pitch model loaded once and shared by all threads of the process
+
+    predict() can be called from any thread. Its windows are queued and run
+    by a single inference thread, which packs the windows of all concurrent
+    callers into one model call of up to max_batch_windows windows. Long
+    files are split into several batches so that other requests are
+    interleaved instead of waiting for the whole file.
+    """
+
+    def __init__(self, model_path=ICASSP_2022_MODEL_PATH, max_batch_windows=MAX_BATCH_WINDOWS, batch_wait=BATCH_WAIT):
+        start = time.perf_counter()
+        self._model = Model(model_path)
+        logger.info(f"Loaded Basic Pitch model from {model_path} in {time.perf_counter() - start:.2f}s")
+        self.max_batch_windows = max_batch_windows
+        self.batch_wait = batch_wait
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="basic-pitch-inference", daemon=True)
+        self._thread.start()
+
+    def predict(self, windows):
+        """
+        Run the model over audio windows
+
+        Parameters:
+        windows (np.ndarray): Windows of shape (n, AUDIO_N_SAMPLES, 1)
+
+        Returns:
+        dict: Model outputs ("note", "onset", "contour"), each with one row per window
+        """
+        requests = [
+            _InferenceRequest(windows[i:i + self.max_batch_windows])
+            for i in range(0, len(windows), self.max_batch_windows)
+        ]
+        for request in requests:
+            self._queue.put(request)
+        for request in requests:
+            request.done.wait()
+            if request.error is not None:
+                raise request.error
+        return {k: np.concatenate([r.output[k] for r in requests]) for k in requests[0].output}
+
+    def _run(self):
+        carry = None
+        while True:
+            batch = [carry if carry is not None else self._queue.get()]
+            carry = None
+            size = len(batch[0].windows)
+            deadline = time.monotonic() + self.batch_wait
+            while size < self.max_batch_windows:
+                try:
+                    request = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if size + len(request.windows) > self.max_batch_windows:
+                    carry = request
+                    break
+                batch.append(request)
+                size += len(request.windows)
+            self._infer(batch)
+
+    def _infer(self, batch):
+        try:
+            output = self._model.predict(np.concatenate([r.windows for r in batch]))
+            offset = 0
+            for request in batch:
+                n = len(request.windows)
+                request.output = {k: v[offset:offset + n] for k, v in output.items()}
+                offset += n
+        except Exception as e:
+            for request in batch:
+                request.error = e
+        for request in batch:
+            request.done.set()
+
+
+_inference_engine = None
+_inference_engine_lock = threading.Lock()
+
+
+def get_inference_engine():
+    """Return the process-wide Basic Pitch model, loading it on first use"""
+    global _inference_engine
+    with _inference_engine_lock:
+        if _inference_engine is None:
+            _inference_engine = BatchedBasicPitch()
+    return _inference_engine
+
+
+def transcribe_basic_pitch(y, sr, progress_callback=None):
+    """
+    Estimate notes with the Basic Pitch model
+
+    Produces the same notes as basic_pitch.inference.predict, but takes the
+    signal from memory and runs it through the shared, already loaded model.
+
+    Parameters:
+    y (np.ndarray): Mono audio signal
+    sr (int): Sample rate of the signal
+    progress_callback (callable, optional): Called with the name of each stage as it starts
+
+    Returns:
+    list: pretty_midi.Note objects sorted by start time
+    """
+    if progress_callback is not None:
+        progress_callback("loading_model")
+    engine = get_inference_engine()
+
+    if progress_callback is not None:
+        progress_callback("estimating_pitches")
+    if sr != AUDIO_SAMPLE_RATE:
+        y = librosa.resample(np.asarray(y), orig_sr=sr, target_sr=AUDIO_SAMPLE_RATE)
+    y = np.asarray(y, dtype=np.float32)
+    padded = np.concatenate([np.zeros(OVERLAP_LEN // 2, dtype=np.float32), y])
+    windows = np.stack([window for window, _ in window_audio_file(padded, HOP_SIZE)])
+    logger.info(f"Running Basic Pitch over {len(windows)} windows")
+    output = engine.predict(windows)
+    model_output = {k: unwrap_output(v, len(y), N_OVERLAPPING_FRAMES) for k, v in output.items()}
+
+    midi_data, _ = note_creation.model_output_to_notes(
+        model_output,
+        onset_thresh=ONSET_THRESHOLD,
+        frame_thresh=FRAME_THRESHOLD,
+        min_note_len=int(np.round(MIN_NOTE_LENGTH * AUDIO_SAMPLE_RATE / FFT_HOP)),
+        include_pitch_bends=False,
+    )
+    notes = sorted((n for inst in midi_data.instruments for n in inst.notes), key=lambda n: n.start)
+    logger.info(f"Detected {len(notes)} notes")
+    return notes
@@ -0,0 +1,193 @@
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from transcription_engines import ENGINES
+
+logger = logging.getLogger("batch_transcriber")
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".flac", ".ogg", ".m4a")
+
+
+def collect_audio_files(inputs, extensions=AUDIO_EXTENSIONS):
+    """
+    Expand directories and manifest files into a list of audio file paths
+
+    A manifest is a text file with one audio path per line. Relative paths are
+    resolved against the manifest's directory; empty lines and lines starting
+    with '#' are ignored.
+
+    Parameters:
+    inputs (list): Directories, manifest files or audio files
+    extensions (tuple): File extensions treated as audio when scanning directories
+
+    Returns:
+    list: Audio file paths in a stable order, without duplicates
+    """
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.lower().endswith(extensions):
+                        files.append(os.path.join(root, name))
+        elif path.lower().endswith(extensions):
+            files.append(path)
+        elif os.path.isfile(path):
+            base_dir = os.path.dirname(os.path.abspath(path))
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        files.append(os.path.join(base_dir, line))
+        else:
+            raise FileNotFoundError(f"Input not found: {path}")
+
+    seen = set()
+    unique = []
+    for path in files:
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            unique.append(path)
+    return unique
+
+
+def _init_worker(engine="monophonic"):
+    """Import the pipeline once per worker process and compile librosa (or load the model) before the first file"""
+    import audio_to_midi
+    import sheet_music  # noqa: F401
+    # The import already started the warm-up unless LIBROSA_WARMUP is off
+    if audio_to_midi.WARMUP_MODE == "off":
+        audio_to_midi.warm_up_librosa("sync")
+    else:
+        audio_to_midi.wait_for_warmup()
+    if engine == "basic_pitch":
+        from basic_pitch_transcription import get_inference_engine
+        get_inference_engine()
+
+
+def transcribe_file(audio_file, midi_dir, xml_dir, streaming=False, write_xml=True, engine="monophonic"):
+    """
+    Run the upload pipeline for a single file inside a worker process
+
+    Parameters:
+    audio_file (str): Path to the audio file
+    midi_dir (str): Directory for the MIDI output
+    xml_dir (str): Directory for the MusicXML output
+    streaming (bool): Use the streaming transcription mode
+    write_xml (bool): Also generate MusicXML through sheet_music.generate_sheet_music
+    engine (str): Transcription engine passed to convert_audio_to_midi
+
+    Returns:
+    dict: Output paths, audio duration and per-stage timings in seconds
+    """
+    import librosa
+    from audio_to_midi import convert_audio_to_midi
+    from sheet_music import generate_sheet_music
+
+    result = {"audio_file": audio_file, "midi_path": None, "xml_path": None, "error": None}
+    start = time.perf_counter()
+    try:
+        result["audio_duration"] = librosa.get_duration(path=audio_file)
+        result["midi_path"] = convert_audio_to_midi(
+            audio_file, streaming=streaming, output_dir=midi_dir, engine=engine
+        )
+        result["midi_time"] = time.perf_counter() - start
+        if write_xml:
+            xml_start = time.perf_counter()
+            result["xml_path"], _ = generate_sheet_music(result["midi_path"], output_dir=xml_dir)
+            result["xml_time"] = time.perf_counter() - xml_start
+    except Exception as e:
+        result["error"] = str(e)
+    result["total_time"] = time.perf_counter() - start
+    return result
+
+
+def run_batch(audio_files, midi_dir, xml_dir, workers=None, streaming=False, write_xml=True, engine="monophonic"):
+    """
+    Transcribe many audio files in parallel over a process pool
+
+    Parameters:
+    audio_files (list): Paths of the audio files to transcribe
+    midi_dir (str): Directory for the MIDI outputs
+    xml_dir (str): Directory for the MusicXML outputs
+    workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+    streaming (bool): Use the streaming transcription mode
+    write_xml (bool): Also generate MusicXML for every file
+    engine (str): Transcription engine passed to convert_audio_to_midi
+
+    Returns:
+    list: One result dict per file (see transcribe_file), in completion order
+    """
+    workers = workers or os.cpu_count() or 1
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(engine,)) as pool:
+        futures = [
+            pool.submit(transcribe_file, path, midi_dir, xml_dir, streaming, write_xml, engine)
+            for path in audio_files
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            status = "FAILED: " + result["error"] if result["error"] else f"{result['total_time']:.2f}s"
+            logger.info(f"[{len(results)}/{len(audio_files)}] {result['audio_file']} {status}")
+    return results
+
+
+def print_summary(results, wall_time):
+    """Print per-file timings and the overall throughput of a batch run"""
+    print(f"\n{'File':<50} {'Audio (s)':>10} {'MIDI (s)':>9} {'XML (s)':>8} {'Total (s)':>10} {'RTF':>7}")
+    for r in sorted(results, key=lambda r: r["audio_file"]):
+        name = os.path.basename(r["audio_file"])[:50]
+        if r["error"]:
+            print(f"{name:<50} FAILED: {r['error']}")
+            continue
+        audio = r.get("audio_duration", 0.0)
+        rtf = r["total_time"] / audio if audio else float("nan")
+        print(f"{name:<50} {audio:>10.1f} {r.get('midi_time', 0.0):>9.2f} "
+              f"{r.get('xml_time', 0.0):>8.2f} {r['total_time']:>10.2f} {rtf:>7.3f}")
+
+    done = [r for r in results if not r["error"]]
+    audio_total = sum(r.get("audio_duration", 0.0) for r in done)
+    print(f"\n{len(done)}/{len(results)} files transcribed in {wall_time:.1f}s wall time")
+    if wall_time > 0:
+        print(f"Throughput: {len(done) / wall_time:.2f} files/s, "
+              f"{audio_total / wall_time:.1f}s of audio per second")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe directories or manifests of audio files to MIDI and MusicXML")
+    parser.add_argument("inputs", nargs="+", help="Audio directories, manifest files (one path per line) or audio files")
+    parser.add_argument("--output-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"),
+                        help="Base output directory; MIDI goes to <dir>/midi and MusicXML to <dir>/xml")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: all CPUs)")
+    parser.add_argument("--streaming", action="store_true", help="Use bounded-memory streaming transcription")
+    parser.add_argument("--no-xml", action="store_true", help="Only write MIDI files")
+    parser.add_argument("--engine", choices=ENGINES, default="monophonic",
+                        help="Transcription engine")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    audio_files = collect_audio_files(args.inputs)
+    if not audio_files:
+        print("No audio files found.")
+        return 1
+
+    midi_dir = os.path.join(args.output_dir, "midi")
+    xml_dir = os.path.join(args.output_dir, "xml")
+    logger.info(f"Transcribing {len(audio_files)} files with {args.workers or os.cpu_count()} workers")
+
+    start = time.perf_counter()
+    results = run_batch(audio_files, midi_dir, xml_dir, workers=args.workers,
+                        streaming=args.streaming, write_xml=not args.no_xml, engine=args.engine)
+    print_summary(results, time.perf_counter() - start)
+    return 0 if all(not r["error"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Compare embedding backends on the chunks of a knowledge index: time to embed
+the corpus in batches, query-embedding latency and retrieval quality.
+
+Queries are random word windows cut from the chunks themselves; a query is
+answered correctly when a retrieved chunk contains it. The OpenAI backend is
+skipped without OPENAI_API_KEY.
+
+    python benchmarks/embedding_benchmark.py --backends local openai --queries 200
+"""
+import argparse
+import os
+import pickle
+import random
+import statistics
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from embedding_backends import BACKENDS, create_embeddings  # noqa: E402
+
+
+def load_chunks(index_dir):
+    """Texts of the chunks in a saved FAISS index"""
+    with open(os.path.join(index_dir, "index.pkl"), "rb") as f:
+        docstore, _ = pickle.load(f)
+    return [doc.page_content for doc in docstore._dict.values()]
+
+
+def make_queries(chunks, count, words, seed):
+    """Random windows of consecutive words, each from a random chunk"""
+    rng = random.Random(seed)
+    queries = []
+    candidates = [chunk.split() for chunk in chunks if len(chunk.split()) > words]
+    for _ in range(count):
+        tokens = rng.choice(candidates)
+        start = rng.randrange(len(tokens) - words)
+        queries.append(" ".join(tokens[start:start + words]))
+    return queries
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_backend(backend, chunks, queries, k, batch_size):
+    from langchain_community.vectorstores import FAISS
+
+    embeddings = create_embeddings(backend)
+
+    start = time.perf_counter()
+    vectors = []
+    for i in range(0, len(chunks), batch_size):
+        vectors.extend(embeddings.embed_documents(chunks[i:i + batch_size]))
+    index_time = time.perf_counter() - start
+    db = FAISS.from_embeddings(list(zip(chunks, vectors)), embeddings)
+
+    latencies = []
+    ranks = []
+    for query in queries:
+        start = time.perf_counter()
+        vector = embeddings.embed_query(query)
+        latencies.append(time.perf_counter() - start)
+        docs = db.similarity_search_by_vector(vector, k=k)
+        normalized = " ".join(query.split())
+        rank = next((i for i, doc in enumerate(docs) if normalized in " ".join(doc.page_content.split())), None)
+        ranks.append(rank)
+
+    start = time.perf_counter()
+    embeddings.embed_documents(queries)
+    batch_query_time = (time.perf_counter() - start) / len(queries)
+
+    return {
+        "backend": backend,
+        "index_s": index_time,
+        "p50_ms": 1000 * percentile(latencies, 0.5),
+        "p95_ms": 1000 * percentile(latencies, 0.95),
+        "batched_ms": 1000 * batch_query_time,
+        "hit1": sum(1 for r in ranks if r == 0) / len(ranks),
+        "hitk": sum(1 for r in ranks if r is not None) / len(ranks),
+        "mrr": statistics.mean(1 / (r + 1) if r is not None else 0 for r in ranks),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-dir", default=os.path.join(REPO_DIR, "faiss_index"),
+                        help="Index whose chunks are the corpus (default: faiss_index)")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--query-words", type=int, default=8, help="Words per query")
+    parser.add_argument("--k", type=int, default=3, help="Chunks retrieved per query")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks per embedding call")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    chunks = load_chunks(args.index_dir)
+    queries = make_queries(chunks, args.queries, args.query_words, args.seed)
+    print(f"{len(chunks)} chunks, {len(queries)} queries of {args.query_words} words, k={args.k}\n")
+
+    print(f"{'Backend':<8} {'Index (s)':>9} {'Query p50 (ms)':>14} {'p95 (ms)':>9} {'Batched (ms)':>12} "
+          f"{'Hit@1':>6} {f'Hit@{args.k}':>6} {'MRR':>6}")
+    for backend in args.backends:
+        if backend == "openai" and not os.getenv("OPENAI_API_KEY"):
+            print(f"{backend:<8} skipped, OPENAI_API_KEY is not set")
+            continue
+        r = run_backend(backend, chunks, queries, args.k, args.batch_size)
+        print(f"{r['backend']:<8} {r['index_s']:>9.3f} {r['p50_ms']:>14.3f} {r['p95_ms']:>9.3f} {r['batched_ms']:>12.3f} "
+              f"{r['hit1']:>6.2f} {r['hitk']:>6.2f} {r['mrr']:>6.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Compare the direct MusicXML writer with the music21 path of generate_sheet_music.
+
+Both paths get the same quantized, beat-aligned notes. The script reports
+the time and output size of each, checks that music21 reads the same notes
+back from both files, and prints the speedup.
+
+    python benchmarks/musicxml_benchmark.py                   # synthetic melodies
+    python benchmarks/musicxml_benchmark.py static/midi/*.mid # quantized transcriptions
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pretty_midi
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from musicxml_writer import write_musicxml  # noqa: E402
+from quantization import beat_aligned_midi, mark_beat_grid, quantize_notes, read_beat_grid  # noqa: E402
+
+SYNTHETIC_SIZES = [100, 500, 2000]
+
+
+def synthetic_transcription(n_notes, tempo=110.0, seed=0):
+    """A quantized melody like the monophonic engine produces, with a pickup before the first beat"""
+    rng = np.random.default_rng(seed)
+    beat = 60.0 / tempo
+    durations = rng.choice([0.25, 0.5, 0.75, 1.0, 1.5, 2.0], size=n_notes) * beat
+    gaps = rng.choice([0.0, 0.0, 0.0, 0.25, 0.5], size=n_notes) * beat
+    starts = 0.3 + np.cumsum(durations + gaps) - durations - gaps
+    pitches = np.clip(60 + np.cumsum(rng.integers(-4, 5, size=n_notes)), 45, 84)
+    notes = [
+        pretty_midi.Note(velocity=100, pitch=int(p), start=float(s), end=float(s + d))
+        for p, s, d in zip(pitches, starts, durations)
+    ]
+    first_beat = 0.3 + beat
+    pm = pretty_midi.PrettyMIDI(initial_tempo=tempo)
+    mark_beat_grid(pm, first_beat)
+    piano = pretty_midi.Instrument(program=0)
+    piano.notes = quantize_notes(notes, tempo, first_beat)
+    pm.instruments.append(piano)
+    return pm
+
+
+def read_notes(xml_path):
+    """(offset, pitch, duration) of every note music21 reads from a MusicXML file, with ties merged"""
+    from music21 import converter
+    score = converter.parse(xml_path)
+    notes = []
+    open_ties = {}
+    for n in score.recurse().notes:
+        offset = float(n.getOffsetInHierarchy(score))
+        tie = n.tie.type if n.tie is not None else None
+        for p in n.pitches:
+            # Merged by MIDI number; music21's stripTies also compares written accidentals
+            if tie in ("continue", "stop") and p.midi in open_ties:
+                notes[open_ties[p.midi]][2] += float(n.quarterLength)
+            else:
+                open_ties[p.midi] = len(notes)
+                notes.append([offset, p.midi, float(n.quarterLength)])
+            if tie == "stop":
+                open_ties.pop(p.midi, None)
+    return sorted(tuple(note) for note in notes)
+
+
+def benchmark(name, pm, tmp_dir):
+    from music21 import converter
+    grid = read_beat_grid(pm)
+    if grid is None:
+        return {"input": name, "error": "not a quantized transcription"}
+    aligned = beat_aligned_midi(pm, *grid)
+
+    direct_path = os.path.join(tmp_dir, f"{name}_direct.xml")
+    start = time.perf_counter()
+    written = write_musicxml(aligned, direct_path, title=name)
+    direct_time = time.perf_counter() - start
+    if not written:
+        return {"input": name, "error": "needs the music21 fallback"}
+
+    music21_path = os.path.join(tmp_dir, f"{name}_music21.xml")
+    aligned_midi = os.path.join(tmp_dir, f"{name}_aligned.mid")
+    start = time.perf_counter()
+    aligned.write(aligned_midi)
+    converter.parse(aligned_midi).write("musicxml", fp=music21_path)
+    music21_time = time.perf_counter() - start
+
+    return {
+        "input": name,
+        "notes": sum(len(inst.notes) for inst in pm.instruments),
+        "music21_seconds": round(music21_time, 4),
+        "direct_seconds": round(direct_time, 4),
+        "speedup": round(music21_time / direct_time, 1),
+        "music21_kb": round(os.path.getsize(music21_path) / 1024, 1),
+        "direct_kb": round(os.path.getsize(direct_path) / 1024, 1),
+        "same_notes": read_notes(direct_path) == read_notes(music21_path),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark direct MusicXML writing against music21")
+    parser.add_argument("midi_files", nargs="*", help="Quantized MIDI files from convert_audio_to_midi")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.midi_files:
+        inputs = [(os.path.splitext(os.path.basename(p))[0], pretty_midi.PrettyMIDI(p)) for p in args.midi_files]
+    else:
+        inputs = [(f"synthetic_{n}", synthetic_transcription(n)) for n in SYNTHETIC_SIZES]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        results = [benchmark(name, pm, tmp_dir) for name, pm in inputs]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'input':<32} {'notes':>6} {'music21 s':>10} {'direct s':>9} {'speedup':>8} "
+          f"{'music21 KB':>11} {'direct KB':>10} {'same':>5}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['input']:<32} {r['error']}")
+            continue
+        print(f"{r['input']:<32} {r['notes']:>6} {r['music21_seconds']:>10.3f} {r['direct_seconds']:>9.3f} "
+              f"{r['speedup']:>7.1f}x {r['music21_kb']:>11.1f} {r['direct_kb']:>10.1f} {str(r['same_notes']):>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Compare dense, lexical (BM25), hybrid and pre-filtered hybrid retrieval on
+the chunks of a knowledge index: latency per query and recall.
+
+Two query sets are used:
+- the question history in user_questions/. It has no relevance labels, so
+  recall@k is measured against the exhaustive hybrid ranking (every chunk
+  scored by both BM25 and vectors); it shows what each mode and the
+  pre-filter lose relative to that.
+- word windows cut from the chunks (see embedding_benchmark.py); a query is
+  a hit when a retrieved chunk contains it.
+
+Without OPENAI_API_KEY the chunks are re-embedded in memory with the local
+backend, since the OpenAI vectors of the index cannot be queried offline.
+
+    python benchmarks/retrieval_benchmark.py --prefilter 50 --queries 200
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from embedding_backends import BACKENDS, create_embeddings, read_index_backend  # noqa: E402
+from embedding_benchmark import make_queries, percentile  # noqa: E402
+from hybrid_retrieval import HybridRetriever, load_bm25_index  # noqa: E402
+
+
+def load_history(questions_dir):
+    """Unique questions asked so far, in the order first asked"""
+    questions = []
+    for path in sorted(glob.glob(os.path.join(questions_dir, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            entries = sorted(json.load(f).get("questions", []), key=lambda q: q.get("timestamp", ""))
+        questions.extend(q["question"] for q in entries if q.get("question"))
+    return list(dict.fromkeys(questions))
+
+
+def load_store(index_dir, backend):
+    """The index itself if it was built with the backend, otherwise its chunks re-embedded in memory"""
+    from langchain_community.vectorstores import FAISS
+
+    embeddings = create_embeddings(backend)
+    if read_index_backend(index_dir) == backend:
+        return FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+    db = FAISS.load_local(index_dir, create_embeddings("local"), allow_dangerous_deserialization=True)
+    ids = [db.index_to_docstore_id[i] for i in range(db.index.ntotal)]
+    docs = [db.docstore.search(i) for i in ids]
+    texts = [doc.page_content for doc in docs]
+    # Same docstore ids, so the BM25 index saved next to the index still applies
+    return FAISS.from_embeddings(list(zip(texts, embeddings.embed_documents(texts))), embeddings,
+                                 metadatas=[doc.metadata for doc in docs], ids=ids)
+
+
+def run_mode(retriever, queries):
+    """Retrieved chunk texts and latency of each query"""
+    results = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        docs = retriever.invoke(query)
+        latencies.append(time.perf_counter() - start)
+        results.append([doc.page_content for doc in docs])
+    return results, latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-dir", default=os.path.join(REPO_DIR, "faiss_index"))
+    parser.add_argument("--questions-dir", default=os.path.join(REPO_DIR, "user_questions"))
+    parser.add_argument("--backend", choices=BACKENDS, default=None,
+                        help="Embedding backend (default: the index's, or local without OPENAI_API_KEY)")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--fetch-k", type=int, default=20)
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--prefilter", type=int, default=50, help="BM25 candidates of the pre-filtered mode")
+    parser.add_argument("--queries", type=int, default=200, help="Number of word-window queries")
+    parser.add_argument("--query-words", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    backend = args.backend or read_index_backend(args.index_dir)
+    if backend == "openai" and not os.getenv("OPENAI_API_KEY"):
+        backend = "local"
+    db = load_store(args.index_dir, backend)
+    bm25 = load_bm25_index(db, args.index_dir)
+    history = load_history(args.questions_dir)
+    chunks = [db.docstore.search(db.index_to_docstore_id[i]).page_content for i in range(db.index.ntotal)]
+    windows = make_queries(chunks, args.queries, args.query_words, args.seed)
+    print(f"{len(chunks)} chunks, {backend} embeddings, {len(history)} history questions, "
+          f"{len(windows)} word-window queries, k={args.k}")
+
+    common = {"vectorstore": db, "bm25": bm25, "k": args.k, "alpha": args.alpha}
+    reference = HybridRetriever(mode="hybrid", fetch_k=len(chunks), prefilter=0, **common)
+    modes = {
+        "dense": HybridRetriever(mode="dense", **common),
+        "lexical": HybridRetriever(mode="lexical", **common),
+        "hybrid": HybridRetriever(mode="hybrid", fetch_k=args.fetch_k, prefilter=0, **common),
+        f"prefilter{args.prefilter}": HybridRetriever(mode="hybrid", prefilter=args.prefilter, **common),
+    }
+    # Warm up the query embedding and FAISS code paths
+    for retriever in modes.values():
+        retriever.invoke("warm up")
+
+    expected, _ = run_mode(reference, history)
+    print(f"\n{'Mode':<12} {'p50 (ms)':>9} {'p95 (ms)':>9} {f'History recall@{args.k}':>18} "
+          f"{f'Window hit@{args.k}':>15}")
+    for name, retriever in modes.items():
+        retrieved, latencies = run_mode(retriever, history)
+        recall = sum(len(set(r) & set(e)) / max(len(e), 1) for r, e in zip(retrieved, expected)) / max(len(history), 1)
+        window_results, window_latencies = run_mode(retriever, windows)
+        hits = sum(
+            any(" ".join(query.split()) in " ".join(text.split()) for text in texts)
+            for query, texts in zip(windows, window_results)
+        ) / len(windows)
+        latencies += window_latencies
+        print(f"{name:<12} {1000 * percentile(latencies, 0.5):>9.3f} {1000 * percentile(latencies, 0.95):>9.3f} "
+              f"{recall:>18.2f} {hits:>15.2f}")
+
+    print("\nTop chunk per history question (hybrid):")
+    hybrid = modes["hybrid"]
+    for question in history:
+        docs = hybrid.invoke(question)
+        first = " ".join(docs[0].page_content.split())[:70] if docs else "-"
+        print(f"  {question[:40]:<40} {first}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Measure cold-start cost of the Flask app: module import time, latency of the
+first request and, optionally, of the first transcription job.
+
+Every measurement runs in a fresh interpreter, once per librosa warm-up mode.
+
+    python benchmarks/startup_benchmark.py --runs 3 --with-upload
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child interpreter and prints one JSON line with the timings
+CHILD_SCRIPT = r'''
+import io, json, os, sys, time
+sys.path.insert(0, REPO_DIR)
+timings = {}
+start = time.perf_counter()
+import app
+timings["import_s"] = time.perf_counter() - start
+
+client = app.app.test_client()
+start = time.perf_counter()
+client.get("/")
+timings["first_request_s"] = time.perf_counter() - start
+
+if WITH_UPLOAD:
+    import numpy as np
+    import soundfile as sf
+    sr = 22050
+    t = np.arange(sr * 3) / sr
+    y = 0.5 * np.sin(2 * np.pi * 440 * t) * (np.sin(2 * np.pi * 2 * t) > 0)
+    # A little noise keeps every run out of the transcription cache
+    y += 1e-4 * np.random.default_rng().standard_normal(len(y))
+    buffer = io.BytesIO()
+    sf.write(buffer, y, sr, format="WAV")
+    buffer.seek(0)
+
+    start = time.perf_counter()
+    job = client.post("/upload", data={"file": (buffer, "benchmark.mp3")},
+                      content_type="multipart/form-data").json
+    while client.get(f"/jobs/{job['job_id']}").json["status"] not in ("done", "failed"):
+        time.sleep(0.05)
+    timings["first_transcription_s"] = time.perf_counter() - start
+
+    result = app.get_job(job["job_id"])["result"] or {}
+    for path in result.values():
+        if path and os.path.exists(path):
+            os.remove(path)
+
+print("BENCHMARK " + json.dumps(timings))
+'''
+
+
+def run_once(warmup_mode, with_upload):
+    env = dict(os.environ, LIBROSA_WARMUP=warmup_mode)
+    script = CHILD_SCRIPT.replace("REPO_DIR", repr(REPO_DIR)).replace("WITH_UPLOAD", repr(with_upload))
+    completed = subprocess.run([sys.executable, "-c", script], env=env, cwd=REPO_DIR,
+                               capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith("BENCHMARK "):
+            return json.loads(line[len("BENCHMARK "):])
+    raise RuntimeError(f"Benchmark run failed:\n{completed.stderr[-2000:]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark app import and first-request latency")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per warm-up mode")
+    parser.add_argument("--modes", nargs="+", default=["sync", "background", "off"],
+                        help="LIBROSA_WARMUP modes to compare")
+    parser.add_argument("--with-upload", action="store_true", help="Also time the first /upload job")
+    parser.add_argument("--json", help="Write the raw results to this file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for mode in args.modes:
+        results[mode] = [run_once(mode, args.with_upload) for _ in range(args.runs)]
+
+    metrics = ["import_s", "first_request_s"] + (["first_transcription_s"] if args.with_upload else [])
+    print(f"{'warm-up':<12}" + "".join(f"{m:>24}" for m in metrics))
+    for mode, runs in results.items():
+        cells = "".join(f"{statistics.median(r[m] for r in runs):>24.3f}" for m in metrics)
+        print(f"{mode:<12}{cells}")
+    print(f"(median of {args.runs} runs, seconds)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
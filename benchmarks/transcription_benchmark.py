@@ -0,0 +1,319 @@
+"""
+Accuracy and throughput benchmark for the audio_to_midi transcription engines.
+
+Reference pieces are rendered to audio from known notes (synthetic pieces and
+the test*.mxl scores), every engine transcribes them, and the result is
+scored against the reference notes. Everything runs offline.
+
+    python benchmarks/transcription_benchmark.py --output results.json
+    python benchmarks/transcription_benchmark.py --compare old.json
+
+Reported per piece and engine:
+- realtime factor (processing time / audio duration, lower is faster)
+- peak traced memory in MB (numpy allocations via tracemalloc)
+- note precision / recall / F1: a note matches a reference note of the same
+  pitch whose onset lies within the onset tolerance
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pretty_midi
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+SAMPLE_RATE = 22050
+
+# Onset tolerance used for note matching (same default as mir_eval)
+ONSET_TOLERANCE = 0.05
+
+# Score files rendered as additional reference pieces
+SCORE_FILES = ["test1.mxl", "test2.mxl", "test3.mxl"]
+
+
+def _piece(notes):
+    pm = pretty_midi.PrettyMIDI()
+    piano = pretty_midi.Instrument(program=0)
+    piano.notes.extend(pretty_midi.Note(velocity=100, pitch=p, start=s, end=e) for p, s, e in notes)
+    pm.instruments.append(piano)
+    return pm
+
+
+def synthetic_pieces(seed=0):
+    """
+    Build reference pieces with known notes
+
+    Returns:
+    dict: Piece name -> pretty_midi.PrettyMIDI
+    """
+    rng = np.random.default_rng(seed)
+    pieces = {}
+
+    scale = [60, 62, 64, 65, 67, 69, 71, 72]
+    pieces["c_major_scale"] = _piece([(p, 0.5 * i, 0.5 * i + 0.45) for i, p in enumerate(scale * 2)])
+
+    pitches = rng.integers(55, 80, size=48)
+    durations = rng.choice([0.25, 0.5, 0.75], size=48)
+    starts = np.concatenate([[0.0], np.cumsum(durations)[:-1]])
+    pieces["random_melody"] = _piece([(int(p), s, s + 0.9 * d) for p, s, d in zip(pitches, starts, durations)])
+
+    triads = [[60, 64, 67], [65, 69, 72], [67, 71, 74], [60, 64, 67], [57, 60, 64], [62, 65, 69]]
+    pieces["triads"] = _piece([(p, 1.0 * i, 1.0 * i + 0.9) for i, chord in enumerate(triads * 2) for p in chord])
+
+    # Melody over a bass line, the common case for beginner piano pieces
+    melody = [(int(p), 0.25 * i, 0.25 * i + 0.22) for i, p in enumerate(rng.integers(67, 84, size=64))]
+    bass = [(int(p), 1.0 * i, 1.0 * i + 0.95) for i, p in enumerate(rng.choice([36, 41, 43, 45], size=16))]
+    pieces["melody_and_bass"] = _piece(melody + bass)
+    return pieces
+
+
+def score_pieces(score_files=SCORE_FILES):
+    """
+    Convert MusicXML scores to reference pieces through music21
+
+    Returns:
+    dict: Piece name -> pretty_midi.PrettyMIDI (empty if music21 is unavailable)
+    """
+    try:
+        from music21 import converter
+    except ImportError:
+        return {}
+
+    pieces = {}
+    for name in score_files:
+        path = os.path.join(REPO_DIR, name)
+        if not os.path.exists(path):
+            continue
+        with tempfile.TemporaryDirectory() as tmp:
+            midi_path = os.path.join(tmp, "score.mid")
+            converter.parse(path).write("midi", fp=midi_path)
+            pieces[os.path.splitext(name)[0]] = pretty_midi.PrettyMIDI(midi_path)
+    return pieces
+
+
+def reference_notes(pm):
+    """All non-drum notes of a piece as (pitch, start, end) array rows"""
+    notes = [(n.pitch, n.start, n.end) for inst in pm.instruments if not inst.is_drum for n in inst.notes]
+    return np.array(sorted(notes, key=lambda n: n[1]), dtype=float).reshape(-1, 3)
+
+
+def render(pm, sr=SAMPLE_RATE):
+    """Render a piece with a decaying harmonic tone (no soundfont required)"""
+    def piano_like(phase):
+        return sum(0.6 ** (h - 1) * np.sin(h * phase) for h in range(1, 7))
+
+    y = pm.synthesize(fs=sr, wave=piano_like)
+    peak = np.abs(y).max()
+    return (0.8 * y / peak if peak > 0 else y).astype(np.float32)
+
+
+def _streaming_engine(y, sr):
+    from streaming_transcription import StreamingTranscriber
+    transcriber = StreamingTranscriber(sr)
+    block = 8192
+    for i in range(0, len(y), block):
+        transcriber.process(y[i:i + block])
+    transcriber.finish()
+    return transcriber.notes
+
+
+def engines():
+    """
+    Transcription engines under test
+
+    Returns:
+    dict: Engine name -> callable(y, sr) returning pretty_midi.Note objects
+    """
+    from audio_to_midi import transcribe_monophonic
+    from polyphonic_transcription import transcribe_polyphonic
+    available = {
+        "monophonic": transcribe_monophonic,
+        "monophonic_streaming": _streaming_engine,
+        "polyphonic": transcribe_polyphonic,
+    }
+    try:
+        from basic_pitch_transcription import transcribe_basic_pitch
+        available["basic_pitch"] = transcribe_basic_pitch
+    except ImportError:
+        pass
+    return available
+
+
+def match_notes(reference, estimated, onset_tolerance=ONSET_TOLERANCE):
+    """
+    Count one-to-one matches between reference and estimated notes
+
+    Pairs are matched greedily by onset distance; a pair matches when the
+    pitches are equal and the onsets differ by at most onset_tolerance.
+
+    Parameters:
+    reference (np.ndarray): Reference notes as (pitch, start, end) rows
+    estimated (np.ndarray): Estimated notes as (pitch, start, end) rows
+
+    Returns:
+    int: Number of matched notes
+    """
+    if len(reference) == 0 or len(estimated) == 0:
+        return 0
+    same_pitch = reference[:, 0][:, None] == estimated[:, 0][None, :]
+    distance = np.abs(reference[:, 1][:, None] - estimated[:, 1][None, :])
+    candidates = np.argwhere(same_pitch & (distance <= onset_tolerance))
+    order = np.argsort(distance[candidates[:, 0], candidates[:, 1]], kind="stable")
+
+    used_ref = np.zeros(len(reference), dtype=bool)
+    used_est = np.zeros(len(estimated), dtype=bool)
+    matched = 0
+    for r, e in candidates[order]:
+        if not used_ref[r] and not used_est[e]:
+            used_ref[r] = used_est[e] = True
+            matched += 1
+    return matched
+
+
+def note_scores(reference, estimated, onset_tolerance=ONSET_TOLERANCE):
+    """Precision, recall and F1 of estimated notes against reference notes"""
+    matched = match_notes(reference, estimated, onset_tolerance)
+    precision = matched / len(estimated) if len(estimated) else 0.0
+    recall = matched / len(reference) if len(reference) else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+
+
+def run_engine(engine, y, sr):
+    """
+    Run an engine twice: once for wall time and once under tracemalloc for peak memory
+
+    Returns:
+    tuple: (notes, seconds, peak_megabytes)
+    """
+    start = time.perf_counter()
+    try:
+        notes = engine(y, sr)
+    except ValueError:
+        # The monophonic engine raises when it finds no notes at all
+        notes = []
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        engine(y, sr)
+    except ValueError:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return notes, elapsed, peak / 1e6
+
+
+def run_benchmark(pieces, engine_names=None, onset_tolerance=ONSET_TOLERANCE):
+    """
+    Transcribe every piece with every engine and score the results
+
+    Returns:
+    list: One result dict per (piece, engine)
+    """
+    available = engines()
+    selected = engine_names or list(available)
+    # Compile librosa's numba kernels before anything is timed
+    from audio_to_midi import warm_up_librosa
+    warm_up_librosa("sync")
+    if "basic_pitch" in selected:
+        from basic_pitch_transcription import get_inference_engine
+        get_inference_engine()
+
+    results = []
+    for piece_name, pm in pieces.items():
+        y = render(pm)
+        duration = len(y) / SAMPLE_RATE
+        reference = reference_notes(pm)
+        for engine_name in selected:
+            notes, elapsed, peak_mb = run_engine(available[engine_name], y, SAMPLE_RATE)
+            estimated = np.array([(n.pitch, n.start, n.end) for n in notes], dtype=float).reshape(-1, 3)
+            precision, recall, f1 = note_scores(reference, estimated, onset_tolerance)
+            results.append({
+                "piece": piece_name,
+                "engine": engine_name,
+                "audio_seconds": round(duration, 3),
+                "processing_seconds": round(elapsed, 4),
+                "realtime_factor": round(elapsed / duration, 5),
+                "peak_memory_mb": round(peak_mb, 2),
+                "reference_notes": len(reference),
+                "estimated_notes": len(estimated),
+                "precision": round(precision, 4),
+                "recall": round(recall, 4),
+                "f1": round(f1, 4),
+            })
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"{'piece':<18} {'engine':<22} {'RTF':>8} {'mem MB':>8} {'P':>6} {'R':>6} {'F1':>6}")
+    for r in results:
+        print(f"{r['piece']:<18} {r['engine']:<22} {r['realtime_factor']:>8.4f} {r['peak_memory_mb']:>8.1f} "
+              f"{r['precision']:>6.3f} {r['recall']:>6.3f} {r['f1']:>6.3f}")
+
+
+def print_comparison(old_results, results):
+    """Print per-engine changes against an earlier results file"""
+    old = {(r["piece"], r["engine"]): r for r in old_results}
+    print(f"\n{'piece':<18} {'engine':<22} {'dRTF':>9} {'dMem MB':>9} {'dF1':>8}")
+    for r in results:
+        previous = old.get((r["piece"], r["engine"]))
+        if previous is None:
+            continue
+        print(f"{r['piece']:<18} {r['engine']:<22} "
+              f"{r['realtime_factor'] - previous['realtime_factor']:>+9.4f} "
+              f"{r['peak_memory_mb'] - previous['peak_memory_mb']:>+9.1f} "
+              f"{r['f1'] - previous['f1']:>+8.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark transcription speed, memory and accuracy")
+    parser.add_argument("--engines", nargs="+", help="Engines to run (default: all)")
+    parser.add_argument("--no-scores", action="store_true", help="Skip the test*.mxl reference pieces")
+    parser.add_argument("--onset-tolerance", type=float, default=ONSET_TOLERANCE)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier results JSON to diff against")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    pieces = synthetic_pieces()
+    if not args.no_scores:
+        pieces.update(score_pieces())
+
+    results = run_benchmark(pieces, args.engines, args.onset_tolerance)
+    print_results(results)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print_comparison(json.load(f)["results"], results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "timestamp": datetime.now().isoformat(),
+                "git_revision": _git_revision(),
+                "sample_rate": SAMPLE_RATE,
+                "onset_tolerance": args.onset_tolerance,
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
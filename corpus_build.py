@@ -0,0 +1,310 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from hashing import file_sha256
+from score_index import index_path
+
+logger = logging.getLogger("corpus_build")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCORE_EXTENSIONS = (".mxl", ".musicxml", ".xml")
+
+# Derivatives written for every score: stage -> (output subdirectory, file extension)
+STAGES = {
+    "midi": ("midi", ".mid"),
+    "json": ("json", ".json"),
+    "musicxml": ("xml", ".musicxml"),
+}
+
+# Bump when the conversion changes so existing derivatives are rebuilt
+BUILD_VERSION = 1
+
+MANIFEST_NAME = "manifest.json"
+
+
+def collect_scores(inputs, extensions=SCORE_EXTENSIONS):
+    """
+    Expand directories into score files, each with the name its derivatives are stored under
+
+    Files inside a directory keep their path relative to it, so scores with
+    the same name in different subdirectories do not overwrite each other.
+
+    Parameters:
+    inputs (list): Directories or score files
+
+    Returns:
+    list: (path, name) tuples in a stable order, without duplicate names
+    """
+    scores = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                for name in sorted(names):
+                    if name.lower().endswith(extensions):
+                        full_path = os.path.join(root, name)
+                        scores.append((full_path, os.path.relpath(full_path, path)))
+        elif os.path.isfile(path):
+            scores.append((path, os.path.basename(path)))
+        else:
+            raise FileNotFoundError(f"Input not found: {path}")
+
+    seen = set()
+    unique = []
+    for path, name in scores:
+        name = os.path.splitext(name)[0].replace(os.sep, "/")
+        if name not in seen:
+            seen.add(name)
+            unique.append((path, name))
+    return unique
+
+
+def build_id():
+    """Identifies the converter; derivatives from another music21 version or BUILD_VERSION are rebuilt"""
+    import music21
+    return f"{BUILD_VERSION}-{music21.VERSION_STR}"
+
+
+def load_manifest(path):
+    """Read the build manifest: score name -> {sha256, build, source, outputs}"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable manifest {path}: {e}")
+        return {}
+
+
+def save_manifest(manifest, path):
+    # Write under a temporary name first so an interrupted build keeps the previous manifest
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _output_paths(name, output_dir, stages):
+    return {
+        stage: os.path.join(output_dir, STAGES[stage][0], name + STAGES[stage][1])
+        for stage in stages
+    }
+
+
+def _remove_outputs(outputs):
+    """Delete the derivative files of a manifest entry"""
+    paths = list(outputs.values())
+    if "musicxml" in outputs:
+        # MusicXML derivatives have a measure index next to them
+        paths.append(index_path(outputs["musicxml"]))
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _is_current(entry, sha256, build, outputs):
+    return (
+        entry is not None
+        and entry.get("sha256") == sha256
+        and entry.get("build") == build
+        and all(entry.get("outputs", {}).get(stage) == path and os.path.exists(path)
+                for stage, path in outputs.items())
+    )
+
+
+def _init_worker():
+    """Import music21 and the converters once per worker process"""
+    import music21  # noqa: F401
+    import XMLtoJSON  # noqa: F401
+
+
+def convert_score(score_path, outputs):
+    """
+    Parse a score once and write its derivatives inside a worker process
+
+    The score is parsed with converter.parse rather than score_cache: the
+    manifest already skips unchanged scores, and freezing every score of the
+    corpus would only add to the first build.
+
+    Parameters:
+    score_path (str): Path to the MusicXML or MXL file
+    outputs (dict): Stage name -> output path, for the stages to run
+
+    Returns:
+    dict: Output paths, per-stage timings in seconds and the error, if any
+    """
+    from music21 import converter
+    from XMLtoJSON import score_to_data
+    from score_index import write_measure_index
+
+    result = {"score": score_path, "outputs": outputs, "timings": {}, "error": None}
+    start = time.perf_counter()
+    try:
+        stage_start = time.perf_counter()
+        score = converter.parse(score_path, forceSource=True)
+        result["timings"]["parse"] = time.perf_counter() - stage_start
+        for stage, path in outputs.items():
+            stage_start = time.perf_counter()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if stage == "midi":
+                score.write("midi", fp=path)
+            elif stage == "json":
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(score_to_data(score), f, indent=2)
+            elif stage == "musicxml":
+                score.write("musicxml", fp=path)
+                write_measure_index(path)
+            result["timings"][stage] = time.perf_counter() - stage_start
+    except Exception as e:
+        result["error"] = str(e)
+    result["total_time"] = time.perf_counter() - start
+    return result
+
+
+def build_corpus(scores, output_dir, stages=tuple(STAGES), workers=None, force=False, prune=False):
+    """
+    Convert new and changed scores to MIDI, JSON and MusicXML over a process pool
+
+    Each score's SHA-256 is compared with the manifest in output_dir. Scores
+    whose hash, converter version and outputs are unchanged are skipped.
+    With prune, entries of scores that are not among the given scores are
+    removed together with their derivatives. A score that fails to convert
+    loses its entry and derivatives, so none of them are left behind half
+    updated and the next build retries it. The manifest is saved after every
+    converted score, so an interrupted build resumes where it stopped.
+
+    Parameters:
+    scores (list): (path, name) tuples from collect_scores
+    output_dir (str): Base directory of the derivatives and the manifest
+    stages (tuple): Stages to run, keys of STAGES
+    workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+    force (bool): Rebuild every score
+    prune (bool): Remove the derivatives of scores missing from scores; only
+        use it when scores is the whole corpus
+
+    Returns:
+    dict: "results" (one dict per converted score, see convert_score),
+    "skipped" (number of up-to-date scores), "removed" (number of pruned
+    entries) and "hash_time" (seconds spent hashing inputs)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    build = build_id()
+
+    hash_start = time.perf_counter()
+    pending = []
+    skipped = 0
+    for path, name in scores:
+        sha256 = file_sha256(path)
+        outputs = _output_paths(name, output_dir, stages)
+        if not force and _is_current(manifest.get(name), sha256, build, outputs):
+            skipped += 1
+        else:
+            pending.append((path, name, sha256, outputs))
+    hash_time = time.perf_counter() - hash_start
+
+    current = {name for _, name in scores}
+    removed = [name for name in manifest if name not in current] if prune else []
+    for name in removed:
+        _remove_outputs(manifest.pop(name).get("outputs", {}))
+        logger.info(f"Removed derivatives of {name}, which is no longer in the corpus")
+    if removed:
+        save_manifest(manifest, manifest_path)
+
+    logger.info(f"{len(pending)} scores to convert, {skipped} up to date")
+    results = []
+    if pending:
+        workers = min(workers or os.cpu_count() or 1, len(pending))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = {
+                pool.submit(convert_score, path, outputs): (name, sha256)
+                for path, name, sha256, outputs in pending
+            }
+            for future in as_completed(futures):
+                name, sha256 = futures[future]
+                result = future.result()
+                results.append(result)
+                if result["error"]:
+                    # Drop the entry and every derivative, including any the failed
+                    # run wrote, so nothing is left untracked; the next build retries
+                    previous = manifest.pop(name, {})
+                    _remove_outputs({**previous.get("outputs", {}), **result["outputs"]})
+                    logger.info(f"[{len(results)}/{len(pending)}] {name} FAILED: {result['error']}")
+                else:
+                    # Derivatives of stages not run this time stay valid if the score is unchanged
+                    previous = manifest.get(name, {})
+                    outputs = dict(previous.get("outputs", {})) if (
+                        previous.get("sha256") == sha256 and previous.get("build") == build
+                    ) else {}
+                    outputs.update(result["outputs"])
+                    manifest[name] = {
+                        "sha256": sha256,
+                        "build": build,
+                        "source": result["score"],
+                        "outputs": outputs,
+                    }
+                    logger.info(f"[{len(results)}/{len(pending)}] {name} {result['total_time']:.2f}s")
+                save_manifest(manifest, manifest_path)
+
+    return {"results": results, "skipped": skipped, "removed": len(removed), "hash_time": hash_time}
+
+
+def print_summary(build, wall_time):
+    """Print per-stage timings of a corpus build"""
+    results = build["results"]
+    done = [r for r in results if not r["error"]]
+    for r in results:
+        if r["error"]:
+            print(f"FAILED {r['score']}: {r['error']}")
+
+    print(f"\n{'Stage':<10} {'Files':>6} {'Total (s)':>10} {'Mean (ms)':>10} {'Max (ms)':>9}")
+    print(f"{'hash':<10} {len(results) + build['skipped']:>6} {build['hash_time']:>10.3f}")
+    for stage in ["parse"] + list(STAGES):
+        times = [r["timings"][stage] for r in done if stage in r["timings"]]
+        if times:
+            print(f"{stage:<10} {len(times):>6} {sum(times):>10.3f} "
+                  f"{1000 * sum(times) / len(times):>10.1f} {1000 * max(times):>9.1f}")
+
+    print(f"\n{len(done)}/{len(results)} scores converted, {build['skipped']} up to date, "
+          f"{build['removed']} removed, in {wall_time:.1f}s wall time")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a corpus of MusicXML/MXL scores to MIDI, JSON and MusicXML")
+    parser.add_argument("inputs", nargs="*", default=[os.path.join(BASE_DIR, "IMSLP", "MXL")],
+                        help="Score directories or files (default: IMSLP/MXL)")
+    parser.add_argument("--output-dir", default=os.path.join(BASE_DIR, "IMSLP", "corpus"),
+                        help="Base output directory with midi/, json/, xml/ and the manifest")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES),
+                        help="Derivatives to build")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: all CPUs)")
+    parser.add_argument("--force", action="store_true", help="Rebuild every score, ignoring the manifest")
+    parser.add_argument("--prune", action="store_true",
+                        help="Remove derivatives of scores that are not in the inputs (pass the whole corpus)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    scores = collect_scores(args.inputs)
+    if not scores:
+        print("No scores found.")
+        return 1
+
+    start = time.perf_counter()
+    build = build_corpus(scores, args.output_dir, stages=tuple(args.stages), workers=args.workers, force=args.force,
+                         prune=args.prune)
+    print_summary(build, time.perf_counter() - start)
+    return 0 if all(not r["error"] for r in build["results"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import re
+import uuid
+import zlib
+from functools import lru_cache
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger("embedding_backends")
+
+# "openai" calls the OpenAI embeddings API, "local" computes hashed n-gram vectors on the CPU
+BACKENDS = ("openai", "local")
+
+# Backend used to load an index; unset uses the backend recorded when the index was built
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND")
+
+# Written next to index.faiss by knowledge.py
+BACKEND_FILE = "embeddings.json"
+
+# Dimension of the hashed vectors; a power of two so indices are a bit mask
+LOCAL_DIMENSIONS = 1024
+
+# Character n-gram lengths taken from each word, which also match compounds
+# ("Viertelnote") and inflections against their parts
+LOCAL_NGRAMS = (3, 4, 5)
+
+# Weight of whole words and word bigrams relative to character n-grams
+WORD_WEIGHT = 2.0
+
+_WORD = re.compile(r"\w+")
+
+
+def _hash(feature, dimensions):
+    # crc32 is stable across processes, unlike hash(); the top bit picks the sign
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h & (dimensions - 1), 1.0 if h & 0x80000000 else -1.0
+
+
+@lru_cache(maxsize=65536)
+def _word_features(word, dimensions, ngrams):
+    """Hashed indices and signed weights of a word and its character n-grams"""
+    features = [_hash("w:" + word, dimensions) + (WORD_WEIGHT,)]
+    padded = f"<{word}>"
+    for n in ngrams:
+        for i in range(len(padded) - n + 1):
+            features.append(_hash(padded[i:i + n], dimensions) + (1.0,))
+    indices = np.array([f[0] for f in features], dtype=np.int64)
+    weights = np.array([f[1] * f[2] for f in features], dtype=np.float32)
+    return indices, weights
+
+
+class HashedNgramEmbeddings(Embeddings):
+    """
+    Local embeddings from hashed word and character n-gram counts
+
+    Needs no model download or network and embeds a short question in well
+    under a millisecond, at the cost of matching wording rather than
+    meaning. Vectors are L2-normalized, so FAISS distances rank like cosine
+    similarity.
+    """
+
+    def __init__(self, dimensions=LOCAL_DIMENSIONS, ngrams=LOCAL_NGRAMS):
+        if dimensions & (dimensions - 1):
+            raise ValueError("dimensions must be a power of two")
+        self.dimensions = dimensions
+        self.ngrams = tuple(ngrams)
+        self.model = f"hashed-ngram-{dimensions}-{'-'.join(map(str, self.ngrams))}"
+
+    def embed_matrix(self, texts):
+        """
+        Embed a batch of texts
+
+        Returns:
+        numpy.ndarray: float32 array of shape (len(texts), dimensions)
+        """
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _WORD.findall(text.lower())
+            if not words:
+                continue
+            parts = [_word_features(word, self.dimensions, self.ngrams) for word in words]
+            parts.extend(
+                _word_features(f"{a} {b}", self.dimensions, ()) for a, b in zip(words, words[1:])
+            )
+            np.add.at(matrix[row], np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts]))
+        # Sublinear term frequency keeps repeated words from dominating a chunk
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def embed_documents(self, texts):
+        return self.embed_matrix(texts).tolist()
+
+    def embed_query(self, text):
+        return self.embed_matrix([text])[0].tolist()
+
+
+def create_embeddings(backend):
+    """
+    Create the embedding model of a backend
+
+    Parameters:
+    backend (str): One of BACKENDS
+
+    Returns:
+    Embeddings: The embedding model
+    """
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings()
+    if backend == "local":
+        return HashedNgramEmbeddings()
+    raise ValueError(f"Unknown embedding backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+
+def read_index_backend(index_dir):
+    """
+    Return the embedding backend an index was built with
+
+    Indexes built before the backend was recorded were built with OpenAI.
+    """
+    try:
+        with open(os.path.join(index_dir, BACKEND_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)["backend"]
+    except FileNotFoundError:
+        return "openai"
+
+
+def write_index_backend(index_dir, backend, embeddings):
+    """Record the backend and model an index is built with"""
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, BACKEND_FILE)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"backend": backend, "model": getattr(embeddings, "model", None)}, f)
+    os.replace(tmp_path, path)
+
+
+def embeddings_for_index(index_dir, backend=None):
+    """
+    Create the embedding model for querying an index
+
+    Parameters:
+    index_dir (str): Directory of the saved FAISS index
+    backend (str, optional): Backend to use. Defaults to EMBEDDING_BACKEND, then
+    to the backend recorded with the index.
+
+    Returns:
+    Embeddings: The embedding model
+
+    Raises:
+    ValueError: If the requested backend is not the one the index was built with
+    """
+    built_with = read_index_backend(index_dir)
+    backend = backend or EMBEDDING_BACKEND or built_with
+    if backend != built_with:
+        raise ValueError(
+            f"{index_dir} was built with the {built_with} embedding backend, not {backend}; "
+            f"rebuild it with knowledge.py --embeddings {backend}"
+        )
+    return create_embeddings(backend)
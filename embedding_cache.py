@@ -0,0 +1,161 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger("embedding_cache")
+
+DATABASE_NAME = 'embedding_cache.db'
+
+# Query embeddings kept in memory by QueryMemoEmbeddings
+QUERY_MEMO_ENTRIES = 256
+
+# Hashes looked up per SELECT; stays below SQLite's limit on query parameters
+LOOKUP_BATCH = 500
+
+_initialized = threading.Event()
+
+
+class QueryMemoEmbeddings(Embeddings):
+    """
+    Wraps an embedding model and remembers the embeddings of recent queries
+
+    The /chat path embeds a question for the semantic answer cache and
+    then again in the retriever; the second call is answered from memory.
+    """
+
+    def __init__(self, embeddings, max_entries=QUERY_MEMO_ENTRIES):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        with self._lock:
+            embedding = self._memo.get(text)
+            if embedding is not None:
+                self._memo.move_to_end(text)
+                return embedding
+        embedding = self.embeddings.embed_query(text)
+        with self._lock:
+            self._memo[text] = embedding
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+        return embedding
+
+
+def get_db_connection():
+    """
+    Establishes and returns a connection to the embedding cache database.
+    """
+    db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), DATABASE_NAME)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def initialize_cache():
+    """
+    Creates the embeddings table if it doesn't already exist.
+    """
+    conn = get_db_connection()
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS embeddings (
+            model TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            vector BLOB NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (model, text_hash)
+        )
+    ''')
+    conn.close()
+    _initialized.set()
+
+
+def _connect():
+    if not _initialized.is_set():
+        initialize_cache()
+    return get_db_connection()
+
+
+def model_name(embeddings):
+    """Name identifying an embedding model in the cache, e.g. OpenAIEmbeddings/text-embedding-ada-002"""
+    model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None)
+    name = type(embeddings).__name__
+    return f"{name}/{model}" if model else name
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model and stores every document embedding in SQLite
+
+    Embeddings are keyed by the model name and the SHA-256 of the text, so
+    re-indexing only sends new or changed chunks to the model. Queries are
+    passed through.
+    """
+
+    def __init__(self, embeddings, model=None):
+        self.embeddings = embeddings
+        self.model = model or model_name(embeddings)
+
+    def _load(self, hashes):
+        found = {}
+        conn = _connect()
+        try:
+            for i in range(0, len(hashes), LOOKUP_BATCH):
+                batch = hashes[i:i + LOOKUP_BATCH]
+                rows = conn.execute(
+                    f'SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({",".join("?" * len(batch))})',
+                    [self.model] + batch
+                )
+                for row in rows:
+                    found[row['text_hash']] = np.frombuffer(row['vector'], dtype=np.float32).tolist()
+        finally:
+            conn.close()
+        return found
+
+    def _save(self, vectors):
+        now = time.time()
+        conn = _connect()
+        try:
+            conn.execute('BEGIN')
+            conn.executemany(
+                'INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)',
+                [(self.model, h, np.asarray(v, dtype=np.float32).tobytes(), now) for h, v in vectors.items()]
+            )
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def embed_documents(self, texts):
+        hashes = [text_hash(text) for text in texts]
+        found = self._load(sorted(set(hashes)))
+
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in found:
+                missing.setdefault(h, text)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing, vectors))
+            self._save(computed)
+            found.update({h: np.asarray(v, dtype=np.float32).tolist() for h, v in computed.items()})
+        logger.info(f"Embedded {len(texts)} texts: {len(texts) - len(missing)} from cache, {len(missing)} new")
+        return [found[h] for h in hashes]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
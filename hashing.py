@@ -0,0 +1,36 @@
+import hashlib
+import json
+
+# Read size used when hashing files, large enough to keep hashing I/O bound
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    """
+    Hash the contents of a file
+
+    Parameters:
+    path (str): Path to the file
+
+    Returns:
+    str: Hex SHA-256 digest of the file's bytes
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def params_sha256(params):
+    """
+    Hash a JSON-serializable dict of parameters independent of key order
+
+    Parameters:
+    params (dict): Parameters to hash
+
+    Returns:
+    str: Hex SHA-256 digest of the canonical JSON encoding
+    """
+    encoded = json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
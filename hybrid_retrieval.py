@@ -0,0 +1,262 @@
+import logging
+import os
+import pickle
+import re
+import sys
+import time
+import unicodedata
+import uuid
+from collections import Counter
+
+import numpy as np
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+import metrics
+
+logger = logging.getLogger("hybrid_retrieval")
+
+# Written next to index.faiss by knowledge.py
+BM25_FILE = "bm25.npz"
+
+# "hybrid" fuses BM25 and vector scores, "dense" is plain FAISS search, "lexical" is BM25 only
+RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL", "hybrid")
+
+# Weight of the vector score in the fused score; the BM25 score gets the rest
+HYBRID_ALPHA = float(os.getenv("RAG_HYBRID_ALPHA", "0.5"))
+
+# Candidates taken from each of the vector and the lexical ranking before fusion
+FETCH_K = int(os.getenv("RAG_FETCH_K", "20"))
+
+# When set, only this many top BM25 candidates are scored against the query
+# vector and the FAISS search is skipped; queries without any matching term
+# still fall back to the full vector search. 0 disables the pre-filter.
+LEXICAL_PREFILTER = int(os.getenv("RAG_LEXICAL_PREFILTER", "0"))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lowercased words with accents folded, e.g. "Viertelnote" -> viertelnote and "Étude" -> etude"""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _TOKEN.findall(text)
+
+
+class BM25Index:
+    """
+    Inverted index with precomputed BM25 weights over the chunks of a FAISS store
+
+    Postings are stored term by term in flat arrays; each posting holds the
+    position of a chunk in the FAISS index and its BM25 weight for the term,
+    so scoring a query is a sum over the postings of its terms.
+    """
+
+    def __init__(self, terms, offsets, doc_positions, weights, docstore_ids):
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_positions = doc_positions
+        self.weights = weights
+        self.docstore_ids = docstore_ids
+        self._vocabulary = {term: i for i, term in enumerate(terms.tolist())}
+
+    def __len__(self):
+        return len(self.docstore_ids)
+
+    @classmethod
+    def build(cls, texts, docstore_ids, k1=BM25_K1, b=BM25_B):
+        """
+        Build the index of a list of chunks
+
+        Parameters:
+        texts (list): Chunk texts, in FAISS index order
+        docstore_ids (list): Docstore id of each chunk
+        """
+        counts = [Counter(tokenize(text)) for text in texts]
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+        average_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+
+        postings = {}
+        for position, counter in enumerate(counts):
+            for term, tf in counter.items():
+                postings.setdefault(term, []).append((position, tf))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        doc_positions = []
+        weights = []
+        for i, term in enumerate(terms):
+            docs = np.array([p for p, _ in postings[term]], dtype=np.int32)
+            tfs = np.array([tf for _, tf in postings[term]], dtype=np.float32)
+            idf = np.log(1 + (len(texts) - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = k1 * (1 - b + b * lengths[docs] / average_length)
+            doc_positions.append(docs)
+            weights.append((idf * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32))
+            offsets[i + 1] = offsets[i] + len(docs)
+
+        return cls(
+            np.array(terms, dtype=str),
+            offsets,
+            np.concatenate(doc_positions) if doc_positions else np.zeros(0, dtype=np.int32),
+            np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32),
+            np.array(docstore_ids, dtype=str),
+        )
+
+    def save(self, path):
+        # np.savez adds .npz to names without it, so the temporary name keeps the suffix
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp.npz"
+        np.savez(tmp_path, terms=self.terms, offsets=self.offsets, doc_positions=self.doc_positions,
+                 weights=self.weights, docstore_ids=self.docstore_ids)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["terms"], data["offsets"], data["doc_positions"], data["weights"], data["docstore_ids"])
+
+    def scores(self, query):
+        """
+        BM25 score of every chunk for a query
+
+        Returns:
+        numpy.ndarray: float32 scores in FAISS index order; 0 for chunks without any query term
+        """
+        scores = np.zeros(len(self.docstore_ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            i = self._vocabulary.get(term)
+            if i is not None:
+                start, stop = self.offsets[i], self.offsets[i + 1]
+                scores[self.doc_positions[start:stop]] += self.weights[start:stop]
+        return scores
+
+
+def _docstore_ids(index_to_docstore_id):
+    return [index_to_docstore_id[i] for i in range(len(index_to_docstore_id))]
+
+
+def build_bm25_index(docstore, index_to_docstore_id):
+    """Build the BM25 index of a FAISS store's chunks"""
+    ids = _docstore_ids(index_to_docstore_id)
+    return BM25Index.build([docstore.search(i).page_content for i in ids], ids)
+
+
+def load_bm25_index(db, index_dir):
+    """
+    Load the BM25 index saved next to a FAISS store
+
+    Indexes built before knowledge.py wrote one, or that no longer match
+    the store, are rebuilt in memory.
+
+    Returns:
+    BM25Index: The index
+    """
+    path = os.path.join(index_dir, BM25_FILE)
+    ids = _docstore_ids(db.index_to_docstore_id)
+    try:
+        bm25 = BM25Index.load(path)
+        if bm25.docstore_ids.tolist() == ids:
+            return bm25
+        logger.warning(f"{path} does not match the FAISS index, rebuilding it in memory")
+    except FileNotFoundError:
+        logger.info(f"No {BM25_FILE} in {index_dir}, building the BM25 index in memory")
+    return build_bm25_index(db.docstore, db.index_to_docstore_id)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieves chunks by a weighted sum of BM25 and vector similarity
+
+    Both scores are min-max normalized over the candidates: the top fetch_k
+    chunks of the FAISS search and of BM25, or only the top prefilter BM25
+    chunks when the lexical pre-filter is on. Vector scores are the cosine
+    similarity of the stored vectors to the query, so the pre-filter never
+    needs the FAISS search.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: object
+    bm25: object = None
+    k: int = 3
+    mode: str = RETRIEVAL_MODE
+    alpha: float = HYBRID_ALPHA
+    fetch_k: int = FETCH_K
+    prefilter: int = LEXICAL_PREFILTER
+
+    def _document(self, position):
+        return self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[int(position)])
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        start = time.perf_counter()
+        if self.mode == "dense" or self.bm25 is None:
+            docs = self.vectorstore.similarity_search(query, k=self.k)
+        else:
+            lexical = self.bm25.scores(query)
+            if self.mode == "lexical":
+                matched = np.flatnonzero(lexical)
+                top = matched[np.argsort(-lexical[matched], kind="stable")[:self.k]]
+            else:
+                top = self._fuse(query, lexical)
+            docs = [self._document(position) for position in top]
+        metrics.observe(f"retrieval_{self.mode}", time.perf_counter() - start)
+        return docs
+
+    def _fuse(self, query, lexical):
+        index = self.vectorstore.index
+        vector = np.asarray(self.vectorstore.embeddings.embed_query(query), dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+
+        matched = np.flatnonzero(lexical)
+        if self.prefilter and len(matched):
+            candidates = matched[np.argsort(-lexical[matched], kind="stable")[:self.prefilter]]
+        else:
+            _, dense_top = index.search(vector[None, :], min(self.fetch_k, index.ntotal))
+            lexical_top = matched[np.argsort(-lexical[matched], kind="stable")[:self.fetch_k]]
+            candidates = np.union1d(dense_top[0][dense_top[0] >= 0], lexical_top)
+        if not len(candidates):
+            return candidates
+
+        vectors = index.reconstruct_batch(candidates.astype(np.int64))
+        dense = vectors @ vector / np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)
+        fused = self.alpha * _min_max(dense) + (1 - self.alpha) * _min_max(lexical[candidates])
+        return candidates[np.argsort(-fused, kind="stable")[:self.k]]
+
+
+def _min_max(scores):
+    low, high = scores.min(), scores.max()
+    return (scores - low) / (high - low) if high > low else np.ones_like(scores)
+
+
+def create_retriever(db, index_dir, k=3, **kwargs):
+    """
+    Create the retriever for a FAISS store according to RAG_RETRIEVAL
+
+    Parameters:
+    db (FAISS): The loaded store
+    index_dir (str): Directory it was loaded from, where its BM25 index is
+    k (int): Number of chunks to retrieve
+    kwargs: Overrides of HybridRetriever's mode, alpha, fetch_k and prefilter
+    """
+    mode = kwargs.pop("mode", RETRIEVAL_MODE)
+    bm25 = None if mode == "dense" else load_bm25_index(db, index_dir)
+    return HybridRetriever(vectorstore=db, bm25=bm25, k=k, mode=mode, **kwargs)
+
+
+def main(argv=None):
+    """Write the BM25 index of an existing FAISS index directory"""
+    argv = sys.argv[1:] if argv is None else argv
+    index_dir = argv[0] if argv else os.path.join(os.path.dirname(os.path.abspath(__file__)), "faiss_index")
+    with open(os.path.join(index_dir, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    start = time.perf_counter()
+    bm25 = build_bm25_index(docstore, index_to_docstore_id)
+    bm25.save(os.path.join(index_dir, BM25_FILE))
+    print(f"Indexed {len(bm25)} chunks, {len(bm25.terms)} terms in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+logger = logging.getLogger("job_queue")
+
+DATABASE_NAME = 'jobs.db'
+
+# Seconds between polls of the job table when a worker is idle
+POLL_INTERVAL = 0.5
+
+# Running jobs older than this are assumed to belong to a dead worker and are requeued
+STALE_JOB_TIMEOUT = timedelta(minutes=30)
+
+# Wakes local workers immediately when a job is enqueued from the same process
+_job_available = threading.Event()
+
+
+def get_db_connection():
+    """
+    Establishes and returns a connection to the job database.
+    """
+    db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), DATABASE_NAME)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def initialize_job_store():
+    """
+    Creates the jobs table if it doesn't already exist. WAL mode lets several
+    server and worker processes read job state while another one writes.
+    """
+    conn = get_db_connection()
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            stage TEXT,
+            audio_path TEXT NOT NULL,
+            params TEXT,
+            result TEXT,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT,
+            owner TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)')
+    conn.close()
+
+
+def create_job(audio_path, params=None, owner=None):
+    """
+    Enqueue a transcription job for an uploaded audio file
+
+    Parameters:
+    audio_path (str): Path to the uploaded audio file; it is deleted once the job has run
+    params (dict, optional): Options passed to the transcription pipeline
+    owner (str, optional): Id of the user the generated files count against (see artifact_store)
+
+    Returns:
+    str: The new job id
+    """
+    job_id = str(uuid.uuid4())
+    conn = get_db_connection()
+    conn.execute(
+        'INSERT INTO jobs (id, status, stage, audio_path, params, created_at, owner) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (job_id, 'queued', 'queued', audio_path, json.dumps(params or {}), datetime.now().isoformat(), owner)
+    )
+    conn.close()
+    _job_available.set()
+    logger.info(f"Enqueued job {job_id} for {audio_path}")
+    return job_id
+
+
+def get_job(job_id):
+    """
+    Returns the job as a dict, or None if the id is unknown.
+    """
+    conn = get_db_connection()
+    row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    conn.close()
+    if row is None:
+        return None
+    job = dict(row)
+    job['params'] = json.loads(job['params']) if job['params'] else {}
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest queued job to 'running' and return it.
+
+    Returns:
+    dict: The claimed job, or None if the queue is empty
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+        ).fetchone()
+        if row is None:
+            conn.execute('COMMIT')
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', stage = 'starting', started_at = ? WHERE id = ?",
+            (datetime.now().isoformat(), row['id'])
+        )
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    return get_job(row['id'])
+
+
+def update_job_stage(job_id, stage):
+    conn = get_db_connection()
+    conn.execute('UPDATE jobs SET stage = ? WHERE id = ?', (stage, job_id))
+    conn.close()
+
+
+def finish_job(job_id, result=None, error=None):
+    """
+    Record the outcome of a job; a job with an error is marked 'failed'.
+    """
+    status = 'failed' if error else 'done'
+    conn = get_db_connection()
+    conn.execute(
+        'UPDATE jobs SET status = ?, stage = ?, result = ?, error = ?, finished_at = ? WHERE id = ?',
+        (status, status, json.dumps(result) if result is not None else None, error,
+         datetime.now().isoformat(), job_id)
+    )
+    conn.close()
+
+
+def requeue_stale_jobs(timeout=STALE_JOB_TIMEOUT):
+    """
+    Put jobs that have been 'running' for longer than the timeout back into the queue.
+
+    Returns:
+    int: Number of requeued jobs
+    """
+    cutoff = (datetime.now() - timeout).isoformat()
+    conn = get_db_connection()
+    cursor = conn.execute(
+        "UPDATE jobs SET status = 'queued', stage = 'queued', started_at = NULL "
+        "WHERE status = 'running' AND started_at < ?",
+        (cutoff,)
+    )
+    conn.close()
+    if cursor.rowcount:
+        logger.warning(f"Requeued {cursor.rowcount} stale jobs")
+    return cursor.rowcount
+
+
+def run_transcription_job(job):
+    """
+    Run the /upload pipeline for a claimed job, reporting each stage to the job store
+
+    Parameters:
+    job (dict): Job as returned by claim_next_job
+
+    Returns:
+    dict: midi_path and xml_path of the generated files
+    """
+    from audio_to_midi import convert_audio_to_midi
+    from sheet_music import generate_sheet_music
+    import artifact_store
+    import transcription_cache
+
+    def report(stage):
+        update_job_stage(job['id'], stage)
+
+    try:
+        # The same file may have been queued twice before the first job finished
+        key = transcription_cache.cache_key(job['audio_path'], job['params'])
+        cached = transcription_cache.lookup(key)
+        if cached is not None:
+            return cached
+
+        midi_path = convert_audio_to_midi(job['audio_path'], progress_callback=report, **job['params'])
+        report('generating_sheet_music')
+        xml_path, _ = generate_sheet_music(midi_path)
+        # The quota check of one file must not evict the other file of the same job
+        artifact_store.register(midi_path, 'midi', owner=job.get('owner'), keep=[xml_path])
+        artifact_store.register(xml_path, 'xml', owner=job.get('owner'), keep=[midi_path])
+        transcription_cache.store(key, midi_path, xml_path)
+    finally:
+        if os.path.exists(job['audio_path']):
+            os.unlink(job['audio_path'])
+    return {'midi_path': midi_path, 'xml_path': xml_path}
+
+
+def _worker_loop(stop_event):
+    # Load the pipeline before the first job arrives; the librosa warm-up
+    # itself follows LIBROSA_WARMUP (see audio_to_midi.py)
+    import audio_to_midi  # noqa: F401
+    import sheet_music  # noqa: F401
+
+    while not stop_event.is_set():
+        job = claim_next_job()
+        if job is None:
+            _job_available.wait(POLL_INTERVAL)
+            _job_available.clear()
+            continue
+
+        logger.info(f"Worker {threading.current_thread().name} running job {job['id']}")
+        try:
+            result = run_transcription_job(job)
+            finish_job(job['id'], result=result)
+            logger.info(f"Job {job['id']} finished")
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed: {e}")
+            finish_job(job['id'], error=str(e))
+
+
+def start_workers(num_workers):
+    """
+    Start background threads that process queued jobs
+
+    Parameters:
+    num_workers (int): Number of worker threads; 0 starts none (use `python jobs.py` instead)
+
+    Returns:
+    threading.Event: Set it to stop the workers after their current job
+    """
+    initialize_job_store()
+    requeue_stale_jobs()
+    stop_event = threading.Event()
+    for i in range(num_workers):
+        thread = threading.Thread(target=_worker_loop, args=(stop_event,), name=f"job-worker-{i}", daemon=True)
+        thread.start()
+    logger.info(f"Started {num_workers} job workers")
+    return stop_event
+
+
+if __name__ == '__main__':
+    # Standalone worker process sharing the job store with the web server
+    parser = argparse.ArgumentParser(description="Process queued /upload transcription jobs")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("UPLOAD_WORKERS", "2")),
+                        help="Number of worker threads")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    stop = start_workers(args.workers)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop.set()
@@ -1,166 +1,440 @@
-import fitz  # PyMuPDF
+import argparse
+import json
 import logging
+import os
+import queue
+import re
+import shutil
+import sys
+import threading
 import time
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 from dotenv import load_dotenv
-import os
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.chains import RetrievalQA
-from langchain_openai import ChatOpenAI
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("knowledge_processing.log"),
-        logging.StreamHandler()
-    ]
-)
+
+from embedding_backends import BACKEND_FILE, BACKENDS, EMBEDDING_BACKEND, create_embeddings, write_index_backend
+from hashing import file_sha256
+from hybrid_retrieval import BM25_FILE, build_bm25_index
+
 logger = logging.getLogger("knowledge_processor")
 
-# Start timing the process
-start_time = time.time()
-logger.info("Starting knowledge processing script")
-
-# Load environment variables
-logger.info("Loading environment variables")
-load_dotenv()
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    logger.error("OPENAI_API_KEY not found in environment variables")
-    raise ValueError("OPENAI_API_KEY not found. Please check your .env file.")
-logger.info("Environment variables loaded successfully")
-
-# Open and read the PDF
-pdf_path = "Books/music-theory.pdf"
-logger.info(f"Opening PDF file: {pdf_path}")
-try:
-    doc = fitz.open(pdf_path)
-    logger.info(f"PDF opened successfully. Document has {len(doc)} pages")
-    
-    logger.info("Extracting text from PDF")
-    # Extract text with page numbers
-    text_with_pages = []
-    for page_num, page in enumerate(doc):
-        page_text = page.get_text()
-        # Add page reference to each chunk
-        text_with_pages.append(f"[Page {page_num + 1}] {page_text}")
-    
-    text = "\n".join(text_with_pages)
-    logger.info(f"Text extraction complete. Extracted {len(text)} characters")
-except Exception as e:
-    logger.error(f"Error opening or reading PDF: {e}")
-    raise
-
-# Split text into chunks
-logger.info("Splitting text into chunks")
-splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-chunks = splitter.split_text(text)
-logger.info(f"Text split into {len(chunks)} chunks")
-
-# Create embeddings
-logger.info("Initializing OpenAI embeddings")
-try:
-    embeddings = OpenAIEmbeddings()
-    logger.info("OpenAI embeddings initialized successfully")
-except Exception as e:
-    logger.error(f"Error initializing OpenAI embeddings: {e}")
-    raise
-
-# Create vector store
-logger.info("Creating FAISS vector store from text chunks")
-try:
-    db = FAISS.from_texts(chunks, embedding=embeddings)
-    logger.info("FAISS vector store created successfully")
-except Exception as e:
-    logger.error(f"Error creating FAISS vector store: {e}")
-    raise
-
-# Save the vector store
-logger.info("Saving FAISS index to disk")
-try:
-    db.save_local("faiss_index")
-    logger.info("FAISS index saved successfully")
-except Exception as e:
-    logger.error(f"Error saving FAISS index: {e}")
-    raise
-
-# Set up retriever and LLM
-logger.info("Setting up retriever from vector store")
-retriever = db.as_retriever(
-    search_kwargs={"k": 3}  # Retrieve top 3 most relevant chunks
-)
-logger.info("Retriever set up successfully")
-
-logger.info("Initializing ChatOpenAI model")
-try:
-    llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0)
-    logger.info("ChatOpenAI model initialized successfully")
-except Exception as e:
-    logger.error(f"Error initializing ChatOpenAI model: {e}")
-    raise
-
-# Create RAG chain with custom prompt
-logger.info("Creating RetrievalQA chain")
-try:
-    from langchain.prompts import PromptTemplate
-    
-    # Custom prompt that asks for source references
-    template = """
-    You are an AI assistant helping with music education questions.
-    
-    Use the following pieces of context to answer the question at the end.
-    Include the page numbers from the source material in your response.
-    
-    {context}
-    
-    Question: {question}
-    
-    Answer (include page references in parentheses):
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+
+# Pages each extraction task reads; small enough to spread one large book over all workers
+PAGES_PER_TASK = 8
+
+# Chunks sent to the embedding model per request
+EMBED_BATCH_SIZE = 64
+
+# Embedding requests in flight at once
+EMBED_WORKERS = 4
+
+# Bound on the items waiting between two stages, so a fast stage cannot run ahead of a slow one
+QUEUE_SIZE = 256
+
+# Per-book chunk lists of completed books, kept next to the index
+CHECKPOINT_DIR = ".ingest"
+
+PAGE_MARKER = re.compile(r"\[Page (\d+)\]")
+
+_DONE = object()
+
+
+def collect_books(inputs):
+    """
+    Expand directories into the PDF files they contain
+
+    Parameters:
+    inputs (list): Directories or PDF files
+
+    Returns:
+    list: Paths of PDF files in a stable order
+    """
+    books = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                books.extend(os.path.join(root, name) for name in sorted(names) if name.lower().endswith(".pdf"))
+        elif os.path.isfile(path):
+            books.append(path)
+        else:
+            raise FileNotFoundError(f"Input not found: {path}")
+    return books
+
+
+def extract_pages(pdf_path, start, stop):
+    """
+    Extract the text of a range of pages inside a worker process
+
+    Returns:
+    list: (page number starting at 1, text) tuples
+    """
+    import fitz  # PyMuPDF
+
+    with fitz.open(pdf_path) as doc:
+        return [(page_num + 1, doc[page_num].get_text()) for page_num in range(start, min(stop, len(doc)))]
+
+
+def _page_count(pdf_path):
+    import fitz  # PyMuPDF
+
+    with fitz.open(pdf_path) as doc:
+        return len(doc)
+
+
+class _Stage(threading.Thread):
+    """Runs one pipeline stage in a thread and keeps its exception for the main thread"""
+
+    def __init__(self, name, target, out_queue, stop):
+        super().__init__(name=name, daemon=True)
+        self._target_fn = target
+        self.out_queue = out_queue
+        self.stop = stop
+        self.error = None
+
+    def run(self):
+        try:
+            self._target_fn()
+        except Exception as e:
+            self.error = e
+        finally:
+            _put(self.out_queue, _DONE, self.stop)
+
+
+def _put(q, item, stop):
+    # Give up when the pipeline is shutting down instead of blocking on a full queue
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            pass
+
+
+def _get(q, stop):
+    # Returns _DONE when the pipeline is shutting down instead of waiting for an item forever
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            pass
+    return _DONE
+
+
+def _extract(books, pool, page_queue, stop, workers):
+    """
+    Extraction stage: read page ranges over the process pool and queue the pages in book order
+
+    At most twice as many ranges as workers are in flight, and each is
+    queued as soon as it and the ranges before it are done. A page with
+    text None marks the end of a book.
+    """
+    in_flight = deque()
+
+    def drain(limit):
+        while len(in_flight) > limit and not stop.is_set():
+            book, future = in_flight.popleft()
+            pages = future.result() if future is not None else [(None, None)]
+            for page_num, text in pages:
+                _put(page_queue, (book, page_num, text), stop)
+
+    for book in books:
+        for start in range(0, _page_count(book), PAGES_PER_TASK):
+            in_flight.append((book, pool.submit(extract_pages, book, start, start + PAGES_PER_TASK)))
+            drain(2 * workers)
+        in_flight.append((book, None))
+        drain(2 * workers)
+    drain(0)
+
+
+def _chunk(page_queue, chunk_queue, stop):
     """
-    
-    PROMPT = PromptTemplate(
-        template=template,
-        input_variables=["context", "question"]
+    Chunking stage: split each book's pages into chunks as they arrive
+
+    Pages are prefixed with "[Page N]" so answers can cite them. The text
+    after the last complete chunk is carried over to the next page, so
+    chunks still span page boundaries as when a book was split as a whole.
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    carry = ""
+    last_page = 1
+
+    def emit(text):
+        nonlocal last_page
+        # The chunk's page is the first page marker in it, or the page the previous chunk ended on
+        pages = [int(p) for p in PAGE_MARKER.findall(text)]
+        _put(chunk_queue, (book, text, {"source": os.path.basename(book), "page": pages[0] if pages else last_page}), stop)
+        if pages:
+            last_page = pages[-1]
+
+    while True:
+        item = _get(page_queue, stop)
+        if item is _DONE:
+            break
+        book, page_num, text = item
+        if text is None:
+            if carry:
+                emit(carry)
+            _put(chunk_queue, (book, None, None), stop)
+            carry, last_page = "", 1
+            continue
+        if not text.strip():
+            continue
+        chunks = splitter.split_text(f"{carry}\n[Page {page_num}] {text}" if carry else f"[Page {page_num}] {text}")
+        for chunk in chunks[:-1]:
+            emit(chunk)
+        carry = chunks[-1] if chunks else carry
+
+
+def _checkpoint_path(index_dir, sha256):
+    return os.path.join(index_dir, CHECKPOINT_DIR, f"{sha256}.json")
+
+
+def load_checkpoint(index_dir, sha256):
+    """Chunks of a book that was completely embedded before, or None"""
+    try:
+        with open(_checkpoint_path(index_dir, sha256), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable checkpoint for {sha256}: {e}")
+        return None
+
+
+def save_checkpoint(index_dir, sha256, chunks):
+    path = _checkpoint_path(index_dir, sha256)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(chunks, f)
+    os.replace(tmp_path, path)
+
+
+def ingest(books, embeddings, index_dir, backend="openai", workers=None, embed_workers=EMBED_WORKERS,
+           batch_size=EMBED_BATCH_SIZE, force=False):
+    """
+    Extract, chunk and embed a set of PDF books and save them as one FAISS index
+
+    The stages run concurrently and are connected by bounded queues: page
+    ranges are extracted over a process pool, a chunker thread splits the
+    pages as they arrive, and the main thread sends batches of chunks to
+    the embedding model over a thread pool.
+
+    A crash does not start the ingestion over. Every embedded chunk is kept
+    by CachedEmbeddings, and the chunks of each completed book are saved as
+    a checkpoint under index_dir, keyed by the PDF's SHA-256. Books with a
+    checkpoint are neither extracted nor embedded again.
+
+    Parameters:
+    books (list): Paths of PDF files
+    embeddings (Embeddings): Embedding model, usually wrapped in CachedEmbeddings
+    index_dir (str): Directory the FAISS index is saved to
+    backend (str): Embedding backend recorded with the index, one of embedding_backends.BACKENDS
+    workers (int, optional): Extraction processes. Defaults to the number of CPUs.
+    embed_workers (int): Embedding requests in flight at once
+    batch_size (int): Chunks per embedding request
+    force (bool): Ignore checkpoints and process every book
+
+    Returns:
+    dict: "chunks" and "books" (numbers in the index), "resumed" (books read
+    from a checkpoint) and "timings" (seconds per phase)
+    """
+    from langchain_community.vectorstores import FAISS
+
+    timings = {}
+    start = time.perf_counter()
+    shas = {book: file_sha256(book) for book in books}
+    checkpoints = {}
+    for book in books:
+        checkpoint = None if force else load_checkpoint(index_dir, shas[book])
+        if checkpoint is not None:
+            checkpoints[book] = checkpoint
+    pending = [book for book in books if book not in checkpoints]
+    timings["hash"] = time.perf_counter() - start
+    logger.info(f"{len(pending)} books to ingest, {len(checkpoints)} resumed from checkpoints")
+
+    # book -> list of (text, metadata, vector); done holds the books that are complete
+    collected = {book: [] for book in pending}
+    done = {}
+    remaining = {book: 0 for book in pending}
+    finished = set()
+
+    def finish(book):
+        chunks = collected.pop(book)
+        save_checkpoint(index_dir, shas[book], [[text, metadata] for text, metadata, _ in chunks])
+        done[book] = chunks
+        if not chunks:
+            logger.warning(f"No text found in {book}; scanned books need OCR first")
+        logger.info(f"Ingested {os.path.basename(book)}: {len(chunks)} chunks")
+
+    pipeline_start = time.perf_counter()
+    if pending:
+        workers = workers or os.cpu_count() or 1
+        page_queue = queue.Queue(maxsize=QUEUE_SIZE)
+        chunk_queue = queue.Queue(maxsize=QUEUE_SIZE)
+        stop = threading.Event()
+        with ProcessPoolExecutor(max_workers=workers) as extract_pool, \
+                ThreadPoolExecutor(max_workers=embed_workers, thread_name_prefix="embed") as embed_pool:
+            extractor = _Stage("extract", lambda: _extract(pending, extract_pool, page_queue, stop, workers),
+                               page_queue, stop)
+            chunker = _Stage("chunk", lambda: _chunk(page_queue, chunk_queue, stop), chunk_queue, stop)
+            extractor.start()
+            chunker.start()
+
+            in_flight = deque()
+
+            def collect(limit):
+                while len(in_flight) > limit:
+                    batch, future = in_flight.popleft()
+                    for (book, text, metadata), vector in zip(batch, future.result()):
+                        collected[book].append((text, metadata, vector))
+                        remaining[book] -= 1
+                    for book in {book for book, _, _ in batch}:
+                        if book in finished and remaining[book] == 0 and book in collected:
+                            finish(book)
+
+            batch = []
+            try:
+                while True:
+                    item = _get(chunk_queue, stop)
+                    if item is _DONE:
+                        break
+                    book, text, metadata = item
+                    if text is None:
+                        finished.add(book)
+                        if remaining[book] == 0:
+                            finish(book)
+                        continue
+                    remaining[book] += 1
+                    batch.append(item)
+                    if len(batch) >= batch_size:
+                        in_flight.append((batch, embed_pool.submit(embeddings.embed_documents, [t for _, t, _ in batch])))
+                        batch = []
+                        collect(2 * embed_workers)
+                if batch:
+                    in_flight.append((batch, embed_pool.submit(embeddings.embed_documents, [t for _, t, _ in batch])))
+                collect(0)
+            finally:
+                stop.set()
+                extractor.join()
+                chunker.join()
+            for stage in (extractor, chunker):
+                if stage.error is not None:
+                    raise stage.error
+    timings["pipeline"] = time.perf_counter() - pipeline_start
+
+    # Books resumed from a checkpoint get their vectors from the embedding cache
+    resume_start = time.perf_counter()
+    for book, chunks in checkpoints.items():
+        vectors = embeddings.embed_documents([text for text, _ in chunks]) if chunks else []
+        done[book] = [(text, metadata, vector) for (text, metadata), vector in zip(chunks, vectors)]
+    timings["resume"] = time.perf_counter() - resume_start
+
+    save_start = time.perf_counter()
+    rows = [row for book in books for row in done[book]]
+    if not rows:
+        raise ValueError("No text found in any of the books")
+    db = FAISS.from_embeddings(
+        [(text, vector) for text, _, vector in rows],
+        embeddings,
+        metadatas=[metadata for _, metadata, _ in rows],
     )
-    
-    rag_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",
-        retriever=retriever,
-        chain_type_kwargs={"prompt": PROMPT}
+    save_index(db, index_dir, backend, embeddings)
+    timings["save"] = time.perf_counter() - save_start
+    return {"chunks": len(rows), "books": len(books), "resumed": len(books) - len(pending), "timings": timings}
+
+
+def save_index(db, index_dir, backend, embeddings):
+    """
+    Save a FAISS store so that readers never see a half-written index
+
+    Every file (the store, its BM25 index and the embedding backend record)
+    is first written completely to a temporary directory next to index_dir
+    and then moved into place with os.replace. The backend record goes last,
+    like the manifest of corpus_build.py, so it never describes vectors that
+    are not there yet; rag.py watches it along with the store's files.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    tmp_dir = f"{index_dir.rstrip(os.sep)}.{uuid.uuid4().hex}.tmp"
+    try:
+        db.save_local(tmp_dir)
+        build_bm25_index(db.docstore, db.index_to_docstore_id).save(os.path.join(tmp_dir, BM25_FILE))
+        write_index_backend(tmp_dir, backend, embeddings)
+        for name in (BM25_FILE, "index.faiss", "index.pkl", BACKEND_FILE):
+            os.replace(os.path.join(tmp_dir, name), os.path.join(index_dir, name))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the FAISS knowledge index from a library of PDF books")
+    parser.add_argument("inputs", nargs="*", default=[os.path.join(BASE_DIR, "Books")],
+                        help="PDF files or directories of PDFs (default: Books)")
+    parser.add_argument("--index-dir", default=os.path.join(BASE_DIR, "faiss_index"),
+                        help="Directory the index is saved to (default: faiss_index)")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: all CPUs)")
+    parser.add_argument("--embed-workers", type=int, default=EMBED_WORKERS,
+                        help=f"Embedding requests in flight (default: {EMBED_WORKERS})")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE,
+                        help=f"Chunks per embedding request (default: {EMBED_BATCH_SIZE})")
+    parser.add_argument("--embeddings", choices=BACKENDS, default=EMBEDDING_BACKEND or "openai",
+                        help="Embedding backend; the index must be queried with the same one (default: openai)")
+    parser.add_argument("--force", action="store_true", help="Ignore checkpoints and re-extract every book")
+    parser.add_argument("--query", help="Print the chunks retrieved for a question once the index is built")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("knowledge_processing.log"),
+            logging.StreamHandler()
+        ]
     )
-    
-    logger.info("RetrievalQA chain created successfully")
-except Exception as e:
-    logger.error(f"Error creating RetrievalQA chain: {e}")
-    raise
-
-# Run query
-query = "How do I position my hands when starting to play?"
-logger.info(f"Running query: '{query}'")
-try:
-    response = rag_chain.invoke(query)
-    logger.info("Query completed successfully")
-    logger.info(f"Response length: {len(str(response))} characters")
-    
-    # Extract the answer from the response
-    if isinstance(response, dict) and "result" in response:
-        answer = response["result"]
-    else:
-        answer = str(response)
-    
-    logger.info(f"Answer: {answer}")
-except Exception as e:
-    logger.error(f"Error running query: {e}")
-    raise
-
-# Print response
-print(answer)
-
-# Log execution time
-end_time = time.time()
-execution_time = end_time - start_time
-logger.info(f"Script completed in {execution_time:.2f} seconds")
+    start_time = time.time()
+    logger.info("Starting knowledge processing")
+
+    load_dotenv()
+    if args.embeddings == "openai" and not os.getenv("OPENAI_API_KEY"):
+        logger.error("OPENAI_API_KEY not found in environment variables")
+        raise ValueError("OPENAI_API_KEY not found. Please check your .env file.")
+
+    from embedding_cache import CachedEmbeddings
+
+    books = collect_books(args.inputs)
+    if not books:
+        print("No PDF books found.")
+        return 1
+
+    embeddings = create_embeddings(args.embeddings)
+    if args.embeddings == "openai":
+        # Chunks embedded by an earlier run are read from embedding_cache.db instead of the API
+        embeddings = CachedEmbeddings(embeddings)
+    result = ingest(books, embeddings, args.index_dir, backend=args.embeddings, workers=args.workers, embed_workers=args.embed_workers,
+                    batch_size=args.batch_size, force=args.force)
+    timings = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in result["timings"].items())
+    logger.info(f"Indexed {result['chunks']} chunks from {result['books']} books "
+                f"({result['resumed']} resumed) into {args.index_dir} with {args.embeddings} embeddings: {timings}")
+
+    if args.query:
+        from langchain_community.vectorstores import FAISS
+
+        db = FAISS.load_local(args.index_dir, embeddings, allow_dangerous_deserialization=True)
+        for doc in db.similarity_search(args.query, k=3):
+            print(f"--- {doc.metadata.get('source')} p. {doc.metadata.get('page')}\n{doc.page_content}\n")
+
+    logger.info(f"Script completed in {time.time() - start_time:.2f} seconds")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pretty_midi
+
+from streaming_transcription import StreamingTranscriber
+
+logger = logging.getLogger("audio_converter")
+
+# Processing time per chunk above which a warning is logged (in milliseconds)
+LATENCY_BUDGET_MS = 150
+
+# Larger chunks are rejected because their processing time would exceed the latency budget
+MAX_CHUNK_SECONDS = 1.0
+
+# Sample rates accepted from the browser
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 96000
+
+
+class LiveTranscriptionSession:
+    """
+    Transcribe audio that arrives in chunks while it is being recorded
+
+    Chunks are raw little-endian float32 mono PCM as produced by the Web Audio
+    API. Onset detection and pitch estimation run incrementally through
+    StreamingTranscriber with the same parameters as convert_audio_to_midi.
+    Every chunk yields note events for the client:
+
+    - {"type": "note_on", "start", "pitch"} as soon as a new note's pitch is known
+    - {"type": "note", "start", "end", "pitch", "velocity"} when the note is finished
+    """
+
+    def __init__(self, sr, max_chunk_seconds=MAX_CHUNK_SECONDS):
+        if not MIN_SAMPLE_RATE <= sr <= MAX_SAMPLE_RATE:
+            raise ValueError(f"Unsupported sample rate: {sr}")
+        self.sr = sr
+        self.max_chunk_samples = int(max_chunk_seconds * sr)
+        self.samples_received = 0
+        self._transcriber = StreamingTranscriber(sr)
+        self._announced_start = None
+        self._closed = False
+
+    @property
+    def audio_seconds(self):
+        return self.samples_received / self.sr
+
+    @property
+    def notes(self):
+        return self._transcriber.notes
+
+    def feed(self, chunk):
+        """
+        Process the next chunk of PCM audio
+
+        Parameters:
+        chunk (bytes): Little-endian float32 mono samples
+
+        Returns:
+        tuple: (events, processing_ms) - note events for the client and the time spent on the chunk
+        """
+        if self._closed:
+            raise RuntimeError("Session is closed")
+        if len(chunk) % 4:
+            raise ValueError("Chunk length is not a multiple of 4 bytes (float32 samples)")
+        samples = np.frombuffer(chunk, dtype="<f4")
+        if len(samples) > self.max_chunk_samples:
+            raise ValueError(f"Chunk of {len(samples)} samples exceeds the limit of {self.max_chunk_samples}")
+
+        start = time.perf_counter()
+        self.samples_received += len(samples)
+        events = self._note_events(self._transcriber.process(samples))
+        processing_ms = (time.perf_counter() - start) * 1000
+        if processing_ms > LATENCY_BUDGET_MS:
+            logger.warning(f"Live chunk of {len(samples)} samples took {processing_ms:.0f} ms")
+        return events, processing_ms
+
+    def close(self, output_dir=None):
+        """
+        Flush the remaining audio and write all notes of the session to a MIDI file
+
+        Parameters:
+        output_dir (str, optional): Directory to save the MIDI file. Defaults to static/midi.
+
+        Returns:
+        tuple: (events, midi_path) - the last note events and the MIDI path, or None if no notes were found
+        """
+        if self._closed:
+            return [], None
+        self._closed = True
+        events = self._note_events(self._transcriber.finish())
+        if not self.notes:
+            logger.info(f"Live session closed after {self.audio_seconds:.1f}s without notes")
+            return events, None
+
+        static_midi_dir = output_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "midi")
+        os.makedirs(static_midi_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Sessions closing within the same second must not overwrite each other's files
+        midi_path = os.path.join(static_midi_dir, f"live_{timestamp}_{uuid.uuid4().hex[:8]}.mid")
+
+        pm = pretty_midi.PrettyMIDI()
+        piano_program = pretty_midi.instrument_name_to_program('Acoustic Grand Piano')
+        piano = pretty_midi.Instrument(program=piano_program)
+        piano.notes.extend(self.notes)
+        pm.instruments.append(piano)
+        pm.write(midi_path)
+        logger.info(f"Live session wrote {len(self.notes)} notes ({self.audio_seconds:.1f}s of audio) to {midi_path}")
+        return events, midi_path
+
+    def _note_events(self, finished_notes):
+        events = [
+            {"type": "note", "start": n.start, "end": n.end, "pitch": n.pitch, "velocity": n.velocity}
+            for n in finished_notes
+        ]
+        open_note = self._transcriber.open_note()
+        if open_note is not None and open_note[0] != self._announced_start:
+            self._announced_start = open_note[0]
+            events.append({"type": "note_on", "start": open_note[0], "pitch": open_note[1]})
+        return events
@@ -0,0 +1,38 @@
+import threading
+
+# Process-wide counters and timings, reported by the /metrics endpoint
+_counters = {}
+_timings = {}
+_lock = threading.Lock()
+
+
+def increment(name, value=1):
+    """Add value to a counter"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name, seconds):
+    """Record one duration of a timed operation"""
+    with _lock:
+        timing = _timings.setdefault(name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        timing["count"] += 1
+        timing["total_seconds"] += seconds
+        timing["max_seconds"] = max(timing["max_seconds"], seconds)
+        timing["last_seconds"] = seconds
+
+
+def snapshot():
+    """
+    Current values of all metrics
+
+    Returns:
+    dict: "counters" (name -> value) and "timings" (name -> count,
+    total_seconds, mean_seconds, max_seconds and last_seconds)
+    """
+    with _lock:
+        timings = {
+            name: dict(timing, mean_seconds=timing["total_seconds"] / timing["count"])
+            for name, timing in _timings.items()
+        }
+        return {"counters": dict(_counters), "timings": timings}
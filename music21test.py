@@ -1,5 +1,5 @@
-from music21 import converter
+from score_cache import parse_score
 
 
-s = converter.parse("test1.mxl")
+s = parse_score("test1.mxl")
 s.show()
\ No newline at end of file
@@ -6,7 +6,8 @@ import json
 from datetime import datetime
 from dotenv import load_dotenv
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import OpenAIEmbeddings
+from embedding_backends import embeddings_for_index
+from hybrid_retrieval import create_retriever
 from langchain.chains import RetrievalQA
 from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
@@ -38,7 +39,7 @@ def initialize_chatbot():
     logger.info("Loading FAISS index from disk")
     # In the initialize_chatbot function:
     try:
-        embeddings = OpenAIEmbeddings()
+        embeddings = embeddings_for_index("faiss_index")
         db = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
         logger.info("FAISS index loaded successfully")
     except Exception as e:
@@ -47,9 +48,7 @@ def initialize_chatbot():
     
     # Set up retriever
     logger.info("Setting up retriever")
-    retriever = db.as_retriever(
-        search_kwargs={"k": 3}  # Retrieve top 3 most relevant chunks
-    )
+    retriever = create_retriever(db, "faiss_index", k=3)  # Retrieve top 3 most relevant chunks
     
     # Initialize LLM
     logger.info("Initializing ChatOpenAI model")
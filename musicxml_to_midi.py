@@ -1,6 +1,7 @@
 import os
 import logging
-from music21 import converter
+
+from score_cache import parse_score
 
 # Configure logging
 logging.basicConfig(
@@ -38,9 +39,9 @@ def convert_musicxml_to_midi(musicxml_path, output_dir=None):
         base_name = os.path.splitext(os.path.basename(musicxml_path))[0]
         midi_path = os.path.join(output_dir, f"{base_name}.mid")
         
-        # Parse the MusicXML file with music21
+        # Parse the MusicXML file with music21 (repeated files come from the score cache)
         logger.info("Parsing MusicXML with music21")
-        score = converter.parse(musicxml_path)
+        score = parse_score(musicxml_path)
         
         # Write the score as MIDI
         logger.info(f"Writing MIDI file to {midi_path}")
@@ -0,0 +1,298 @@
+import logging
+from math import gcd
+from xml.sax.saxutils import XMLGenerator
+
+import numpy as np
+
+from quantization import BEATS_PER_MEASURE
+
+logger = logging.getLogger("sheet_music")
+
+# Finest grid (divisions per quarter note) the writer accepts; anything finer
+# is treated as unquantized and left to music21
+MAX_DIVISIONS = 16
+
+# Note values in quarter notes with their MusicXML type names, longest first
+NOTE_TYPES = [
+    (4.0, "whole"), (2.0, "half"), (1.0, "quarter"), (0.5, "eighth"),
+    (0.25, "16th"), (0.125, "32nd"), (0.0625, "64th"),
+]
+
+# Spelling of the twelve pitch classes as (step, alter) for sharp and flat keys
+SHARP_SPELLING = [("C", 0), ("C", 1), ("D", 0), ("D", 1), ("E", 0), ("F", 0),
+                  ("F", 1), ("G", 0), ("G", 1), ("A", 0), ("A", 1), ("B", 0)]
+FLAT_SPELLING = [("C", 0), ("D", -1), ("D", 0), ("E", -1), ("E", 0), ("F", 0),
+                 ("G", -1), ("G", 0), ("A", -1), ("A", 0), ("B", -1), ("B", 0)]
+
+# Order in which key signatures add sharps (flats use the reverse order)
+SHARP_ORDER = ["F", "C", "G", "D", "A", "E", "B"]
+
+ACCIDENTALS = {-1: "flat", 0: "natural", 1: "sharp"}
+
+MAJOR_SCALE = [0, 2, 4, 5, 7, 9, 11]
+
+DOCTYPE = ('<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 3.1 Partwise//EN" '
+           '"http://www.musicxml.org/dtds/partwise.dtd">\n')
+
+
+def note_groups(pm):
+    """
+    Turn the notes of a quantized PrettyMIDI into a single voice of chords
+
+    Parameters:
+    pm (pretty_midi.PrettyMIDI): Notes on a regular grid with a single tempo
+
+    Returns:
+    tuple: (groups, divisions) where groups is a list of (start, end, pitches)
+    in divisions of a quarter note, or None if the input needs music21 (several
+    instruments or tempi, off-grid timing, a grid that note values cannot
+    fill such as fifths of a beat, or overlapping notes that do not form chords)
+    """
+    if len(pm.instruments) != 1 or len(pm.get_tempo_changes()[1]) != 1 or not pm.instruments[0].notes:
+        return None
+    notes = pm.instruments[0].notes
+    starts = np.array([pm.time_to_tick(n.start) for n in notes])
+    ends = np.array([pm.time_to_tick(n.end) for n in notes])
+    if np.any(starts < 0) or np.any(ends <= starts):
+        return None
+
+    # Coarsest grid that holds every start and end
+    step = gcd(int(np.gcd.reduce(np.concatenate([starts, ends]))), pm.resolution)
+    divisions = pm.resolution // step
+    if divisions > MAX_DIVISIONS:
+        return None
+    # Every span is filled greedily with note values, which only works if one division is a note value
+    if not any(value == 1 for value, _ in _note_values(divisions)):
+        return None
+    starts //= step
+    ends //= step
+
+    groups = []
+    for i in np.lexsort((np.array([n.pitch for n in notes]), starts)):
+        start, end, pitch = int(starts[i]), int(ends[i]), notes[i].pitch
+        if groups and groups[-1][0] == start:
+            if groups[-1][1] != end:
+                return None
+            groups[-1][2].append(pitch)
+        elif groups and start < groups[-1][1]:
+            return None
+        else:
+            groups.append((start, end, [pitch]))
+    return groups, divisions
+
+
+def estimate_key(groups):
+    """
+    Pick the major key signature whose scale covers the most note duration
+
+    Returns:
+    int: Number of sharps (positive) or flats (negative), from -6 to 6
+    """
+    weights = np.zeros(12)
+    for start, end, pitches in groups:
+        for pitch in pitches:
+            weights[pitch % 12] += end - start
+
+    def coverage(fifths):
+        tonic = (7 * fifths) % 12
+        return sum(weights[(tonic + interval) % 12] for interval in MAJOR_SCALE)
+
+    # Ties go to the key with fewer accidentals
+    return max(range(-6, 7), key=lambda fifths: (coverage(fifths), -abs(fifths)))
+
+
+def _note_values(divisions):
+    """Representable durations in divisions with their type and dot, longest first"""
+    values = {}
+    for quarters, name in NOTE_TYPES:
+        for dots, factor in ((0, 1.0), (1, 1.5)):
+            duration = quarters * factor * divisions
+            if duration >= 1 and duration == int(duration):
+                values.setdefault(int(duration), (name, dots))
+    return sorted(values.items(), reverse=True)
+
+
+class _ScoreWriter:
+    """Writes a single-part score measure by measure through an XMLGenerator"""
+
+    def __init__(self, out, divisions, fifths, clef, tempo):
+        self.gen = XMLGenerator(out, encoding="utf-8", short_empty_elements=True)
+        self.out = out
+        self.divisions = divisions
+        self.measure_length = BEATS_PER_MEASURE * divisions
+        self.note_values = _note_values(divisions)
+        self.fifths = fifths
+        self.spelling = SHARP_SPELLING if fifths >= 0 else FLAT_SPELLING
+        order = SHARP_ORDER if fifths >= 0 else SHARP_ORDER[::-1]
+        self.key_alters = {step: (1 if fifths > 0 else -1) for step in order[:abs(fifths)]}
+        self.clef = clef
+        self.tempo = tempo
+        self.measure = 0
+        self.measure_alters = {}
+
+    def element(self, name, text=None, attrs=None):
+        self.gen.startElement(name, attrs or {})
+        if text is not None:
+            self.gen.characters(str(text))
+        self.gen.endElement(name)
+
+    def start(self, title):
+        self.gen.startDocument()
+        self.out.write(DOCTYPE)
+        self.gen.startElement("score-partwise", {"version": "3.1"})
+        if title:
+            self.gen.startElement("work", {})
+            self.element("work-title", title)
+            self.gen.endElement("work")
+        self.gen.startElement("part-list", {})
+        self.gen.startElement("score-part", {"id": "P1"})
+        self.element("part-name", "Piano")
+        self.gen.endElement("score-part")
+        self.gen.endElement("part-list")
+        self.gen.startElement("part", {"id": "P1"})
+
+    def finish(self, end):
+        # Fill the last measure with rests
+        measure_end = -(-end // self.measure_length) * self.measure_length
+        if measure_end > end:
+            self.write_event(end, measure_end, [])
+        if self.measure:
+            self.gen.endElement("measure")
+        self.gen.endElement("part")
+        self.gen.endElement("score-partwise")
+        self.gen.endDocument()
+
+    def open_measure(self, number):
+        if self.measure:
+            self.gen.endElement("measure")
+        self.measure = number
+        self.measure_alters = {}
+        self.gen.startElement("measure", {"number": str(number)})
+        if number == 1:
+            self.write_attributes()
+
+    def write_attributes(self):
+        self.gen.startElement("attributes", {})
+        self.element("divisions", self.divisions)
+        self.gen.startElement("key", {})
+        self.element("fifths", self.fifths)
+        self.gen.endElement("key")
+        self.gen.startElement("time", {})
+        self.element("beats", BEATS_PER_MEASURE)
+        self.element("beat-type", 4)
+        self.gen.endElement("time")
+        self.gen.startElement("clef", {})
+        self.element("sign", self.clef[0])
+        self.element("line", self.clef[1])
+        self.gen.endElement("clef")
+        self.gen.endElement("attributes")
+
+        self.gen.startElement("direction", {"placement": "above"})
+        self.gen.startElement("direction-type", {})
+        self.gen.startElement("metronome", {})
+        self.element("beat-unit", "quarter")
+        self.element("per-minute", int(round(self.tempo)))
+        self.gen.endElement("metronome")
+        self.gen.endElement("direction-type")
+        self.element("sound", attrs={"tempo": f"{self.tempo:.2f}"})
+        self.gen.endElement("direction")
+
+    def write_event(self, start, end, pitches):
+        """Write a chord (or a rest if pitches is empty), split at barlines and into tied note values"""
+        position = start
+        while position < end:
+            number = position // self.measure_length + 1
+            if number != self.measure:
+                self.open_measure(number)
+            segment_end = min(end, number * self.measure_length)
+            while position < segment_end:
+                duration, (name, dots) = next(
+                    (value, kind) for value, kind in self.note_values if value <= segment_end - position
+                )
+                # Rests are split the same way but never tied
+                tie_stop = bool(pitches) and position > start
+                tie_start = bool(pitches) and position + duration < end
+                for i, pitch in enumerate(pitches or [None]):
+                    self.write_note(pitch, duration, name, dots, chord=i > 0, tie_start=tie_start, tie_stop=tie_stop)
+                position += duration
+
+    def write_note(self, pitch, duration, name, dots, chord, tie_start, tie_stop):
+        self.gen.startElement("note", {})
+        if chord:
+            self.element("chord")
+        accidental = None
+        if pitch is None:
+            self.element("rest")
+        else:
+            step, alter = self.spelling[pitch % 12]
+            octave = pitch // 12 - 1
+            current = self.measure_alters.get((step, octave), self.key_alters.get(step, 0))
+            if alter != current and not tie_stop:
+                accidental = ACCIDENTALS[alter]
+            self.measure_alters[(step, octave)] = alter
+            self.gen.startElement("pitch", {})
+            self.element("step", step)
+            if alter:
+                self.element("alter", alter)
+            self.element("octave", octave)
+            self.gen.endElement("pitch")
+        self.element("duration", duration)
+        if tie_stop:
+            self.element("tie", attrs={"type": "stop"})
+        if tie_start:
+            self.element("tie", attrs={"type": "start"})
+        self.element("voice", 1)
+        self.element("type", name)
+        for _ in range(dots):
+            self.element("dot")
+        if accidental:
+            self.element("accidental", accidental)
+        if tie_start or tie_stop:
+            self.gen.startElement("notations", {})
+            if tie_stop:
+                self.element("tied", attrs={"type": "stop"})
+            if tie_start:
+                self.element("tied", attrs={"type": "start"})
+            self.gen.endElement("notations")
+        self.gen.endElement("note")
+
+
+def write_musicxml(pm, xml_path, title=None):
+    """
+    Write quantized notes straight to MusicXML without building a music21 score
+
+    Supports what the transcription engines produce for a single line: one
+    part in 4/4, notes and chords on a regular grid that do not overlap. The
+    key signature is estimated from the notes and the clef from their range.
+    Measures are streamed to the file as they are generated.
+
+    Parameters:
+    pm (pretty_midi.PrettyMIDI): Beat-aligned notes (see quantization.beat_aligned_midi)
+    xml_path (str): Output path
+    title (str, optional): Work title
+
+    Returns:
+    bool: True if the file was written, False if the input needs music21
+    """
+    layout = note_groups(pm)
+    if layout is None:
+        return False
+    groups, divisions = layout
+
+    fifths = estimate_key(groups)
+    median_pitch = np.median([pitch for _, _, pitches in groups for pitch in pitches])
+    clef = ("G", 2) if median_pitch >= 60 else ("F", 4)
+    tempo = float(pm.get_tempo_changes()[1][0])
+
+    with open(xml_path, "w", encoding="utf-8") as out:
+        writer = _ScoreWriter(out, divisions, fifths, clef, tempo)
+        writer.start(title)
+        position = 0
+        for start, end, pitches in groups:
+            if start > position:
+                writer.write_event(position, start, [])
+            writer.write_event(start, end, pitches)
+            position = end
+        writer.finish(position)
+    logger.info(f"Wrote {len(groups)} notes and chords directly to {xml_path}")
+    return True
@@ -0,0 +1,209 @@
+"""
+Extract notes from MusicXML files without music21.
+
+The score is read straight out of the .mxl zip archive (or a plain .xml /
+.musicxml file) with an incremental parser, and every note is appended to
+flat columns as soon as its element is complete. Parsed elements are
+cleared immediately, so memory stays proportional to the number of notes
+rather than the size of the XML tree.
+
+    python mxl_extract.py IMSLP/MXL/*.mxl --output notes.npz
+    python mxl_extract.py test1.mxl --output notes.parquet
+"""
+import argparse
+import logging
+import os
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+logger = logging.getLogger("mxl_extract")
+
+# Pitch recorded for rests
+REST = -1
+
+# Semitones above C of each note name
+STEP_SEMITONES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+
+# Column names and dtypes of the extracted notes, one row per note or rest;
+# chord members are separate rows with the same offset
+COLUMNS = {
+    "part": str,             # part id from the score's part-list, e.g. "P1"
+    "measure": np.int32,     # measure number as written in the score
+    "offset": np.float64,    # start in quarter notes from the beginning of the part
+    "pitch": np.int16,       # MIDI number, or REST
+    "duration": np.float32,  # quarter notes; 0 for grace notes
+}
+
+
+def _open_score(path):
+    """Open the MusicXML document of an .mxl archive, or a plain MusicXML file"""
+    if not zipfile.is_zipfile(path):
+        return open(path, "rb")
+    archive = zipfile.ZipFile(path)
+    # The container names the main score; older archives may lack it
+    try:
+        container = ET.fromstring(archive.read("META-INF/container.xml"))
+        rootfile = container.find(".//rootfile").get("full-path")
+    except (KeyError, AttributeError, ET.ParseError):
+        rootfile = next(
+            name for name in archive.namelist()
+            if not name.startswith("META-INF/") and name.lower().endswith((".xml", ".musicxml"))
+        )
+    score = archive.open(rootfile)
+    # The opened member keeps the underlying file open until it is closed itself
+    archive.close()
+    return score
+
+
+def _measure_number(text, previous):
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        # Implicit or non-numeric numbers such as "X1" continue the count
+        return previous + 1
+
+
+def extract_notes(path):
+    """
+    Read every note and rest of a partwise MusicXML score into columns
+
+    Offsets follow <backup> and <forward>, so notes of all voices in a part
+    are placed correctly. Ties are not merged: a tied note appears once per
+    notated segment, as in XMLtoJSON.mxl_to_json.
+
+    Parameters:
+    path (str): Path to an .mxl, .xml or .musicxml file
+
+    Returns:
+    dict: Column name -> np.ndarray, as described in COLUMNS
+    """
+    columns = {name: [] for name in COLUMNS}
+    part = None
+    measure = 0
+    divisions = 1.0
+    measure_start = 0.0
+    position = 0.0      # current position in the measure, in divisions
+    measure_end = 0.0   # furthest position reached in the measure
+    chord_start = 0.0   # start of the previous note, shared by <chord/> notes
+
+    with _open_score(path) as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                if tag == "part":
+                    part = elem.get("id")
+                    measure, measure_start = 0, 0.0
+                elif tag == "measure":
+                    measure = _measure_number(elem.get("number"), measure)
+                    position = measure_end = 0.0
+                elif tag == "score-timewise":
+                    raise ValueError(f"Timewise MusicXML is not supported: {path}")
+                continue
+
+            if tag == "note":
+                duration = float(elem.findtext("duration") or 0)
+                if elem.find("chord") is not None:
+                    start = chord_start
+                else:
+                    start = chord_start = position
+                    position += duration
+                    measure_end = max(measure_end, position)
+                pitch_elem = elem.find("pitch")
+                if pitch_elem is not None:
+                    pitch = (
+                        (int(pitch_elem.findtext("octave")) + 1) * 12
+                        + STEP_SEMITONES[pitch_elem.findtext("step")]
+                        + round(float(pitch_elem.findtext("alter") or 0))
+                    )
+                elif elem.find("rest") is not None:
+                    pitch = REST
+                else:
+                    # Unpitched percussion has no MIDI number
+                    elem.clear()
+                    continue
+                columns["part"].append(part)
+                columns["measure"].append(measure)
+                columns["offset"].append(measure_start + start / divisions)
+                columns["pitch"].append(pitch)
+                columns["duration"].append(duration / divisions)
+                elem.clear()
+            elif tag == "divisions":
+                divisions = float(elem.text)
+            elif tag == "backup":
+                position -= float(elem.findtext("duration"))
+                elem.clear()
+            elif tag == "forward":
+                position += float(elem.findtext("duration"))
+                measure_end = max(measure_end, position)
+                elem.clear()
+            elif tag == "measure":
+                measure_start += measure_end / divisions
+                elem.clear()
+            elif tag == "part":
+                elem.clear()
+
+    return {name: np.array(values, dtype=COLUMNS[name]) for name, values in columns.items()}
+
+
+def extract_corpus(paths):
+    """
+    Extract several scores into one set of columns with an added "source" column
+
+    Files that cannot be read are logged and skipped.
+
+    Returns:
+    dict: Column name -> np.ndarray
+    """
+    parts = []
+    for path in paths:
+        try:
+            columns = extract_notes(path)
+        except (OSError, ValueError, KeyError, StopIteration, zipfile.BadZipFile, ET.ParseError) as e:
+            logger.warning(f"Skipping {path}: {e}")
+            continue
+        columns["source"] = np.full(len(columns["pitch"]), os.path.basename(path))
+        parts.append(columns)
+    names = list(COLUMNS) + ["source"]
+    if not parts:
+        return {name: np.array([], dtype=COLUMNS.get(name, str)) for name in names}
+    return {name: np.concatenate([columns[name] for columns in parts]) for name in names}
+
+
+def save_npz(columns, path):
+    """Write columns to a compressed NumPy archive (np.load(path) gives them back)"""
+    np.savez_compressed(path, **columns)
+
+
+def save_parquet(columns, path):
+    """Write columns to a Parquet file; needs pyarrow"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow (pip install pyarrow); use .npz otherwise") from None
+    pq.write_table(pa.table(columns), path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract notes from MusicXML files into columnar arrays")
+    parser.add_argument("paths", nargs="+", help=".mxl, .xml or .musicxml files")
+    parser.add_argument("--output", required=True, help="Output file ending in .npz or .parquet")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    columns = extract_corpus(args.paths)
+    elapsed = time.perf_counter() - start
+    if args.output.endswith(".parquet"):
+        save_parquet(columns, args.output)
+    else:
+        save_npz(columns, args.output)
+    print(f"Extracted {len(columns['pitch'])} notes from {len(set(columns['source']))} files "
+          f"in {elapsed:.3f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,186 @@
+import logging
+import librosa
+import numpy as np
+import pretty_midi
+import scipy.ndimage
+
+from audio_to_midi import HOP_LENGTH
+
+logger = logging.getLogger("audio_converter")
+
+# Piano range A0..C8
+LOWEST_NOTE = 21
+NUM_KEYS = 88
+
+# CQT resolution: one bin per semitone, centred on every piano key. Finer
+# resolutions make both the CQT and the factorisation several times slower.
+BINS_PER_OCTAVE = 12
+
+# Harmonics modelled in each key's spectral template and their decay per partial
+NUM_HARMONICS = 8
+HARMONIC_DECAY = 0.8
+
+# Multiplicative update iterations for the activations
+NMF_ITERATIONS = 12
+
+# Activation threshold relative to the loudest activation in the file
+ACTIVATION_THRESHOLD = 0.12
+
+# Relative jump in activation that starts a new note while a key is still sounding
+ONSET_RISE = 0.15
+
+# Notes shorter than this (in seconds) are treated as noise
+MIN_NOTE_DURATION = 0.1
+
+# A key is muted in frames where the spectrum at its fundamental holds less
+# than this share of what its activation predicts. This removes "ghost" notes
+# an octave or a fifth below chords, whose upper partials match the chord tones.
+FUNDAMENTAL_SUPPORT = 0.3
+
+# Fundamentals weaker than this share of the frame's strongest CQT bin are ignored
+FRAME_FLOOR = 0.1
+
+# Frames of temporal median smoothing applied to the activations
+SMOOTHING_FRAMES = 5
+
+
+def harmonic_templates(n_bins):
+    """
+    Build one spectral template per piano key in CQT bin space
+
+    Each template has peaks at the key's first NUM_HARMONICS partials with
+    geometrically decaying weights, slightly blurred across neighbouring bins
+    because higher partials fall between semitones.
+
+    Parameters:
+    n_bins (int): Number of CQT bins
+
+    Returns:
+    np.ndarray: Template matrix (n_bins x NUM_KEYS), each column summing to 1
+    """
+    harmonics = np.arange(1, NUM_HARMONICS + 1)
+    # Bin of every partial of every key (keys x harmonics); key k is centred on bin k
+    partial_bins = np.arange(NUM_KEYS)[:, None] + BINS_PER_OCTAVE * np.log2(harmonics)[None, :]
+    weights = np.broadcast_to(HARMONIC_DECAY ** (harmonics - 1), partial_bins.shape)
+
+    # Gaussian blur of every partial over the bins (bins x keys x harmonics), summed over harmonics
+    bins = np.arange(n_bins)[:, None, None]
+    blur = np.exp(-0.5 * ((bins - partial_bins[None]) / 0.3) ** 2)
+    templates = (blur * weights[None]).sum(axis=2)
+    return templates / np.maximum(templates.sum(axis=0, keepdims=True), 1e-12)
+
+
+def transcribe_polyphonic(y, sr, progress_callback=None):
+    """
+    Estimate simultaneous notes over a whole signal
+
+    The magnitude CQT of the file is factorised as templates @ activations,
+    where the templates are fixed harmonic spectra of the 88 piano keys and
+    only the activations are learned (KL-divergence multiplicative updates).
+    Thresholding and segmenting the activation matrix yields the notes. All
+    steps are batched matrix operations over the full file.
+
+    Parameters:
+    y (np.ndarray): Mono audio signal
+    sr (int): Sample rate of the signal
+    progress_callback (callable, optional): Called with the name of each stage as it starts
+
+    Returns:
+    list: pretty_midi.Note objects sorted by start time
+    """
+    if progress_callback is not None:
+        progress_callback("computing_cqt")
+    logger.info("Computing constant-Q transform")
+    fmin = librosa.midi_to_hz(LOWEST_NOTE)
+    # Drop the top bins that would lie above the Nyquist frequency
+    max_bins = int(np.floor(BINS_PER_OCTAVE * np.log2(0.95 * (sr / 2) / fmin)))
+    n_bins = min(NUM_KEYS, max_bins)
+    V = np.abs(librosa.cqt(
+        y=np.ascontiguousarray(y), sr=sr, hop_length=HOP_LENGTH, fmin=fmin,
+        n_bins=n_bins, bins_per_octave=BINS_PER_OCTAVE
+    )).astype(np.float32)
+
+    if progress_callback is not None:
+        progress_callback("estimating_pitches")
+    logger.info("Factorising spectrogram into piano key activations")
+    W = harmonic_templates(n_bins).astype(np.float32)
+    eps = np.float32(1e-9)
+    W_norm = W.sum(axis=0)[:, None] + eps
+    # Starting from the template correlations converges in far fewer iterations than a flat start
+    H = (W.T @ V) / W_norm + eps
+    for _ in range(NMF_ITERATIONS):
+        H *= (W.T @ (V / (W @ H + eps))) / W_norm
+
+    # Compare the observed fundamental of every key with the part its activation explains
+    keys = np.arange(n_bins)
+    observed = V[keys]
+    predicted = W[keys, keys][:, None] * H[:n_bins]
+    # Broadband clicks leave only a faint, flat floor at the fundamentals, and
+    # a key whose bin is not a spectral peak is leakage from its neighbour
+    padded = np.pad(observed, ((1, 1), (0, 0)))
+    is_peak = (observed >= padded[:-2]) & (observed >= padded[2:])
+    unsupported = (
+        (observed < FUNDAMENTAL_SUPPORT * predicted)
+        | (observed < FRAME_FLOOR * V.max(axis=0, keepdims=True))
+        | ~is_peak
+    )
+    H[:n_bins][unsupported] = 0
+
+    notes = activations_to_notes(H, sr)
+    logger.info(f"Detected {len(notes)} notes")
+    return notes
+
+
+def activations_to_notes(H, sr, hop_length=HOP_LENGTH):
+    """
+    Segment a key activation matrix into notes
+
+    Parameters:
+    H (np.ndarray): Activations (NUM_KEYS x frames)
+    sr (int): Sample rate of the analysed audio
+    hop_length (int): Hop length of the activation frames
+
+    Returns:
+    list: pretty_midi.Note objects sorted by start time
+    """
+    peak = H.max()
+    if peak <= 0:
+        return []
+    H = scipy.ndimage.median_filter(H / peak, size=(1, SMOOTHING_FRAMES))
+
+    # A note starts where a key becomes active or jumps up while active
+    active = H > ACTIVATION_THRESHOLD
+    previous = np.pad(H, ((0, 0), (1, 0)))[:, :-1]
+    previous_active = np.pad(active, ((0, 0), (1, 0)))[:, :-1]
+    starts = active & (~previous_active | (H - previous > ONSET_RISE))
+
+    # Number the notes in row-major order; the active frames of each note are contiguous
+    note_ids = np.cumsum(starts.ravel())
+    active_flat = active.ravel()
+    ids = note_ids[active_flat]
+    if len(ids) == 0:
+        return []
+    flat_positions = np.flatnonzero(active_flat)
+    _, first, length = np.unique(ids, return_index=True, return_counts=True)
+
+    velocity_peak = np.maximum.reduceat(H.ravel()[active_flat], first)
+
+    keep = length >= max(int(np.ceil(MIN_NOTE_DURATION * sr / hop_length)), 1)
+    first, length, velocity_peak = first[keep], length[keep], velocity_peak[keep]
+
+    n_frames = H.shape[1]
+    key, start_frame = np.divmod(flat_positions[first], n_frames)
+    start_times = librosa.frames_to_time(start_frame, sr=sr, hop_length=hop_length)
+    end_times = librosa.frames_to_time(start_frame + length, sr=sr, hop_length=hop_length)
+    velocities = np.clip(40 + 87 * np.sqrt(velocity_peak), 1, 127).astype(int)
+
+    order = np.argsort(start_times, kind="stable")
+    return [
+        pretty_midi.Note(
+            velocity=int(velocities[i]),
+            pitch=int(LOWEST_NOTE + key[i]),
+            start=float(start_times[i]),
+            end=float(end_times[i])
+        )
+        for i in order
+    ]
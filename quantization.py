@@ -0,0 +1,146 @@
+import logging
+import os
+
+import librosa
+import numpy as np
+import pretty_midi
+
+logger = logging.getLogger("audio_converter")
+
+# Grid positions per beat that note starts and ends are snapped to (4 = sixteenth notes in 4/4)
+GRID_SUBDIVISION = int(os.getenv("QUANTIZE_SUBDIVISION", "4"))
+
+# Meter written to quantized files; the time signature marks the first downbeat
+BEATS_PER_MEASURE = 4
+
+# Tempo used when beat tracking finds no beats (silence or a single note)
+DEFAULT_TEMPO = 120.0
+
+# Text event that marks the first downbeat of a quantized transcription
+BEAT_GRID_MARKER = "beat grid"
+
+
+def estimate_beat_grid(onset_envelope, sr, hop_length):
+    """
+    Estimate tempo and beat phase from an onset strength envelope
+
+    Parameters:
+    onset_envelope (np.ndarray): Onset strength per frame, as used for onset detection
+    sr (int): Sample rate of the analysed audio
+    hop_length (int): Hop length of the envelope frames
+
+    Returns:
+    tuple: (tempo in BPM, time of the first beat in seconds)
+    """
+    tempo, beats = librosa.beat.beat_track(
+        onset_envelope=onset_envelope, sr=sr, hop_length=hop_length, units="time"
+    )
+    tempo = float(np.atleast_1d(tempo)[0])
+    if tempo <= 0 or len(beats) == 0:
+        return DEFAULT_TEMPO, 0.0
+    logger.info(f"Estimated tempo {tempo:.1f} BPM, first beat at {beats[0]:.3f}s")
+    return tempo, float(beats[0])
+
+
+def quantize_notes(notes, tempo, first_beat, subdivision=GRID_SUBDIVISION):
+    """
+    Snap note starts and ends to a beat grid
+
+    The grid runs through first_beat with subdivision steps per beat. Times
+    stay in seconds, so a quantized file still lines up with the recording.
+    Notes that collapse to zero length are extended to one grid step, and
+    duplicates (same pitch and start) are dropped.
+
+    Parameters:
+    notes (list): pretty_midi.Note objects
+    tempo (float): Tempo in BPM
+    first_beat (float): Time of a beat in seconds; sets the phase of the grid
+    subdivision (int): Grid positions per beat
+
+    Returns:
+    list: New pretty_midi.Note objects sorted by start time
+    """
+    if not notes:
+        return []
+    step = 60.0 / tempo / subdivision
+    phase = first_beat % step
+    starts = np.array([n.start for n in notes])
+    ends = np.array([n.end for n in notes])
+    start_steps = np.maximum(np.round((starts - phase) / step), 0).astype(int)
+    end_steps = np.maximum(np.round((ends - phase) / step).astype(int), start_steps + 1)
+
+    quantized = {}
+    for note, start_step, end_step in zip(notes, start_steps, end_steps):
+        key = (note.pitch, start_step)
+        if key not in quantized or end_step > quantized[key][1]:
+            quantized[key] = (note, end_step)
+    return sorted(
+        (
+            pretty_midi.Note(
+                velocity=note.velocity,
+                pitch=note.pitch,
+                start=float(phase + start_step * step),
+                end=float(phase + end_step * step)
+            )
+            for (_, start_step), (note, end_step) in quantized.items()
+        ),
+        key=lambda n: (n.start, n.pitch)
+    )
+
+
+def mark_beat_grid(pm, first_beat):
+    """
+    Record the beat grid of quantized notes in a PrettyMIDI object
+
+    The tempo is the PrettyMIDI's initial tempo; the first downbeat gets a
+    time signature and a BEAT_GRID_MARKER text event, which tells
+    read_beat_grid that the notes are on the grid.
+    """
+    pm.time_signature_changes.append(pretty_midi.TimeSignature(BEATS_PER_MEASURE, 4, first_beat))
+    pm.text_events.append(pretty_midi.Text(BEAT_GRID_MARKER, first_beat))
+
+
+def read_beat_grid(pm):
+    """
+    Read the beat grid written by mark_beat_grid
+
+    Returns:
+    tuple: (tempo in BPM, first downbeat in seconds), or None for files without a grid
+    """
+    # Any file with one tempo and one time signature would look like a grid, hence the marker
+    markers = [event for event in pm.text_events if event.text == BEAT_GRID_MARKER]
+    if not markers:
+        return None
+    _, tempi = pm.get_tempo_changes()
+    if len(tempi) != 1:
+        return None
+    return float(tempi[0]), float(markers[0].time)
+
+
+def beat_aligned_midi(pm, tempo, first_beat):
+    """
+    Shift quantized notes so that the first downbeat starts a measure
+
+    music21 derives note offsets from MIDI ticks. Moving the grid phase to
+    time zero (with one measure of rest before a pickup) puts every grid
+    position on an exact tick, so music21 needs no tuplets or odd ties.
+
+    Returns:
+    pretty_midi.PrettyMIDI: Copy of the notes for notation
+    """
+    measure = BEATS_PER_MEASURE * 60.0 / tempo
+    shift = -(first_beat % measure)
+    notes = [n for inst in pm.instruments for n in inst.notes]
+    if notes and min(n.start for n in notes) + shift < -1e-6:
+        shift += measure
+
+    aligned = pretty_midi.PrettyMIDI(initial_tempo=tempo)
+    aligned.time_signature_changes.append(pretty_midi.TimeSignature(BEATS_PER_MEASURE, 4, 0))
+    for inst in pm.instruments:
+        copy = pretty_midi.Instrument(program=inst.program, is_drum=inst.is_drum, name=inst.name)
+        copy.notes = [
+            pretty_midi.Note(velocity=n.velocity, pitch=n.pitch, start=n.start + shift, end=n.end + shift)
+            for n in inst.notes
+        ]
+        aligned.instruments.append(copy)
+    return aligned
@@ -0,0 +1,158 @@
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger("music_chatbot")
+
+# Vector store written by knowledge.py
+FAISS_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "faiss_index")
+
+# How the RAG chain is loaded when app.py starts: "background" loads it in a
+# thread so the first /chat request does not wait, "off" loads it on first use
+RAG_PRELOAD = os.getenv("RAG_PRELOAD", "background")
+
+RAG_PROMPT_TEMPLATE = """
+        You are an AI assistant helping with music education questions.
+
+        Use the following pieces of context to answer the question at the end.
+        Include the page numbers from the source material in your response.
+
+        {context}
+
+        Question: {question}
+
+        Answer (include page references in parentheses):
+        """
+
+_rag_chain = None
+_rag_embeddings = None
+_rag_signature = None
+_rag_chain_lock = threading.Lock()
+
+
+def index_signature(index_dir=None):
+    """
+    Identify the current contents of a saved FAISS index by the size and mtime of its files
+
+    Returns:
+    str: Changes whenever knowledge.py rebuilds the index, or None if there is no index
+    """
+    from embedding_backends import BACKEND_FILE
+
+    parts = []
+    for name in ("index.faiss", "index.pkl", BACKEND_FILE):
+        try:
+            stat = os.stat(os.path.join(index_dir or FAISS_INDEX_DIR, name))
+        except FileNotFoundError:
+            if name == BACKEND_FILE:
+                # Indexes built before the backend was recorded
+                continue
+            return None
+        parts.append(f"{stat.st_size}-{stat.st_mtime_ns}")
+    return ":".join(parts)
+
+
+def initialize_rag_chatbot(embeddings=None):
+    """Initialize the RAG chatbot by loading the FAISS index and setting up the RAG chain."""
+    logger.info("Initializing music education RAG chatbot")
+
+    try:
+        from langchain_community.vectorstores import FAISS
+        from langchain_openai import ChatOpenAI
+        from langchain.chains import RetrievalQA
+        from langchain.prompts import PromptTemplate
+        from embedding_backends import embeddings_for_index
+        from hybrid_retrieval import create_retriever
+
+        # Load the saved FAISS index
+        logger.info("Loading FAISS index from disk")
+        embeddings = embeddings or embeddings_for_index(FAISS_INDEX_DIR)
+        db = FAISS.load_local(FAISS_INDEX_DIR, embeddings, allow_dangerous_deserialization=True)
+        logger.info("FAISS index loaded successfully")
+
+        # Set up retriever: BM25 fused with vector search, see RAG_RETRIEVAL
+        retriever = create_retriever(db, FAISS_INDEX_DIR, k=3)  # Retrieve top 3 most relevant chunks
+
+        # Initialize LLM
+        logger.info("Initializing ChatOpenAI model")
+        llm = ChatOpenAI(model_name="gpt-4o-mini", temperature=0)
+        logger.info("ChatOpenAI model initialized successfully")
+
+        PROMPT = PromptTemplate(
+            template=RAG_PROMPT_TEMPLATE,
+            input_variables=["context", "question"]
+        )
+
+        # Create RAG chain
+        logger.info("Creating RetrievalQA chain")
+        rag_chain = RetrievalQA.from_chain_type(
+            llm=llm,
+            chain_type="stuff",
+            retriever=retriever,
+            chain_type_kwargs={"prompt": PROMPT}
+        )
+        logger.info("RetrievalQA chain created successfully")
+        return rag_chain
+
+    except Exception as e:
+        logger.error(f"Error initializing RAG chatbot: {e}")
+        return None
+
+
+def _load_rag_chain():
+    global _rag_chain, _rag_embeddings, _rag_signature
+    signature = index_signature()
+    with _rag_chain_lock:
+        if _rag_chain is None or signature != _rag_signature:
+            from embedding_backends import embeddings_for_index
+            from embedding_cache import QueryMemoEmbeddings
+
+            if _rag_chain is not None:
+                logger.info("FAISS index changed on disk, reloading the RAG chain")
+            start = time.perf_counter()
+            try:
+                # The backend the index was built with, unless EMBEDDING_BACKEND asks for another
+                embeddings = QueryMemoEmbeddings(embeddings_for_index(FAISS_INDEX_DIR))
+            except ValueError as e:
+                logger.error(f"Error initializing RAG chatbot: {e}")
+                return _rag_chain
+            rag_chain = initialize_rag_chatbot(embeddings)
+            # A failed reload keeps serving the previous chain
+            if rag_chain is not None:
+                _rag_chain, _rag_embeddings, _rag_signature = rag_chain, embeddings, signature
+                metrics.observe("rag_load", time.perf_counter() - start)
+        return _rag_chain
+
+
+def get_rag_chain():
+    """
+    Return the process-wide RAG chain, loading it on first use
+
+    The FAISS index, the OpenAI clients and the chain are shared by all
+    requests and threads; only their creation is serialized. A failed load
+    is retried by the next call, and the chain is reloaded when
+    knowledge.py rebuilds the index. The time each call spends here is recorded
+    as the rag_init timing, which stays near zero once the chain is loaded.
+
+    Returns:
+    RetrievalQA: The chain, or None if it could not be initialized
+    """
+    start = time.perf_counter()
+    rag_chain = _load_rag_chain()
+    metrics.observe("rag_init", time.perf_counter() - start)
+    return rag_chain
+
+
+def embed_query(text):
+    """Embed a question with the loaded chain's embedding model; the retriever reuses the result"""
+    _load_rag_chain()
+    return _rag_embeddings.embed_query(text)
+
+
+def preload_rag_chain(mode=RAG_PRELOAD):
+    """Load the RAG chain according to RAG_PRELOAD ("background" or "off")"""
+    if mode == "background":
+        threading.Thread(target=_load_rag_chain, name="rag-preload", daemon=True).start()
@@ -0,0 +1,142 @@
+import glob
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import music21
+from music21 import converter, freezeThaw
+
+from hashing import file_sha256
+
+logger = logging.getLogger("score_cache")
+
+# Parsed scores are stored here as frozen (pickled) music21 streams
+SCORE_CACHE_DIR = os.getenv(
+    "SCORE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".score_cache")
+)
+
+# Disk usage of the cache before the least recently used files are deleted
+MAX_CACHE_BYTES = int(os.getenv("SCORE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Frozen scores kept in memory in front of the disk cache
+MEMORY_CACHE_ENTRIES = int(os.getenv("SCORE_CACHE_MEMORY_ENTRIES", "32"))
+
+_memory_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def cache_key(path):
+    """
+    Cache key of a score file: its content hash, its format and the music21 version
+
+    Frozen streams from another music21 version may not thaw correctly, so
+    upgrading music21 starts a new cache.
+    """
+    extension = os.path.splitext(path)[1].lower().lstrip(".") or "unknown"
+    return f"{file_sha256(path)}-{extension}-{music21.VERSION_STR}"
+
+
+def parse_score(path):
+    """
+    Parse a score file with music21, reusing earlier parses of the same content
+
+    Drop-in replacement for converter.parse(path). Lookups go to an
+    in-process LRU first, then to the frozen streams on disk; only a miss in
+    both parses the file. Every call returns a new, independent stream, so
+    callers may modify it freely.
+
+    Parameters:
+    path (str): Path to a MusicXML, MXL, MIDI or other file music21 can parse
+
+    Returns:
+    music21.stream.Score: The parsed score
+    """
+    key = cache_key(path)
+    data = _memory_lookup(key)
+    if data is None:
+        cached_path = os.path.join(SCORE_CACHE_DIR, f"{key}.p")
+        try:
+            with open(cached_path, "rb") as f:
+                data = f.read()
+            # Touch the file so eviction treats it as recently used
+            os.utime(cached_path)
+            logger.info(f"Loaded parsed score from cache: {cached_path}")
+        except FileNotFoundError:
+            # forceSource skips music21's own pickle cache, which is keyed by path
+            score = converter.parse(path, forceSource=True)
+            data = _freeze(score)
+            _store_on_disk(cached_path, data)
+        _memory_store(key, data)
+    return _thaw(data)
+
+
+def _freeze(score):
+    # fastButUnsafe freezes without a deep copy; the parsed stream is discarded afterwards
+    return freezeThaw.StreamFreezer(score, fastButUnsafe=True).writeStr(fmt="pickle")
+
+
+def _thaw(data):
+    thawer = freezeThaw.StreamThawer()
+    thawer.openStr(data)
+    return thawer.stream
+
+
+def _memory_lookup(key):
+    with _lock:
+        data = _memory_cache.get(key)
+        if data is not None:
+            _memory_cache.move_to_end(key)
+        return data
+
+
+def _memory_store(key, data):
+    with _lock:
+        _memory_cache[key] = data
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > MEMORY_CACHE_ENTRIES:
+            _memory_cache.popitem(last=False)
+
+
+def _store_on_disk(cached_path, data):
+    os.makedirs(SCORE_CACHE_DIR, exist_ok=True)
+    # Write under a temporary name first so readers never see a partial file
+    tmp_path = f"{cached_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, cached_path)
+    logger.info(f"Cached parsed score ({len(data) / 1e3:.0f} KB) at {cached_path}")
+    evict(MAX_CACHE_BYTES)
+
+
+def evict(max_bytes):
+    """
+    Delete the least recently used frozen scores until the disk cache fits into max_bytes
+
+    Returns:
+    int: Number of deleted files
+    """
+    files = []
+    for cached_path in glob.glob(os.path.join(SCORE_CACHE_DIR, "*.p")):
+        try:
+            stat = os.stat(cached_path)
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, cached_path))
+
+    total = sum(size for _, size, _ in files)
+    deleted = 0
+    for _, size, cached_path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(cached_path)
+        except OSError:
+            continue
+        total -= size
+        deleted += 1
+    if deleted:
+        logger.info(f"Evicted {deleted} parsed scores from the cache")
+    return deleted
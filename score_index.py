@@ -0,0 +1,152 @@
+import json
+import logging
+import os
+import re
+import uuid
+
+logger = logging.getLogger("sheet_music")
+
+# Default measures per page served by the /scores/<filename>/measures route
+MEASURES_PER_PAGE = int(os.getenv("MEASURES_PER_PAGE", "16"))
+
+# Start and end tags the index records; <part-list> and <part-name> do not match
+_TAGS = re.compile(rb"<part[\s>]|</part>|<measure[\s>]|</measure>|<attributes[\s>]|</attributes>")
+
+
+def index_path(xml_path):
+    """Path of the measure index stored next to a MusicXML file"""
+    return f"{xml_path}.measures.json"
+
+
+def build_measure_index(xml_path):
+    """
+    Find the byte ranges of parts, measures and <attributes> in a partwise MusicXML file
+
+    The file is scanned for tags rather than parsed, which takes a few
+    milliseconds even for long scores.
+
+    Parameters:
+    xml_path (str): Path to an uncompressed MusicXML file
+
+    Returns:
+    dict: "size" and "mtime_ns" of the indexed file, "header_end" (end of
+    everything before the first part) and "parts", each with the byte range
+    of its start tag, its measures as [start, start tag end, end] and its
+    attributes as [measure index, start, end]
+    """
+    with open(xml_path, "rb") as f:
+        data = f.read()
+    stat = os.stat(xml_path)
+
+    parts = []
+    header_end = None
+    attributes_start = None
+    for match in _TAGS.finditer(data):
+        tag = match.group()
+        if tag.startswith(b"<part"):
+            tag_end = data.index(b">", match.start()) + 1
+            if header_end is None:
+                header_end = match.start()
+            parts.append({"tag": [match.start(), tag_end], "measures": [], "attributes": []})
+        elif tag.startswith(b"<measure"):
+            parts[-1]["measures"].append([match.start(), data.index(b">", match.start()) + 1, None])
+        elif tag == b"</measure>":
+            parts[-1]["measures"][-1][2] = match.end()
+        elif tag.startswith(b"<attributes"):
+            attributes_start = match.start()
+        elif tag == b"</attributes>" and attributes_start is not None:
+            part = parts[-1]
+            part["attributes"].append([len(part["measures"]) - 1, attributes_start, match.end()])
+            attributes_start = None
+
+    if header_end is None:
+        raise ValueError(f"No parts found in {xml_path}; only partwise MusicXML can be indexed")
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "header_end": header_end, "parts": parts}
+
+
+def write_measure_index(xml_path):
+    """
+    Index a MusicXML file and store the index next to it
+
+    Called when a score is generated, so that serving measure ranges never
+    has to scan the file.
+
+    Returns:
+    dict: The index (see build_measure_index)
+    """
+    index = build_measure_index(xml_path)
+    path = index_path(xml_path)
+    # Write under a temporary name first so readers never see a partial index
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    logger.info(f"Indexed {measure_count(index)} measures of {xml_path}")
+    return index
+
+
+def load_measure_index(xml_path):
+    """
+    Read the stored index of a MusicXML file, rebuilding it if it is missing or out of date
+
+    Returns:
+    dict: The index (see build_measure_index)
+    """
+    stat = os.stat(xml_path)
+    try:
+        with open(index_path(xml_path), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index["size"] == stat.st_size and index["mtime_ns"] == stat.st_mtime_ns:
+            return index
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    return write_measure_index(xml_path)
+
+
+def measure_count(index):
+    """Number of measures of the longest part"""
+    return max((len(part["measures"]) for part in index["parts"]), default=0)
+
+
+def read_measures(xml_path, start, count, index=None):
+    """
+    Build a standalone MusicXML document from a range of measures
+
+    Measures are copied byte for byte from the stored file. Every <attributes>
+    element of earlier measures (divisions, key, time, clef) is repeated at
+    the start of the first measure, so the slice renders like the same
+    measures in the full score.
+
+    Parameters:
+    xml_path (str): Path to the MusicXML file
+    start (int): Index of the first measure, counted from 0
+    count (int): Number of measures
+    index (dict, optional): The file's index; loaded with load_measure_index if not given
+
+    Returns:
+    bytes: The MusicXML document
+    """
+    index = index or load_measure_index(xml_path)
+    chunks = []
+    with open(xml_path, "rb") as f:
+        def read(begin, end):
+            f.seek(begin)
+            return f.read(end - begin)
+
+        chunks.append(read(0, index["header_end"]))
+        for part in index["parts"]:
+            chunks.append(read(*part["tag"]))
+            measures = part["measures"][start:start + count]
+            for i, (measure_start, tag_end, measure_end) in enumerate(measures):
+                if i == 0 and start > 0:
+                    chunks.append(read(measure_start, tag_end))
+                    for measure, attributes_start, attributes_end in part["attributes"]:
+                        if measure < start:
+                            chunks.append(read(attributes_start, attributes_end))
+                    chunks.append(read(tag_end, measure_end))
+                else:
+                    chunks.append(read(measure_start, measure_end))
+            chunks.append(b"</part>\n")
+    chunks.append(b"</score-partwise>\n")
+    return b"".join(chunks)
+
@@ -0,0 +1,234 @@
+"""
+Compact text encoding of scores for LLM prompts.
+
+Works on the part -> measure -> note structure written by
+XMLtoJSON.mxl_to_json (output.json). Each measure becomes one line of
+note tokens instead of a dozen lines of indented JSON:
+
+    Piano
+    1| A4:2 B4
+    2| C5:3
+    3| %
+    4| [C4,E4,G4]:2 r:2
+
+A token is a pitch, a chord in brackets or "r" for a rest, followed by its
+length in quarter notes after a colon; the colon part is left out for
+quarter notes. "%" repeats the previous measure. Scores that do not fit
+into the token budget keep a statistical summary and an evenly spread
+sample of short phrases.
+"""
+import functools
+import logging
+from collections import Counter
+from fractions import Fraction
+
+logger = logging.getLogger("score_prompt")
+
+# Default prompt budget for the encoded score
+DEFAULT_MAX_TOKENS = 1500
+
+# Model whose tokenizer is used to count tokens (when tiktoken can load it)
+TOKENIZER_MODEL = "gpt-4o-mini"
+
+# Average characters per token used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+# Explanation of the notation, for the prompt
+LEGEND = (
+    "Format: one line per measure, 'number| tokens'. A token is a pitch (e.g. C#5, B-4 = B flat 4), "
+    "a chord [C4,E4,G4] or r (rest), followed by ':length' in quarter notes; without a length it is "
+    "a quarter note. '%' repeats the previous measure, '...' marks measures that were left out."
+)
+
+# Sampled measures are kept in runs of this length so that phrases stay readable
+SAMPLE_PHRASE = 4
+
+PITCH_CLASSES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+
+
+@functools.lru_cache(maxsize=1)
+def _encoder():
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+    except Exception as e:
+        # tiktoken downloads its vocabularies on first use, which fails offline
+        logger.info(f"Estimating token counts from text length ({e.__class__.__name__})")
+        return None
+
+
+def count_tokens(text):
+    """Number of tokens of text for TOKENIZER_MODEL, estimated from its length without tiktoken"""
+    encoder = _encoder()
+    if encoder is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoder.encode(text))
+
+
+def _format_duration(duration):
+    if duration == 1:
+        return ""
+    # Tuplet lengths such as 1/3 are written as fractions
+    fraction = Fraction(duration).limit_denominator(48)
+    value = str(fraction) if fraction.denominator not in (1, 2, 4, 8) else f"{float(fraction):g}"
+    return f":{value}"
+
+
+def _token(item):
+    if item["type"] == "rest":
+        symbol = "r"
+    elif item["type"] == "chord":
+        symbol = "[" + ",".join(item["pitches"]) + "]"
+    else:
+        symbol = item["pitch"]
+    return symbol + _format_duration(item["duration"])
+
+
+def encode_measure(measure):
+    """
+    Encode the notes of one measure as a line of tokens
+
+    Parameters:
+    measure (dict): {"number": int, "notes": [...]} as in output.json
+
+    Returns:
+    str: Space-separated note tokens (without the measure number)
+    """
+    return " ".join(_token(item) for item in measure["notes"])
+
+
+def _midi_number(name):
+    # music21 names: step, accidentals (# or -), octave, e.g. "C#5" or "B--3"
+    step, rest = name[0], name[1:]
+    alter = rest.count("#") - rest.count("-")
+    return (int(rest.lstrip("#-")) + 1) * 12 + PITCH_CLASSES[step] + alter
+
+
+def summarize(music_data):
+    """
+    Short statistics of a score that survive sampling: size, range, pitch classes and rhythm
+
+    Returns:
+    list: Lines of text
+    """
+    pitches = []
+    durations = Counter()
+    measures = 0
+    for part in music_data:
+        measures = max(measures, len(part["measures"]))
+        for measure in part["measures"]:
+            for item in measure["notes"]:
+                durations[_format_duration(item["duration"]).lstrip(":") or "1"] += 1
+                if item["type"] == "note":
+                    pitches.append(item["pitch"])
+                elif item["type"] == "chord":
+                    pitches.extend(item["pitches"])
+
+    lines = [f"{len(music_data)} parts, {measures} measures, {len(pitches)} notes"]
+    if pitches:
+        numbers = [_midi_number(p) for p in pitches]
+        low, high = pitches[numbers.index(min(numbers))], pitches[numbers.index(max(numbers))]
+        classes = Counter(p.rstrip("0123456789") for p in pitches)
+        lines.append(f"Range {low}-{high}; most frequent pitch classes: "
+                     + " ".join(f"{name}({count})" for name, count in classes.most_common(7)))
+    lines.append("Note lengths (quarter notes): "
+                 + " ".join(f"{length}({count})" for length, count in durations.most_common(6)))
+    return lines
+
+
+def _part_lines(part, keep=None):
+    """Lines of a part, with only the measures whose index is in keep (all if None)"""
+    lines = [part.get("partName") or "Part"]
+    previous = None
+    skipped = 0
+    for i, measure in enumerate(part["measures"]):
+        encoded = encode_measure(measure)
+        if keep is not None and i not in keep:
+            skipped += 1
+            continue
+        if skipped:
+            lines.append(f"... ({skipped} measures)")
+            skipped = 0
+            # "%" repeats the line above, so it must not follow a gap
+            previous = None
+        lines.append(f"{measure['number']}| {'%' if encoded == previous and encoded else encoded}".rstrip())
+        previous = encoded
+    if skipped:
+        lines.append(f"... ({skipped} measures)")
+    return lines
+
+
+def _sample(n, k):
+    """Indices of about k of n measures, as phrases of SAMPLE_PHRASE measures spread evenly from first to last"""
+    if k >= n:
+        return set(range(n))
+    phrases = max(1, -(-k // SAMPLE_PHRASE))
+    last_start = max(n - SAMPLE_PHRASE, 0)
+    keep = set()
+    for i in range(phrases):
+        start = round(i * last_start / (phrases - 1)) if phrases > 1 else 0
+        keep.update(range(start, min(start + SAMPLE_PHRASE, n)))
+    return keep
+
+
+def _truncate(text, max_tokens):
+    """Longest prefix of text within max_tokens, cut at a line break where possible"""
+    lines = text.split("\n")
+    while lines and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop()
+    if lines:
+        return "\n".join(lines)
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low]
+
+
+def encode_score(music_data, max_tokens=DEFAULT_MAX_TOKENS):
+    """
+    Encode a score compactly for a prompt, within a token budget
+
+    The full encoding is used when it fits. Otherwise a summary is put in
+    front and the largest evenly spread sample of phrases (the same
+    measures in every part) that fits is kept; the rest is marked with "...".
+    If not even one phrase fits next to the summary, only the summary is
+    returned, cut to the budget if necessary.
+
+    Parameters:
+    music_data (list): Parts as written by XMLtoJSON.mxl_to_json
+    max_tokens (int): Token budget of the returned text
+
+    Returns:
+    str: The encoded score
+    """
+    full = "\n".join(line for part in music_data for line in _part_lines(part))
+    if count_tokens(full) <= max_tokens:
+        return full
+
+    summary = "\n".join(summarize(music_data))
+    n = max((len(part["measures"]) for part in music_data), default=0)
+
+    def encode(k):
+        keep = _sample(n, k)
+        return summary + "\n" + "\n".join(line for part in music_data for line in _part_lines(part, keep))
+
+    # Largest number of sampled measures that fits (count_tokens grows with k)
+    low, high = 0, n
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(encode(mid)) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    encoded = encode(low)
+    if count_tokens(encoded) > max_tokens:
+        # The search stops at one phrase (k=0 still keeps one), which may not fit either
+        encoded = _truncate(summary, max_tokens)
+        logger.info(f"Score reduced to its summary for a budget of {max_tokens} tokens")
+        return encoded
+    logger.info(f"Score sampled to {low} of {n} measures for a budget of {max_tokens} tokens")
+    return encoded
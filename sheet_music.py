@@ -1,20 +1,27 @@
 import os
+import tempfile
+import pretty_midi
 from music21 import converter, environment
 from datetime import datetime
 
-def generate_sheet_music(midi_path):
+from musicxml_writer import write_musicxml
+from quantization import beat_aligned_midi, read_beat_grid
+from score_index import write_measure_index
+
+def generate_sheet_music(midi_path, output_dir=None):
     """
     Convert MIDI to sheet music and return the paths to the MusicXML and PNG files
     
     Parameters:
     midi_path (str): Path to the MIDI file
+    output_dir (str, optional): Directory to save the MusicXML file. Defaults to static/xml.
     
     Returns:
     tuple: (xml_path, png_path) - Paths to the generated MusicXML and PNG files
     """
     # Create static directories if they don't exist
     base_dir = os.path.dirname(os.path.abspath(__file__))
-    static_xml_dir = os.path.join(base_dir, "static", "xml")
+    static_xml_dir = output_dir or os.path.join(base_dir, "static", "xml")
     static_png_dir = os.path.join(base_dir, "static", "png")
     
     os.makedirs(static_xml_dir, exist_ok=True)
@@ -25,13 +32,29 @@ def generate_sheet_music(midi_path):
     midi_basename = os.path.basename(midi_path)
     base_name = os.path.splitext(midi_basename)[0]
     
-    # Convert MIDI to music21 score
-    score = converter.parse(midi_path)
-    
-    # Save the score as MusicXML for display
     xml_filename = f"{base_name}_{timestamp}.xml"
     xml_path = os.path.join(static_xml_dir, xml_filename)
-    score.write('musicxml', fp=xml_path)
+    
+    # Quantized transcriptions are first moved onto whole measures. Simple
+    # ones are written directly; everything else goes through music21.
+    # The MIDI here was just generated, so parsing bypasses score_cache: it
+    # would never be looked up again and only evict reusable entries.
+    midi = pretty_midi.PrettyMIDI(midi_path)
+    beat_grid = read_beat_grid(midi)
+    if beat_grid is not None:
+        aligned = beat_aligned_midi(midi, *beat_grid)
+        if not write_musicxml(aligned, xml_path, title=base_name):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                aligned_path = os.path.join(tmp_dir, midi_basename)
+                aligned.write(aligned_path)
+                converter.parse(aligned_path).write('musicxml', fp=xml_path)
+    else:
+        # Convert MIDI to music21 score and save it as MusicXML for display
+        score = converter.parse(midi_path)
+        score.write('musicxml', fp=xml_path)
+    
+    # Index measure offsets now, so measure ranges can be served without reading the whole file
+    write_measure_index(xml_path)
     
     # Skip PNG generation since we're using Verovio in the browser
     # This avoids the MuseScore dependency
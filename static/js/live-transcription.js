@@ -0,0 +1,96 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const liveButton = document.getElementById('liveButton');
+    const liveNotes = document.getElementById('liveNotes');
+    if (!liveButton) {
+        return;
+    }
+
+    const NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B'];
+    // Samples per chunk sent to the server (~46 ms at 44.1 kHz)
+    const CHUNK_SIZE = 2048;
+
+    let session = null;
+
+    function noteName(pitch) {
+        return NOTE_NAMES[pitch % 12] + (Math.floor(pitch / 12) - 1);
+    }
+
+    function showNote(event) {
+        const badge = document.createElement('span');
+        badge.className = 'badge me-1 ' + (event.type === 'note_on' ? 'bg-warning text-dark' : 'bg-primary');
+        badge.textContent = noteName(event.pitch);
+        liveNotes.appendChild(badge);
+        liveNotes.scrollTop = liveNotes.scrollHeight;
+    }
+
+    function start() {
+        navigator.mediaDevices.getUserMedia({audio: true}).then(stream => {
+            const audioContext = new AudioContext();
+            const protocol = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+            const socket = new WebSocket(protocol + window.location.host + '/ws/transcribe');
+            socket.binaryType = 'arraybuffer';
+
+            const source = audioContext.createMediaStreamSource(stream);
+            const processor = audioContext.createScriptProcessor(CHUNK_SIZE, 1, 1);
+            session = {stream, audioContext, socket, source, processor, ready: false};
+
+            socket.onopen = () => {
+                socket.send(JSON.stringify({type: 'start', sample_rate: audioContext.sampleRate}));
+            };
+            socket.onmessage = message => {
+                const data = JSON.parse(message.data);
+                if (data.type === 'ready') {
+                    session.ready = true;
+                    liveButton.textContent = 'Stop recording';
+                    liveButton.disabled = false;
+                } else if (data.type === 'update' || data.type === 'done') {
+                    data.events.forEach(showNote);
+                }
+                if (data.type === 'done') {
+                    socket.close();
+                    if (data.midi_path) {
+                        document.getElementById('resultSection').classList.remove('d-none');
+                        document.getElementById('midiPlayer').src = data.midi_path;
+                    }
+                } else if (data.type === 'error') {
+                    console.error('Live transcription:', data.error);
+                }
+            };
+
+            processor.onaudioprocess = e => {
+                if (session && session.ready && socket.readyState === WebSocket.OPEN) {
+                    socket.send(new Float32Array(e.inputBuffer.getChannelData(0)).buffer);
+                }
+            };
+            source.connect(processor);
+            processor.connect(audioContext.destination);
+
+            liveNotes.textContent = '';
+            liveButton.textContent = 'Connecting...';
+            liveButton.disabled = true;
+        }).catch(error => {
+            console.error('Error:', error);
+            alert('Microphone access is required for live transcription');
+        });
+    }
+
+    function stop() {
+        session.processor.disconnect();
+        session.source.disconnect();
+        session.stream.getTracks().forEach(track => track.stop());
+        session.audioContext.close();
+        if (session.socket.readyState === WebSocket.OPEN) {
+            session.socket.send(JSON.stringify({type: 'stop'}));
+        }
+        session = null;
+        liveButton.textContent = 'Record live';
+    }
+
+    liveButton.addEventListener('click', function() {
+        if (session) {
+            stop();
+        } else {
+            start();
+        }
+    });
+});
@@ -13,6 +13,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         const formData = new FormData();
         formData.append('file', file);
+        formData.append('engine', document.getElementById('engine').value);
         
         fetch('/upload', {
             method: 'POST',
@@ -25,16 +26,14 @@ document.addEventListener('DOMContentLoaded', function() {
                 return;
             }
             
-            // Show the result section
-            document.getElementById('resultSection').classList.remove('d-none');
-            
-            // Set the original audio
-            const audioPlayer = document.getElementById('originalAudio');
-            audioPlayer.src = URL.createObjectURL(file);
+            // Cached transcriptions are returned right away
+            if (data.midi_path) {
+                showResult(file, data);
+                return;
+            }
             
-            // Set the MIDI file for the player
-            const midiPlayer = document.getElementById('midiPlayer');
-            midiPlayer.src = data.midi_path;
+            // Transcription runs as a background job; poll until it is done
+            return waitForJob(data.job_id).then(result => showResult(file, result));
         })
         .catch(error => {
             console.error('Error:', error);
@@ -42,6 +41,56 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
+    // Poll the job status until the result is available
+    function waitForJob(jobId) {
+        const submitButton = document.querySelector('#uploadForm button[type="submit"]');
+        const originalLabel = submitButton.textContent;
+        submitButton.disabled = true;
+        
+        return new Promise((resolve, reject) => {
+            function poll() {
+                fetch('/jobs/' + jobId)
+                .then(response => response.json())
+                .then(job => {
+                    if (job.status === 'done') {
+                        return fetch('/jobs/' + jobId + '/result')
+                            .then(response => response.json())
+                            .then(resolve);
+                    }
+                    if (job.status === 'failed') {
+                        resolve({error: job.error});
+                        return;
+                    }
+                    submitButton.textContent = 'Processing: ' + job.stage.replace(/_/g, ' ') + '...';
+                    setTimeout(poll, 1000);
+                })
+                .catch(reject);
+            }
+            poll();
+        }).finally(() => {
+            submitButton.disabled = false;
+            submitButton.textContent = originalLabel;
+        });
+    }
+
+    function showResult(file, data) {
+        if (data.error) {
+            alert('Error: ' + data.error);
+            return;
+        }
+        
+        // Show the result section
+        document.getElementById('resultSection').classList.remove('d-none');
+        
+        // Set the original audio
+        const audioPlayer = document.getElementById('originalAudio');
+        audioPlayer.src = URL.createObjectURL(file);
+        
+        // Set the MIDI file for the player
+        const midiPlayer = document.getElementById('midiPlayer');
+        midiPlayer.src = data.midi_path;
+    }
+
     // Visualization type radio buttons event listeners
     document.querySelectorAll('input[name="visualizationType"]').forEach(function(radio) {
         radio.addEventListener('change', function() {
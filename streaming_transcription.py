@@ -0,0 +1,319 @@
+import logging
+import librosa
+import numpy as np
+import pretty_midi
+
+from audio_to_midi import HOP_LENGTH, N_FFT, ONSET_PARAMS, PITCH_CANDIDATES, top_pitch_candidates
+
+logger = logging.getLogger("audio_converter")
+
+# Number of audio frames read per block by transcribe_stream (~12s at 44.1kHz)
+BLOCK_LENGTH = 1024
+
+# Onset envelope history kept for peak picking and backtracking (in frames)
+BACKTRACK_CONTEXT = 128
+
+# Same limits as the offline engine in convert_audio_to_midi
+MAX_NOTE_DURATION = 1.0
+LAST_NOTE_DURATION = 0.5
+MAX_ANALYSIS_DURATION = 0.2
+
+# Log-mel floor below the level of a full-scale sine (in dB), like
+# power_to_db's top_db but independent of how loud the recording gets later
+TOP_DB = 80.0
+
+# Smallest onset strength the envelope is normalized by (mean dB increase per
+# mel band); keeps noise before the first note from being scaled up to onsets
+MIN_ONSET_SCALE = 10.0
+
+
+class StreamingTranscriber:
+    """
+    Incremental onset detection and pitch estimation over chunks of audio
+
+    Samples are fed with process() in chunks of any size. The transcriber
+    keeps only the STFT overlap, a short window of the onset envelope and
+    the pitch candidates of the note that is still open, so memory does not
+    grow with the length of the recording. Finished notes are returned by
+    process() and finish() and collected in `notes`.
+
+    The full onset envelope (one float per frame) is kept as well for beat
+    tracking, see onset_envelope.
+
+    Everything an onset decision depends on is fixed per frame, so the notes
+    do not depend on how the audio is split into chunks. The log-mel floor is
+    taken relative to full scale, and every envelope frame is normalized by
+    the largest onset strength up to that frame (at least MIN_ONSET_SCALE)
+    instead of the whole-file maximum used by librosa.onset.onset_detect.
+    Quiet recordings and onsets weaker than later ones can therefore come
+    out slightly differently than with the offline engine.
+    """
+
+    def __init__(self, sr, hop_length=HOP_LENGTH, n_fft=N_FFT, onset_params=None):
+        self.sr = sr
+        self.hop_length = hop_length
+        self.n_fft = n_fft
+        self.notes = []
+
+        params = dict(ONSET_PARAMS if onset_params is None else onset_params)
+        self.backtrack = params.pop("backtrack", False)
+        self.delta = params.pop("delta")
+        # librosa.util.peak_pick rounds all window sizes up to whole frames
+        self.pre_max = int(np.ceil(params.pop("pre_max")))
+        self.post_max = int(np.ceil(params.pop("post_max")))
+        self.pre_avg = int(np.ceil(params.pop("pre_avg")))
+        self.post_avg = int(np.ceil(params.pop("post_avg")))
+        self.wait = int(np.ceil(params.pop("wait")))
+        self._lookahead = max(self.post_max, self.post_avg)
+        self._context = max(self.pre_max, self.pre_avg, self.wait, BACKTRACK_CONTEXT)
+        self._analysis_frames = int(np.ceil(MAX_ANALYSIS_DURATION * sr / hop_length))
+
+        self._mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft)
+        self._window = librosa.filters.get_window("hann", n_fft, fftbins=True)
+
+        # Zero padding at the start emulates the centered frames of librosa.stft.
+        # librosa.onset.onset_strength additionally delays the envelope by half
+        # a window, so envelope index i refers to pitch frame i + _shift.
+        self._shift = n_fft // (2 * hop_length)
+        self._samples = np.zeros(n_fft // 2, dtype=np.float32)
+        self._prev_mel_db = None
+        # Peak mel power of a full-scale sine: its spectral peak is sum(window) / 2
+        full_scale_db = 10.0 * np.log10((self._window.sum() / 2) ** 2 * self._mel_basis.max())
+        self._floor_db = full_scale_db - TOP_DB
+        self._env_max = 0.0
+
+        # Rolling buffers; _offset is the global frame index of their first entry
+        self._offset = 0
+        self._envelope = np.zeros(0)
+        self._scale = np.zeros(0)
+        self._candidates = np.zeros((0, PITCH_CANDIDATES))
+        self._settled = 0
+        self._envelope_history = []
+
+        self._last_peak = None
+        self._pending_onset = None
+        self._pending_candidates = None
+        self._finished = False
+
+    @property
+    def frames_processed(self):
+        """Number of analysis frames seen so far"""
+        return self._offset + len(self._envelope)
+
+    @property
+    def onset_envelope(self):
+        """
+        Onset strength of every frame seen so far, aligned like librosa.onset.onset_strength
+        """
+        return np.concatenate([np.zeros(self._shift)] + self._envelope_history)
+
+    def open_note(self):
+        """
+        Start time and pitch of the note that is still sounding
+
+        The pitch is known once the note's analysis window has been seen, long
+        before the next onset closes the note.
+
+        Returns:
+        tuple: (start_seconds, midi_pitch), or None if no note is open or its pitch is not known yet
+        """
+        if self._pending_onset is None or self._pending_candidates is None:
+            return None
+        pitch = self._window_pitch(self._pending_candidates)
+        if pitch is None:
+            return None
+        return self._pending_onset * self.hop_length / self.sr, pitch
+
+    def process(self, samples):
+        """
+        Feed the next chunk of mono audio
+
+        Parameters:
+        samples (np.ndarray): Audio samples at the transcriber's sample rate
+
+        Returns:
+        list: pretty_midi.Note objects completed by this chunk
+        """
+        if self._finished:
+            raise RuntimeError("StreamingTranscriber.process called after finish()")
+        self._samples = np.concatenate([self._samples, np.asarray(samples, dtype=np.float32)])
+        self._analyse_frames()
+        return self._pick_onsets(final=False)
+
+    def finish(self):
+        """
+        Flush the remaining audio and close the last note
+
+        Returns:
+        list: pretty_midi.Note objects completed by the flush
+        """
+        if self._finished:
+            return []
+        # Trailing padding mirrors the centered framing at the end of the signal
+        self._samples = np.concatenate([self._samples, np.zeros(self.n_fft // 2, dtype=np.float32)])
+        self._analyse_frames()
+        new_notes = self._pick_onsets(final=True)
+        if self._pending_onset is not None:
+            self._capture_pending_candidates(final=True)
+            note = self._make_note(self._pending_onset, LAST_NOTE_DURATION)
+            self._pending_onset = None
+            if note is not None:
+                new_notes.append(note)
+        self._finished = True
+        return new_notes
+
+    def _analyse_frames(self):
+        """Turn all complete STFT frames in the sample buffer into envelope and pitch frames"""
+        n_frames = 1 + (len(self._samples) - self.n_fft) // self.hop_length
+        if n_frames <= 0:
+            return
+        frames = librosa.util.frame(
+            self._samples[:(n_frames - 1) * self.hop_length + self.n_fft],
+            frame_length=self.n_fft,
+            hop_length=self.hop_length
+        )
+        S = np.abs(np.fft.rfft(frames * self._window[:, None], axis=0))
+        # Keep the overlap with the next chunk
+        self._samples = self._samples[n_frames * self.hop_length:]
+
+        # Onset strength: positive log-mel flux averaged over mel bands
+        mel_db = np.maximum(librosa.power_to_db(self._mel_basis @ S ** 2, top_db=None), self._floor_db)
+        previous = mel_db[:, :1] if self._prev_mel_db is None else self._prev_mel_db
+        flux = np.maximum(0.0, np.diff(np.hstack([previous, mel_db]), axis=1)).mean(axis=0)
+        if self._prev_mel_db is None:
+            flux[0] = 0.0
+        self._prev_mel_db = mel_db[:, -1:]
+
+        # Pitch candidates; piptrack thresholds every frame against its own peak
+        pitches, magnitudes = librosa.piptrack(S=S, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)
+        self._envelope = np.concatenate([self._envelope, flux])
+        self._envelope_history.append(flux)
+        self._candidates = np.vstack([self._candidates, top_pitch_candidates(pitches, magnitudes)])
+        # Normalization of each frame by the running maximum up to that frame
+        running = np.maximum.accumulate(np.concatenate([[self._env_max], flux]))[1:]
+        self._env_max = float(running[-1])
+        self._scale = np.concatenate([self._scale, np.maximum(running, MIN_ONSET_SCALE)])
+
+    def _pick_onsets(self, final):
+        """Decide onsets in the settled part of the envelope and emit finished notes"""
+        end = self.frames_processed
+        decidable = end if final else end - self._lookahead
+        new_notes = []
+        if decidable > self._settled:
+            envelope = self._envelope / self._scale
+            peaks = librosa.util.peak_pick(
+                envelope,
+                pre_max=self.pre_max, post_max=self.post_max,
+                pre_avg=self.pre_avg, post_avg=self.post_avg,
+                delta=self.delta, wait=0
+            ) + self._offset
+            peaks = peaks[(peaks >= self._settled) & (peaks < decidable)]
+
+            for peak in peaks:
+                # Apply the minimum distance between onsets across block boundaries
+                if self._last_peak is not None and peak - self._last_peak <= self.wait:
+                    continue
+                self._last_peak = peak
+                onset = self._backtrack(peak, envelope) if self.backtrack else peak
+                onset += self._shift
+                if self._pending_onset is not None:
+                    if onset <= self._pending_onset:
+                        continue
+                    self._capture_pending_candidates(final=True)
+                    duration = min((onset - self._pending_onset) * self.hop_length / self.sr, MAX_NOTE_DURATION)
+                    note = self._make_note(self._pending_onset, duration)
+                    if note is not None:
+                        new_notes.append(note)
+                self._pending_onset = onset
+                self._pending_candidates = None
+            self._settled = decidable
+
+        if self._pending_onset is not None:
+            self._capture_pending_candidates(final=False)
+        self._trim()
+        return new_notes
+
+    def _backtrack(self, peak, envelope):
+        """Roll an onset back to the preceding local minimum of the envelope"""
+        local = peak - self._offset
+        energy = envelope[:local + 1]
+        minima = np.flatnonzero((energy[1:-1] <= energy[:-2]) & (energy[1:-1] < energy[2:])) + 1
+        if len(minima) == 0:
+            return self._offset if self._offset == 0 else peak
+        return int(minima[-1]) + self._offset
+
+    def _capture_pending_candidates(self, final):
+        """Copy the analysis window of the open note out of the rolling buffer once it is complete"""
+        if self._pending_candidates is not None:
+            return
+        start = self._pending_onset - self._offset
+        stop = start + self._analysis_frames
+        if stop <= len(self._candidates) or final:
+            self._pending_candidates = self._candidates[max(start, 0):stop].copy()
+
+    def _trim(self):
+        """Drop envelope and pitch frames that can no longer influence a decision"""
+        keep_from = self._settled - self._context
+        if self._pending_onset is not None and self._pending_candidates is None:
+            keep_from = min(keep_from, self._pending_onset)
+        drop = keep_from - self._offset
+        if drop > 0:
+            self._envelope = self._envelope[drop:]
+            self._scale = self._scale[drop:]
+            self._candidates = self._candidates[drop:]
+            self._offset += drop
+
+    def _make_note(self, onset_frame, duration):
+        """Create the note for an onset from its captured pitch candidates"""
+        analysis_frames = max(int(np.ceil(min(duration, MAX_ANALYSIS_DURATION) * self.sr / self.hop_length)), 1)
+        pitch = self._window_pitch(self._pending_candidates[:analysis_frames])
+        if pitch is None:
+            return None
+        start = onset_frame * self.hop_length / self.sr
+        note = pretty_midi.Note(
+            velocity=100,
+            pitch=pitch,
+            start=float(start),
+            end=float(start + duration)
+        )
+        self.notes.append(note)
+        return note
+
+    @staticmethod
+    def _window_pitch(window):
+        """MIDI pitch of the median pitch candidate in an analysis window, or None if it holds none"""
+        if window.size == 0 or np.all(np.isnan(window)):
+            return None
+        return int(round(librosa.hz_to_midi(np.nanmedian(window))))
+
+
+def transcribe_stream(audio_file, instrument, block_length=BLOCK_LENGTH):
+    """
+    Transcribe an audio file block by block into a pretty_midi instrument
+
+    Parameters:
+    audio_file (str): Path to an audio file readable by soundfile
+    instrument (pretty_midi.Instrument): Instrument that receives the notes as they are found
+    block_length (int): Number of hop-sized frames per block read from disk
+
+    Returns:
+    StreamingTranscriber: The finished transcriber, with the notes and the onset envelope of the file
+    """
+    sr = librosa.get_samplerate(audio_file)
+    logger.info(f"Streaming audio file in blocks of {block_length} frames. Sample rate: {sr}")
+    transcriber = StreamingTranscriber(sr)
+
+    # Blocks are read back to back; the transcriber carries the STFT overlap itself
+    blocks = librosa.stream(
+        audio_file,
+        block_length=block_length,
+        frame_length=HOP_LENGTH,
+        hop_length=HOP_LENGTH,
+        mono=True
+    )
+    for block in blocks:
+        instrument.notes.extend(transcriber.process(block))
+    instrument.notes.extend(transcriber.finish())
+
+    logger.info(f"Streamed {transcriber.frames_processed} frames")
+    return transcriber
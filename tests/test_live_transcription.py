@@ -0,0 +1,54 @@
+import os
+import sys
+
+import numpy as np
+
+os.environ.setdefault("LIBROSA_WARMUP", "off")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from live_transcription import LiveTranscriptionSession  # noqa: E402
+
+SR = 48000
+
+
+def _melody(notes=24, seconds=0.25, lead=0.5):
+    """Decaying sine tones of random pitches after half a second of quiet noise"""
+    rng = np.random.default_rng(1)
+    pitches = rng.integers(60, 80, size=notes)
+    t = np.arange(int(seconds * SR)) / SR
+    tones = [0.25 * np.sin(2 * np.pi * 440.0 * 2 ** ((p - 69) / 12) * t) * np.exp(-6 * t) for p in pitches]
+    y = np.concatenate([np.zeros(int(lead * SR))] + tones + [np.zeros(int(lead * SR))])
+    return (y + 1e-3 * rng.standard_normal(len(y))).astype("<f4"), pitches.tolist()
+
+
+def _record(y, chunk=4096):
+    session = LiveTranscriptionSession(SR)
+    events = []
+    for i in range(0, len(y), chunk):
+        events += session.feed(y[i:i + chunk].tobytes())[0]
+    return session, events
+
+
+def test_chunks_are_transcribed_without_spurious_onsets(tmp_path):
+    y, pitches = _melody()
+    session, events = _record(y)
+    closing_events, midi_path = session.close(output_dir=str(tmp_path))
+    events += closing_events
+
+    # Nothing is picked from the noise before the first tone
+    assert session.notes[0].start > 0.45
+    assert [n.pitch for n in session.notes[:len(pitches)]] == pitches
+    assert len(session.notes) <= len(pitches) + 1
+    finished = [e for e in events if e["type"] == "note"]
+    assert [e["pitch"] for e in finished] == [n.pitch for n in session.notes]
+    assert os.path.exists(midi_path)
+
+
+def test_sessions_closing_together_write_separate_files(tmp_path):
+    y, _ = _melody(notes=4)
+    paths = set()
+    for _ in range(3):
+        session, _ = _record(y)
+        paths.add(session.close(output_dir=str(tmp_path))[1])
+    assert len(paths) == 3
+    assert all(os.path.exists(path) for path in paths)
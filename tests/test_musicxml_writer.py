@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pretty_midi
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from musicxml_writer import note_groups, write_musicxml  # noqa: E402
+
+
+def _midi(subdivision, steps):
+    """One note per (start, end) in grid steps of a quarter note divided into subdivision parts"""
+    pm = pretty_midi.PrettyMIDI(resolution=480, initial_tempo=120)
+    instrument = pretty_midi.Instrument(program=0)
+    seconds = 0.5 / subdivision
+    for start, end in steps:
+        instrument.notes.append(pretty_midi.Note(velocity=80, pitch=60, start=start * seconds, end=end * seconds))
+    pm.instruments.append(instrument)
+    return pm
+
+
+def test_sixteenth_grid_is_written(tmp_path):
+    pm = _midi(4, [(0, 1), (2, 5), (8, 16)])
+    assert note_groups(pm)[1] == 4
+    assert write_musicxml(pm, str(tmp_path / "out.xml"))
+
+
+def test_quintuplet_grid_falls_back_to_music21(tmp_path):
+    # Gaps of 1/5 beat have no note value; the writer must decline instead of failing
+    pm = _midi(5, [(0, 1), (2, 3), (4, 9)])
+    assert note_groups(pm) is None
+    assert not write_musicxml(pm, str(tmp_path / "out.xml"))
+    assert not os.path.exists(tmp_path / "out.xml")
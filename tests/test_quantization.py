@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pretty_midi
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantization import mark_beat_grid, read_beat_grid  # noqa: E402
+
+
+def _midi(path, tempo, time_signature_at=None, grid_at=None):
+    pm = pretty_midi.PrettyMIDI(initial_tempo=tempo)
+    if time_signature_at is not None:
+        pm.time_signature_changes.append(pretty_midi.TimeSignature(3, 4, time_signature_at))
+    if grid_at is not None:
+        mark_beat_grid(pm, grid_at)
+    piano = pretty_midi.Instrument(program=0)
+    piano.notes.append(pretty_midi.Note(velocity=100, pitch=60, start=0.5, end=1.0))
+    pm.instruments.append(piano)
+    pm.write(str(path))
+    return pretty_midi.PrettyMIDI(str(path))
+
+
+def test_marked_grid_survives_a_midi_file(tmp_path):
+    tempo, first_beat = read_beat_grid(_midi(tmp_path / "grid.mid", 100, grid_at=0.36))
+    assert round(tempo) == 100
+    assert abs(first_beat - 0.36) < 0.01
+
+
+def test_unmarked_files_have_no_grid(tmp_path):
+    # One tempo and one time signature, like any simple MIDI export
+    assert read_beat_grid(_midi(tmp_path / "plain.mid", 100, time_signature_at=0.0)) is None
+    assert read_beat_grid(_midi(tmp_path / "empty.mid", 100)) is None
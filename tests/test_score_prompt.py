@@ -0,0 +1,49 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from score_prompt import count_tokens, encode_score  # noqa: E402
+
+
+def _score(measures, pitches=("C4", "E4", "G4", "B4", "D5", "F#5")):
+    return [{
+        "partName": "Piano",
+        "measures": [
+            {"number": i + 1, "notes": [
+                {"type": "note", "pitch": pitches[(i + j) % len(pitches)], "duration": 1.0} for j in range(4)
+            ]}
+            for i in range(measures)
+        ],
+    }]
+
+
+def test_small_score_is_encoded_in_full():
+    encoded = encode_score(_score(2), max_tokens=1000)
+    assert encoded.splitlines()[0] == "Piano"
+    assert "..." not in encoded
+
+
+def test_large_score_is_sampled_within_budget():
+    encoded = encode_score(_score(400), max_tokens=300)
+    assert count_tokens(encoded) <= 300
+    assert "..." in encoded
+
+
+def test_tiny_budget_never_exceeds_budget():
+    music_data = _score(400)
+    for max_tokens in (1, 5, 20, 40):
+        encoded = encode_score(music_data, max_tokens=max_tokens)
+        assert count_tokens(encoded) <= max_tokens
+    assert encode_score(music_data, max_tokens=40).startswith("1 parts, 400 measures")
+
+
+def test_repeat_sign_never_follows_a_gap():
+    # Every measure is the same, so each one after the first could be written as "%"
+    encoded = encode_score(_score(400, pitches=["C4"]), max_tokens=300)
+    lines = encoded.splitlines()
+    gaps = [i for i, line in enumerate(lines) if line.startswith("...")]
+    assert gaps
+    for i in gaps:
+        if i + 1 < len(lines):
+            assert not lines[i + 1].endswith("| %")
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import numpy as np
+
+os.environ.setdefault("LIBROSA_WARMUP", "off")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_to_midi import transcribe_monophonic  # noqa: E402
+from streaming_transcription import StreamingTranscriber  # noqa: E402
+
+SR = 22050
+
+
+def _melody(notes=40, seconds=0.25, lead=0.5):
+    """Decaying sine tones of random pitches between half a second of quiet noise at both ends"""
+    rng = np.random.default_rng(0)
+    pitches = rng.integers(60, 80, size=notes)
+    t = np.arange(int(seconds * SR)) / SR
+    tones = [0.25 * np.sin(2 * np.pi * 440.0 * 2 ** ((p - 69) / 12) * t) * np.exp(-6 * t) for p in pitches]
+    silence = np.zeros(int(lead * SR))
+    y = np.concatenate([silence] + tones + [silence])
+    return (y + 1e-3 * rng.standard_normal(len(y))).astype(np.float32), pitches.tolist()
+
+
+def _stream(y, chunk):
+    transcriber = StreamingTranscriber(SR)
+    notes = []
+    for i in range(0, len(y), chunk):
+        notes += transcriber.process(y[i:i + chunk])
+    return notes + transcriber.finish()
+
+
+def _matches(notes, reference, tolerance=0.05):
+    return sum(
+        any(n.pitch == r.pitch and abs(n.start - r.start) <= tolerance for r in reference)
+        for n in notes
+    )
+
+
+def test_streaming_does_not_depend_on_chunk_size():
+    y, _ = _melody()
+    results = [[(n.pitch, n.start, n.end) for n in _stream(y, chunk)] for chunk in (512, 4096, 22050, len(y))]
+    assert all(result == results[0] for result in results[1:])
+
+
+def test_streaming_is_close_to_offline():
+    y, pitches = _melody()
+    offline = transcribe_monophonic(y, SR)
+    streamed = _stream(y, 4096)
+    assert _matches(streamed, offline) >= 0.9 * len(streamed)
+    # Every tone is found in order, and no onset is picked from the noise before the first one
+    assert streamed[0].start > 0.4
+    assert [n.pitch for n in streamed[:len(pitches)]] == pitches
@@ -0,0 +1,147 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import artifact_store
+from hashing import file_sha256, params_sha256
+
+logger = logging.getLogger("transcription_cache")
+
+DATABASE_NAME = 'transcription_cache.db'
+
+# Total size of cached MIDI and MusicXML files before least recently used entries are evicted
+MAX_CACHE_BYTES = int(os.getenv("TRANSCRIPTION_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+
+# Bump when convert_audio_to_midi or generate_sheet_music change their output,
+# so results of the old pipeline are no longer served
+PIPELINE_VERSION = 2
+
+_initialized = threading.Event()
+
+
+def get_db_connection():
+    """
+    Establishes and returns a connection to the cache database.
+    """
+    db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), DATABASE_NAME)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def initialize_cache():
+    """
+    Creates the cache table if it doesn't already exist.
+    """
+    conn = get_db_connection()
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS transcriptions (
+            cache_key TEXT PRIMARY KEY,
+            midi_path TEXT NOT NULL,
+            xml_path TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_transcriptions_access ON transcriptions (last_access)')
+    conn.close()
+    _initialized.set()
+
+
+def _connect():
+    if not _initialized.is_set():
+        initialize_cache()
+    return get_db_connection()
+
+
+def cache_key(audio_path, params=None):
+    """
+    Build the cache key of an audio file and the transcription parameters used for it
+
+    Parameters:
+    audio_path (str): Path to the audio file
+    params (dict, optional): Options passed to convert_audio_to_midi
+
+    Returns:
+    str: Key combining the audio content hash, the parameters and the pipeline version
+    """
+    settings = dict(params or {}, pipeline_version=PIPELINE_VERSION)
+    return f"{file_sha256(audio_path)}-{params_sha256(settings)[:16]}"
+
+
+def lookup(key):
+    """
+    Return the cached MIDI and MusicXML paths for a key and mark the entry as recently used
+
+    Entries whose files have disappeared from disk are dropped.
+
+    Returns:
+    dict: midi_path and xml_path, or None on a cache miss
+    """
+    conn = _connect()
+    try:
+        row = conn.execute('SELECT * FROM transcriptions WHERE cache_key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        if not (os.path.exists(row['midi_path']) and os.path.exists(row['xml_path'])):
+            conn.execute('DELETE FROM transcriptions WHERE cache_key = ?', (key,))
+            return None
+        conn.execute('UPDATE transcriptions SET last_access = ? WHERE cache_key = ?', (time.time(), key))
+        return {'midi_path': row['midi_path'], 'xml_path': row['xml_path']}
+    finally:
+        conn.close()
+
+
+def store(key, midi_path, xml_path):
+    """
+    Add a finished transcription to the cache and evict old entries beyond the size cap
+    """
+    size = os.path.getsize(midi_path) + os.path.getsize(xml_path)
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute(
+            'INSERT OR REPLACE INTO transcriptions VALUES (?, ?, ?, ?, ?, ?)',
+            (key, midi_path, xml_path, size, now, now)
+        )
+    finally:
+        conn.close()
+    evict(MAX_CACHE_BYTES)
+
+
+def evict(max_bytes):
+    """
+    Delete least recently used entries and their files until the cache fits into max_bytes
+
+    Returns:
+    int: Number of evicted entries
+    """
+    conn = _connect()
+    evicted = 0
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        total = conn.execute('SELECT COALESCE(SUM(size_bytes), 0) FROM transcriptions').fetchone()[0]
+        if total > max_bytes:
+            for row in conn.execute('SELECT * FROM transcriptions ORDER BY last_access').fetchall():
+                if total <= max_bytes:
+                    break
+                for path in (row['midi_path'], row['xml_path']):
+                    # Registered files go with their compressed copies
+                    if not artifact_store.delete(path) and os.path.exists(path):
+                        os.remove(path)
+                conn.execute('DELETE FROM transcriptions WHERE cache_key = ?', (row['cache_key'],))
+                total -= row['size_bytes']
+                evicted += 1
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    if evicted:
+        logger.info(f"Evicted {evicted} cached transcriptions")
+    return evicted
@@ -0,0 +1,7 @@
+# Transcription engines selectable in convert_audio_to_midi. They live in a
+# module without dependencies so that the server and the CLIs can validate an
+# engine name without importing librosa and the audio pipeline.
+ENGINES = ("monophonic", "polyphonic", "basic_pitch")
+
+# The only engine that supports streaming transcription
+STREAMING_ENGINE = "monophonic"